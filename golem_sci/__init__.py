@@ -34,8 +34,24 @@ from .factory import (  # noqa
     new_sci_rpc,
 )
 
+from .backfill import LogBackfill  # noqa
+
+from .cursorstorage import (  # noqa
+    JsonCursorStorage,
+    SqliteCursorStorage,
+)
+
+from .dispatcher import (  # noqa
+    CallbackDispatcher,
+    ThreadedCallbackDispatcher,
+)
+
 from .gntconverter import GNTConverter  # noqa
 
+from .logcache import SqliteLogCache  # noqa
+
+from .paymentaggregator import PaymentAggregator  # noqa
+
 from .structs import (  # noqa
     Block,
     Payment,
@@ -49,4 +65,8 @@ from .events import (  # noqa
     CoverAdditionalVerificationEvent,
 )
 
-from .transactionsstorage import JsonTransactionsStorage  # noqa
+from .transactionsstorage import (  # noqa
+    JournalTransactionsStorage,
+    JsonTransactionsStorage,
+    SqliteTransactionsStorage,
+)
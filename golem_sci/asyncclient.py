@@ -0,0 +1,282 @@
+import asyncio
+import itertools
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Union
+from urllib.parse import urlparse
+
+from eth_utils import to_bytes, to_text
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+
+from . import batch, exceptions
+
+logger = logging.getLogger(__name__)
+
+
+class _IPCConnection:
+    def __init__(self, ipc_path: str) -> None:
+        self._ipc_path = ipc_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, data: bytes) -> bytes:
+        if self._writer is None:
+            self._reader, self._writer = \
+                await asyncio.open_unix_connection(self._ipc_path)
+        self._writer.write(data)
+        raw_response = b''
+        while True:
+            chunk = await self._reader.read(4096)
+            if not chunk:
+                raise ConnectionError('IPC connection closed')
+            raw_response += chunk
+            try:
+                json.loads(to_text(raw_response))
+            except ValueError:
+                continue
+            return raw_response
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class _HTTPConnection:
+    """
+    Minimal keep-alive HTTP/1.1 client, enough for talking to JSON-RPC
+    endpoints without pulling in an HTTP library.
+    """
+
+    def __init__(self, endpoint_uri: str) -> None:
+        uri = urlparse(endpoint_uri)
+        self._host = uri.hostname
+        self._ssl = uri.scheme == 'https'
+        self._port = uri.port or (443 if self._ssl else 80)
+        self._path = uri.path or '/'
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, data: bytes) -> bytes:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self._host,
+                self._port,
+                ssl=self._ssl,
+            )
+        self._writer.write(
+            'POST {} HTTP/1.1\r\n'
+            'Host: {}\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: {}\r\n'
+            '\r\n'.format(self._path, self._host, len(data)).encode()
+            + data
+        )
+        status = await self._reader.readline()
+        if not status:
+            raise ConnectionError('HTTP connection closed')
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await self._reader.readline()).decode().strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int((await self._reader.readline()).strip(), 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self._reader.readexactly(
+                int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            self.close()
+        code = int(status.split()[1])
+        if code >= 400:
+            raise ConnectionError('HTTP error {}: {}'.format(
+                code, to_text(body)))
+        return body
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class AsyncClient:
+    """
+    Non-blocking counterpart of `Client` to be used from an asyncio event
+    loop. Endpoint is either an IPC path or an http(s) URL.
+    """
+
+    # Maximum number of calls sent in a single JSON-RPC batch request
+    MAX_BATCH_SIZE = 500
+
+    def __init__(self, endpoint: str, poa: bool = False) -> None:
+        if endpoint.startswith(('http://', 'https://')):
+            self._connection: Any = _HTTPConnection(endpoint)
+        else:
+            self._connection = _IPCConnection(endpoint)
+        # Created lazily so that it binds to the loop the client is used in
+        self._lock: Optional[asyncio.Lock] = None
+        self._request_counter = itertools.count()
+        # Web3 is used for formatting requests and responses only, it
+        # doesn't have a provider so it never talks to the node by itself
+        self.web3 = Web3([])
+        self.web3.middleware_stack.remove('normalize_errors')
+        if poa:
+            self.web3.middleware_stack.inject(geth_poa_middleware, layer=0)
+
+    async def _send(self, payload: Any) -> Any:
+        data = to_bytes(text=json.dumps(payload))
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                return json.loads(to_text(
+                    await self._connection.request(data)))
+            except Exception:
+                # Connection is in an unknown state, start over next time
+                self._connection.close()
+                raise
+
+    async def request(self, method: str, params: Sequence[Any]) -> Any:
+        method, formatted = batch.format_request(self.web3, method, params)
+        response = await self._send({
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': formatted,
+            'id': next(self._request_counter),
+        })
+        response = batch.format_response(self.web3, method, params, response)
+        if 'error' in response:
+            raise exceptions.map_geth_error(ValueError(response['error']))
+        return response['result']
+
+    async def batch_request(
+            self,
+            calls: Sequence[batch.RpcCall],
+            batch_size: Optional[int] = None) -> List[Any]:
+        """
+        Same as `Client.batch_request`.
+        """
+        batch_size = batch_size or self.MAX_BATCH_SIZE
+        results: List[Any] = []
+        for i in range(0, len(calls), batch_size):
+            chunk = calls[i:i + batch_size]
+            payload = []
+            for method, params in chunk:
+                method, formatted = \
+                    batch.format_request(self.web3, method, params)
+                payload.append({
+                    'jsonrpc': '2.0',
+                    'method': method,
+                    'params': formatted,
+                    'id': next(self._request_counter),
+                })
+            responses = await self._send(payload)
+            if not isinstance(responses, list):
+                raise ValueError(responses.get('error', responses))
+            by_id = {response['id']: response for response in responses}
+            for (method, params), request in zip(chunk, payload):
+                response = batch.format_response(
+                    self.web3,
+                    method,
+                    params,
+                    by_id[request['id']],
+                )
+                if 'error' in response:
+                    results.append(exceptions.map_geth_error(
+                        ValueError(response['error'])))
+                else:
+                    results.append(response['result'])
+        return results
+
+    async def get_block_number(self) -> int:
+        return await self.request('eth_blockNumber', [])
+
+    async def get_gas_price(self) -> int:
+        return await self.request('eth_gasPrice', [])
+
+    async def get_transaction_count(self, address: str) -> int:
+        return await self.request(
+            'eth_getTransactionCount',
+            [address, 'pending'],
+        )
+
+    async def get_balance(
+            self,
+            account: str,
+            block: Union[int, str] = 'latest') -> int:
+        return await self.request('eth_getBalance', [account, block])
+
+    async def get_block(
+            self,
+            block: Union[int, str],
+            full_transactions: bool = False):
+        return await self.request(
+            'eth_getBlockByNumber',
+            [block, full_transactions],
+        )
+
+    async def get_transaction(self, tx_hash: str):
+        return await self.request('eth_getTransactionByHash', [tx_hash])
+
+    async def get_transaction_receipt(self, tx_hash: str):
+        return await self.request('eth_getTransactionReceipt', [tx_hash])
+
+    async def get_transaction_receipts(
+            self,
+            tx_hashes: Sequence[str]) -> List[Any]:
+        return await self.batch_request([
+            ('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes
+        ])
+
+    async def get_transactions(self, tx_hashes: Sequence[str]) -> List[Any]:
+        return await self.batch_request([
+            ('eth_getTransactionByHash', [tx_hash]) for tx_hash in tx_hashes
+        ])
+
+    async def estimate_gas(self, tx: Dict[str, Any]) -> int:
+        return await self.request('eth_estimateGas', [tx])
+
+    async def call(
+            self,
+            tx: Dict[str, Any],
+            block: Union[int, str] = 'latest') -> bytes:
+        return await self.request('eth_call', [tx, block])
+
+    async def send_raw(self, raw_tx: bytes) -> str:
+        """
+        Sends signed and RLP encoded transaction.
+        :return The 32 Bytes transaction hash as HEX string
+        """
+        tx_hash = await self.request(
+            'eth_sendRawTransaction',
+            [self.web3.toHex(raw_tx)],
+        )
+        return tx_hash.hex()
+
+    async def get_raw_logs(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: Union[int, str],
+            to_block: Union[int, str]):
+        return await self.request('eth_getLogs', [{
+            'address': address,
+            'topics': topics,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        }])
+
+    def contract(self, address: str, abi: str):
+        return self.web3.eth.contract(address=address, abi=json.loads(abi))
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,1181 @@
+import asyncio
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from eth_utils import encode_hex, to_checksum_address
+from ethereum.transactions import Transaction
+from ethereum.utils import denoms
+from hexbytes import HexBytes
+import rlp
+
+from . import calldata
+from . import contracts
+from . import exceptions
+from .asyncclient import AsyncClient
+from .backfill import is_range_too_large, LogBackfill
+from .client import get_event_topics
+from .events import (
+    BatchTransferEvent,
+    GntTransferEvent,
+    ForcedPaymentEvent,
+    ForcedSubtaskPaymentEvent,
+    CoverAdditionalVerificationEvent,
+)
+from .implementation import (
+    _raise_errors,
+    encode_payments,
+    matching_subscriptions,
+    merge_topics,
+    split_payments,
+    EthSubscription,
+    SCIImplementation,
+    Subscription,
+)
+from .structs import (
+    Block,
+    DirectEthTransfer,
+    Payment,
+    TransactionReceipt,
+)
+from .transactionsstorage import TransactionsStorage
+
+logger = logging.getLogger(__name__)
+
+# Put in the queue of a closed stream, iteration ends when it's reached
+_END_OF_STREAM = object()
+
+
+class EventStream:
+    """
+    Async iterator over the events of a single subscription. Events are
+    buffered until consumed, call `close` to unsubscribe. Iteration ends
+    after the events buffered before the stream was closed.
+    """
+
+    def __init__(self, unsubscribe: Callable[['EventStream'], None]) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._unsubscribe = unsubscribe
+
+    def put(self, event) -> None:
+        self._queue.put_nowait(event)
+
+    def __aiter__(self) -> 'EventStream':
+        return self
+
+    async def __anext__(self):
+        event = await self._queue.get()
+        if event is _END_OF_STREAM:
+            # Keep it there for the following calls
+            self._queue.put_nowait(event)
+            raise StopAsyncIteration
+        return event
+
+    def close(self) -> None:
+        self._unsubscribe(self)
+        self._queue.put_nowait(_END_OF_STREAM)
+
+
+class AsyncSCI:
+    """
+    Asyncio counterpart of `SCIImplementation`. All the methods of
+    `SmartContractsInterface` are provided as coroutines running on a single
+    event loop, there are no background threads. Instead of callbacks
+    `wait_for_receipt` returns when the transaction is confirmed and
+    subscriptions are async iterators, `on_transaction_confirmed` callbacks
+    are called from the loop. Transactions storage writes to disk so it's
+    used from the loop's default executor. Call `start` before use and
+    `stop` when done, it ends all the subscription streams and cancels
+    the pending `wait_for_receipt` calls.
+    """
+
+    REQUIRED_CONFS = SCIImplementation.REQUIRED_CONFS
+    BATCH_GAS_FILL_RATIO = SCIImplementation.BATCH_GAS_FILL_RATIO
+    # Checking the latest block number is cheap so it's done frequently,
+    # the rest of the monitor only runs when the confirmed block advances
+    MONITOR_INTERVAL = 1
+    # Block range of a single eth_getLogs request, halved when the node
+    # refuses it
+    LOGS_CHUNK_SIZE = LogBackfill.INITIAL_CHUNK_SIZE
+
+    def __init__(
+            self,
+            client: AsyncClient,
+            address: str,
+            storage: TransactionsStorage,
+            contract_addresses: Dict[contracts.Contract, str],
+            tx_sign=None) -> None:
+        self._client = client
+        self._address = address
+        self._storage = storage
+        self._tx_sign = tx_sign
+        self._contract_addresses = contract_addresses
+
+        def _make_contract(contract: contracts.Contract):
+            if contract not in contract_addresses:
+                logger.info(
+                    "Address not provided for %s, won't be able to use it",
+                    contract,
+                )
+                return None
+            return self._client.contract(
+                contract_addresses[contract],
+                contracts.get_abi(contract),
+            )
+
+        self._gnt = _make_contract(contracts.GNT)
+        self._gntb = _make_contract(contracts.GNTB)
+        self._gntdeposit = _make_contract(contracts.GNTDeposit)
+        self._faucet = _make_contract(contracts.Faucet)
+
+        self._tx_lock: Optional[asyncio.Lock] = None
+        self._subscriptions: List[Subscription] = []
+        self._eth_subscriptions: List[EthSubscription] = []
+        self._awaiting_receipts: Dict[str, List[asyncio.Future]] = {}
+        self._confirmed_block = -self.REQUIRED_CONFS
+        self._gas_price = SCIImplementation.GAS_PRICE
+        self._eth_reserved = 0
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    async def start(self, monitor: bool = True) -> None:
+        self._tx_lock = asyncio.Lock()
+        await self._run_storage(
+            self._storage.init,
+            await self._client.get_transaction_count(self._address),
+        )
+        for tx in await self._run_storage(self._storage.get_all_tx):
+            self._eth_reserved += tx.startgas * tx.gasprice + tx.value
+        await self._update_block_numbers()
+        await self._update_gas_price()
+        if monitor:
+            self._monitor_task = asyncio.ensure_future(self._monitor())
+
+    async def stop(self) -> None:
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+        for sub in self._subscriptions + self._eth_subscriptions:
+            sub.cb.close()
+        for futures in self._awaiting_receipts.values():
+            for future in futures:
+                future.cancel()
+        self._awaiting_receipts.clear()
+        self._client.close()
+
+    def get_eth_address(self) -> str:
+        return self._address
+
+    async def get_eth_balance(self, address: str) -> int:
+        balance = await self._client.get_balance(
+            address,
+            self._confirmed_block,
+        )
+        if address == self._address:
+            balance -= self._eth_reserved
+        return balance
+
+    async def get_eth_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        balances = _raise_errors(await self._client.batch_request(
+            [
+                ('eth_getBalance', [address, self._confirmed_block])
+                for address in addresses
+            ],
+            batch_size=batch_size,
+        ))
+        return [
+            balance - self._eth_reserved if address == self._address
+            else balance
+            for address, balance in zip(addresses, balances)
+        ]
+
+    async def get_gnt_balance(self, address: str) -> int:
+        return await self._call(contracts.GNT, 'balanceOf', [address])
+
+    async def get_gntb_balance(self, address: str) -> int:
+        return await self._call(contracts.GNTB, 'balanceOf', [address])
+
+    async def get_gntb_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return await self._call_many(
+            contracts.GNTB,
+            'balanceOf',
+            [[address] for address in addresses],
+            batch_size,
+        )
+
+    async def get_transaction_receipt(
+            self,
+            tx_hash: str) -> Optional[TransactionReceipt]:
+        raw = await self._client.get_transaction_receipt(tx_hash)
+        return self._confirmed_receipt(raw)
+
+    async def get_transaction_gas_price(self, tx_hash: str) -> Optional[int]:
+        raw = await self._client.get_transaction(tx_hash)
+        return raw['gasPrice'] if raw else None
+
+    def get_current_gas_price(self) -> int:
+        return self._gas_price
+
+    def get_latest_confirmed_block_number(self) -> int:
+        return self._confirmed_block
+
+    async def get_latest_confirmed_block(self) -> Block:
+        return await self.get_block_by_number(self._confirmed_block)
+
+    async def get_block_by_number(self, number: int) -> Block:
+        return Block(await self._client.get_block(number))
+
+    def on_transaction_confirmed(
+            self,
+            tx_hash: str,
+            cb: Callable[[TransactionReceipt], None]) -> None:
+        def on_done(future: asyncio.Future) -> None:
+            # Cancelled on stop
+            if not future.cancelled():
+                cb(future.result())
+        self._await_receipt(tx_hash).add_done_callback(on_done)
+
+    async def wait_for_receipt(self, tx_hash: str) -> TransactionReceipt:
+        """
+        Returns after the transaction has been confirmed required number of
+        times.
+        """
+        return await self._await_receipt(tx_hash)
+
+    async def transfer_eth(
+            self,
+            to_address: str,
+            amount: int,
+            gas_price: Optional[int] = None) -> str:
+        if gas_price is None:
+            gas_price = self.get_current_gas_price()
+        tx = Transaction(
+            gasprice=gas_price,
+            startgas=await self.estimate_transfer_eth_gas(to_address, amount),
+            to=to_address,
+            value=amount,
+            data=b'',
+            nonce=0,  # nonce will be overridden
+        )
+        return await self._sign_and_send_transaction(tx)
+
+    async def estimate_transfer_eth_gas(
+            self,
+            to_address: str,
+            amount: int) -> int:
+        return await self._client.estimate_gas({
+            'to': to_address,
+            'from': self._address,
+            'value': amount,
+        })
+
+    def subscribe_to_direct_incoming_eth_transfers(
+            self,
+            address: str,
+            from_block: int) -> AsyncIterator[DirectEthTransfer]:
+        stream = EventStream(self._remove_eth_subscription)
+        self._eth_subscriptions.append(EthSubscription(
+            address,
+            stream,
+            from_block - 1,
+        ))
+        return stream
+
+    async def transfer_gnt(self, to_address: str, amount: int) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNT,
+            'transfer',
+            [to_address, amount],
+            SCIImplementation.GAS_GNT_TRANSFER,
+        )
+
+    def subscribe_to_gnt_transfers(
+            self,
+            from_address: Optional[str],
+            to_address: Optional[str],
+            from_block: int) -> AsyncIterator[GntTransferEvent]:
+        return self._create_subscription(
+            self._gnt,
+            'Transfer',
+            {
+                '_from': from_address,
+                '_to': to_address,
+            },
+            GntTransferEvent,
+            from_block,
+        )
+
+    async def transfer_gntb(self, to_address: str, amount: int) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTB,
+            'transfer',
+            [to_address, amount],
+            SCIImplementation.GAS_GNT_TRANSFER,
+        )
+
+    async def transfer_gntb_and_call(
+            self,
+            to_address: str,
+            amount: int,
+            data: bytes) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTB,
+            'transferAndCall',
+            [to_address, amount, data],
+            SCIImplementation.GAS_TRANSFER_AND_CALL,
+        )
+
+    async def batch_transfer(
+            self,
+            payments: List[Payment],
+            closure_time: int) -> str:
+        encoded_payments = encode_payments(
+            [p.payee for p in payments],
+            [p.amount for p in payments],
+        )
+        gas = SCIImplementation.GAS_BATCH_PAYMENT_BASE + \
+            len(payments) * SCIImplementation.GAS_PER_PAYMENT
+        return await self._send_transaction_data(
+            contracts.GNTB,
+            calldata.encode_batch_transfer(encoded_payments, closure_time),
+            gas,
+        )
+
+    async def batch_transfer_many(
+            self,
+            payments: List[Payment],
+            closure_time: int) -> List[str]:
+        encoded_payments = encode_payments(
+            [p.payee for p in payments],
+            [p.amount for p in payments],
+        )
+        chunks = split_payments(
+            encoded_payments,
+            (await self.get_latest_confirmed_block()).gas_limit,
+            self.BATCH_GAS_FILL_RATIO,
+            SCIImplementation.GAS_BATCH_PAYMENT_BASE,
+            SCIImplementation.GAS_PER_PAYMENT,
+        )
+        logger.info(
+            'Sending %d payments in %d batch transfers',
+            len(payments),
+            len(chunks),
+        )
+        return await self.send_transactions([
+            self._create_transaction(
+                contracts.GNTB,
+                calldata.encode_batch_transfer(chunk, closure_time),
+                gas,
+            )
+            for chunk, gas in chunks
+        ])
+
+    async def send_transactions(self, txs: List[Transaction]) -> List[str]:
+        async with self._tx_lock:
+            total_eth = sum(tx.startgas * tx.gasprice + tx.value for tx in txs)
+            balance = await self.get_eth_balance(self._address)
+            if total_eth > balance:
+                raise Exception(
+                    'Not enough ETH for transaction. Has {}, required {}'.format(  # noqa
+                        balance / denoms.ether,
+                        total_eth / denoms.ether,
+                    ))
+            await self._run_storage(
+                self._storage.set_nonces_sign_and_save_txs,
+                self._tx_sign,
+                txs,
+            )
+            self._eth_reserved += total_eth
+            tx_hashes = []
+            for i, tx in enumerate(txs):
+                try:
+                    tx_hashes.append(await self._send_signed_transaction(
+                        encode_hex(tx.hash),
+                        rlp.encode(tx),
+                    ))
+                except exceptions.GethError as e:
+                    logger.critical('web3 JSON rpc critical error %r', e)
+                    for unsent in reversed(txs[i:]):
+                        self._eth_reserved -= unsent.startgas * \
+                            unsent.gasprice + unsent.value
+                        await self._run_storage(self._storage.revert_last_tx)
+                    raise
+            return tx_hashes
+
+    async def get_batch_transfers(
+            self,
+            payer_address: str,
+            payee_address: str,
+            from_block: int,
+            to_block: int) -> List[BatchTransferEvent]:
+        return [event async for event in self.iter_batch_transfers(
+            payer_address,
+            payee_address,
+            from_block,
+            to_block,
+        )]
+
+    def iter_batch_transfers(
+            self,
+            payer_address: str,
+            payee_address: str,
+            from_block: int,
+            to_block: int) -> AsyncIterator[BatchTransferEvent]:
+        return self._iter_events(
+            self._gntb,
+            'BatchTransfer',
+            {
+                'from': payer_address,
+                'to': payee_address,
+            },
+            BatchTransferEvent,
+            from_block,
+            to_block,
+        )
+
+    def subscribe_to_batch_transfers(
+            self,
+            payer_address: Optional[str],
+            payee_address: Optional[str],
+            from_block: int) -> AsyncIterator[BatchTransferEvent]:
+        return self._create_subscription(
+            self._gntb,
+            'BatchTransfer',
+            {
+                'from': payer_address,
+                'to': payee_address,
+            },
+            BatchTransferEvent,
+            from_block,
+        )
+
+    async def request_gnt_from_faucet(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.Faucet,
+            'create',
+            [],
+            SCIImplementation.GAS_FAUCET,
+        )
+
+    ########################
+    # GNT-GNTB conversions #
+    ########################
+
+    async def open_gate(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTB,
+            'openGate',
+            [],
+            SCIImplementation.GAS_OPEN_GATE,
+        )
+
+    async def get_gate_address(self) -> Optional[str]:
+        addr = await self._call(
+            contracts.GNTB,
+            'getGateAddress',
+            [self._address],
+        )
+        if addr and int(addr, 16) == 0:
+            return None
+        return addr
+
+    async def transfer_from_gate(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTB,
+            'transferFromGate',
+            [],
+            SCIImplementation.GAS_TRANSFER_FROM_GATE,
+        )
+
+    async def convert_gntb_to_gnt(
+            self,
+            to_address: str,
+            amount: int,
+            gas_price: Optional[int] = None) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTB,
+            'withdrawTo',
+            [amount, to_address],
+            SCIImplementation.GAS_WITHDRAW,
+            gas_price,
+        )
+
+    ############################
+    # Concent specific methods #
+    ############################
+
+    async def get_deposit_value(self, account_address: str) -> int:
+        return await self._call(
+            contracts.GNTDeposit,
+            'balanceOf',
+            [account_address],
+        )
+
+    async def get_deposit_locked_until(self, account_address: str) -> int:
+        return await self._call(
+            contracts.GNTDeposit,
+            'getTimelock',
+            [account_address],
+        )
+
+    async def get_deposit_values(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return await self._call_many(
+            contracts.GNTDeposit,
+            'balanceOf',
+            [[address] for address in account_addresses],
+            batch_size,
+        )
+
+    async def get_deposit_locked_until_many(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return await self._call_many(
+            contracts.GNTDeposit,
+            'getTimelock',
+            [[address] for address in account_addresses],
+            batch_size,
+        )
+
+    async def deposit_payment(self, value: int) -> str:
+        return await self.transfer_gntb_and_call(
+            self._gntdeposit.address,
+            value,
+            b'',
+        )
+
+    async def unlock_deposit(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'unlock',
+            [],
+            SCIImplementation.GAS_UNLOCK_DEPOSIT,
+        )
+
+    async def lock_deposit(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'lock',
+            [],
+            SCIImplementation.GAS_UNLOCK_DEPOSIT,
+        )
+
+    async def withdraw_deposit(self) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'withdraw',
+            [self._address],
+            SCIImplementation.GAS_WITHDRAW_DEPOSIT,
+        )
+
+    async def force_subtask_payment(  # pylint: disable=too-many-arguments
+            self,
+            requestor_address: str,
+            provider_address: str,
+            value: int,
+            subtask_id: bytes,
+            v: int,
+            r: bytes,
+            s: bytes,
+            reimburse_amount: int) -> str:
+        if len(subtask_id) != 32:
+            raise ValueError('subtask_id has to be exactly 32 bytes long')
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'reimburseForSubtask',
+            [
+                requestor_address,
+                provider_address,
+                value,
+                subtask_id,
+                v,
+                r,
+                s,
+                reimburse_amount,
+            ],
+            SCIImplementation.GAS_REIMBURSE,
+        )
+
+    async def get_forced_subtask_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> List[ForcedSubtaskPaymentEvent]:
+        return [event async for event in self.iter_forced_subtask_payments(
+            requestor_address,
+            provider_address,
+            from_block,
+            to_block,
+        )]
+
+    def iter_forced_subtask_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> AsyncIterator[ForcedSubtaskPaymentEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForSubtask',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedSubtaskPaymentEvent,
+            from_block,
+            to_block,
+        )
+
+    def subscribe_to_forced_subtask_payments(
+            self,
+            requestor_address: Optional[str],
+            provider_address: Optional[str],
+            from_block: int) -> AsyncIterator[ForcedSubtaskPaymentEvent]:
+        return self._create_subscription(
+            self._gntdeposit,
+            'ReimburseForSubtask',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedSubtaskPaymentEvent,
+            from_block,
+        )
+
+    async def force_payment(  # pylint: disable=too-many-arguments
+            self,
+            requestor_address: str,
+            provider_address: str,
+            value: List[int],
+            subtask_id: List[bytes],
+            v: List[int],
+            r: List[bytes],
+            s: List[bytes],
+            reimburse_amount: int,
+            closure_time: int) -> str:
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'reimburseForNoPayment',
+            [
+                requestor_address,
+                provider_address,
+                value,
+                subtask_id,
+                v,
+                r,
+                s,
+                reimburse_amount,
+                closure_time,
+            ],
+            SCIImplementation.GAS_REIMBURSE +
+            len(value) * SCIImplementation.GAS_REIMBURSE_PER_SUBTASK,
+        )
+
+    async def get_forced_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> List[ForcedPaymentEvent]:
+        return [event async for event in self.iter_forced_payments(
+            requestor_address,
+            provider_address,
+            from_block,
+            to_block,
+        )]
+
+    def iter_forced_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> AsyncIterator[ForcedPaymentEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForNoPayment',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedPaymentEvent,
+            from_block,
+            to_block,
+        )
+
+    def subscribe_to_forced_payments(
+            self,
+            requestor_address: Optional[str],
+            provider_address: Optional[str],
+            from_block: int) -> AsyncIterator[ForcedPaymentEvent]:
+        return self._create_subscription(
+            self._gntdeposit,
+            'ReimburseForNoPayment',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedPaymentEvent,
+            from_block,
+        )
+
+    async def cover_additional_verification_cost(
+            self,
+            address: str,
+            value: int,
+            subtask_id: bytes,
+            v: int,
+            r: bytes,
+            s: bytes,
+            reimburse_amount: int) -> str:
+        if len(subtask_id) != 32:
+            raise ValueError('subtask_id has to be exactly 32 bytes long')
+        return await self._create_and_send_transaction(
+            contracts.GNTDeposit,
+            'reimburseForVerificationCosts',
+            [address, value, subtask_id, v, r, s, reimburse_amount],
+            SCIImplementation.GAS_REIMBURSE,
+        )
+
+    async def get_covered_additional_verification_costs(
+            self,
+            address: str,
+            from_block: int,
+            to_block: int) -> List[CoverAdditionalVerificationEvent]:
+        events = self.iter_covered_additional_verification_costs(
+            address,
+            from_block,
+            to_block,
+        )
+        return [event async for event in events]
+
+    def iter_covered_additional_verification_costs(
+            self,
+            address: str,
+            from_block: int,
+            to_block: int) -> AsyncIterator[CoverAdditionalVerificationEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForVerificationCosts',
+            {
+                '_from': address,
+            },
+            CoverAdditionalVerificationEvent,
+            from_block,
+            to_block,
+        )
+
+    ###########
+    # Helpers #
+    ###########
+
+    def _confirmed_receipt(self, raw) -> Optional[TransactionReceipt]:
+        if not raw:
+            return None
+        receipt = TransactionReceipt(raw)
+        if receipt.block_number > self._confirmed_block:
+            return None
+        return receipt
+
+    async def _run_storage(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
+    def _await_receipt(self, tx_hash: str) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self._awaiting_receipts.setdefault(tx_hash.lower(), []).append(future)
+        return future
+
+    def _call_tx(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args: List[Any]) -> Dict[str, Any]:
+        if contract not in self._contract_addresses:
+            raise Exception('Address not provided for {}'.format(contract))
+        # web3 only takes checksum addresses in the requests
+        return {
+            'from': to_checksum_address(self._address),
+            'to': to_checksum_address(self._contract_addresses[contract]),
+            'data': encode_hex(calldata.encode(contract, fn_name, args)),
+        }
+
+    async def _call(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args: List[Any]) -> Any:
+        raw = await self._client.call(
+            self._call_tx(contract, fn_name, args),
+            self._confirmed_block,
+        )
+        return calldata.decode_output(contract, fn_name, HexBytes(raw))
+
+    async def _call_many(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args_list: List[List[Any]],
+            batch_size: Optional[int]) -> List[Any]:
+        """
+        Same as `SCIImplementation._call_many`.
+        """
+        block = self._confirmed_block
+        raw_results = _raise_errors(await self._client.batch_request(
+            [
+                ('eth_call', [self._call_tx(contract, fn_name, args), block])
+                for args in args_list
+            ],
+            batch_size=batch_size,
+        ))
+        return [
+            calldata.decode_output(contract, fn_name, HexBytes(raw))
+            for raw in raw_results
+        ]
+
+    async def _iter_events(  # pylint: disable=too-many-arguments
+            self,
+            contract,
+            event_name: str,
+            args: Dict[str, Any],
+            event_cls,
+            from_block: int,
+            to_block: int) -> AsyncIterator[Any]:
+        """
+        Streams the events with eth_getLogs over consecutive chunks of the
+        block range, a chunk the node refuses because of its size is split.
+        """
+        topics = get_event_topics(contract, event_name, args)
+        chunk_size = self.LOGS_CHUNK_SIZE
+        start = from_block
+        while start <= to_block:
+            end = min(to_block, start + chunk_size - 1)
+            try:
+                logs = await self._client.get_raw_logs(
+                    contract.address,
+                    topics,
+                    start,
+                    end,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                if start == end or not is_range_too_large(e):
+                    raise
+                chunk_size = (end - start + 1) // 2
+                continue
+            for raw_log in logs:
+                yield event_cls(raw_log)
+            start = end + 1
+
+    async def _sign_and_send_transaction(self, tx: Transaction) -> str:
+        return (await self.send_transactions([tx]))[0]
+
+    async def _send_signed_transaction(
+            self,
+            tx_hash: str,
+            raw_tx: bytes) -> str:
+        try:
+            try:
+                return await self._client.send_raw(raw_tx)
+            except exceptions.KnownTransaction:
+                return tx_hash
+            except exceptions.NonceTooLow:
+                if await self._client.get_transaction_receipt(tx_hash):
+                    return tx_hash
+                raise
+        except exceptions.GethError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            # We don't need to do anything explicitly, it will be retried
+            logger.exception(
+                'Exception while sending transaction, will be retried',
+            )
+            return tx_hash
+
+    async def _create_and_send_transaction(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args: List[Any],
+            gas_limit: int,
+            gas_price: Optional[int] = None) -> str:
+        return await self._send_transaction_data(
+            contract,
+            calldata.encode(contract, fn_name, args),
+            gas_limit,
+            gas_price,
+        )
+
+    async def _send_transaction_data(
+            self,
+            contract: contracts.Contract,
+            data: bytes,
+            gas_limit: int,
+            gas_price: Optional[int] = None) -> str:
+        return await self._sign_and_send_transaction(self._create_transaction(
+            contract,
+            data,
+            gas_limit,
+            gas_price,
+        ))
+
+    def _create_transaction(
+            self,
+            contract: contracts.Contract,
+            data: bytes,
+            gas_limit: int,
+            gas_price: Optional[int] = None) -> Transaction:
+        if contract not in self._contract_addresses:
+            raise Exception('Address not provided for {}'.format(contract))
+        if gas_price is None:
+            gas_price = self.get_current_gas_price()
+        return Transaction(
+            gasprice=gas_price,
+            startgas=gas_limit,
+            to=self._contract_addresses[contract],
+            value=0,
+            data=data,
+            nonce=0,  # nonce will be overridden
+        )
+
+    def _create_subscription(
+            self,
+            contract,
+            event_name: str,
+            args: Dict[str, Any],
+            event_cls,
+            from_block: int) -> EventStream:
+        stream = EventStream(self._remove_subscription)
+        self._subscriptions.append(Subscription(
+            contract,
+            event_name,
+            args,
+            event_cls,
+            stream,
+            from_block - 1,
+        ))
+        return stream
+
+    def _remove_subscription(self, stream: EventStream) -> None:
+        self._subscriptions = \
+            [sub for sub in self._subscriptions if sub.cb is not stream]
+
+    def _remove_eth_subscription(self, stream: EventStream) -> None:
+        self._eth_subscriptions = \
+            [sub for sub in self._eth_subscriptions if sub.cb is not stream]
+
+    ###########
+    # Monitor #
+    ###########
+
+    async def _monitor(self) -> None:
+        logger.debug("Async SCI monitor: started")
+        while True:
+            try:
+                await self._monitor_single()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Blockchain monitor exception')
+            await asyncio.sleep(self.MONITOR_INTERVAL)
+
+    async def _monitor_single(self) -> None:
+        if not await self._update_block_numbers():
+            return
+        steps = (
+            self._update_gas_price,
+            self._pull_subscription_events,
+            self._pull_eth_subscription_events,
+            self._process_transactions,
+        )
+        for step in steps:
+            await step()
+
+    async def _update_block_numbers(self) -> bool:
+        latest_block = await self._client.get_block_number()
+        confirmed_block = latest_block - self.REQUIRED_CONFS + 1
+        if confirmed_block <= self._confirmed_block:
+            return False
+        self._confirmed_block = confirmed_block
+        return True
+
+    async def _update_gas_price(self) -> None:
+        self._gas_price = max(
+            SCIImplementation.GAS_PRICE_MIN,
+            min(
+                SCIImplementation.GAS_PRICE,
+                await self._client.get_gas_price(),
+            ),
+        )
+
+    async def _pull_subscription_events(self) -> None:
+        subs_by_contract: Dict[str, List[Subscription]] = {}
+        for sub in self._subscriptions:
+            if sub.last_pulled_block >= self._confirmed_block:
+                continue
+            subs_by_contract.setdefault(sub.contract.address, []).append(sub)
+        for address, subs in subs_by_contract.items():
+            to_block = self._confirmed_block
+            try:
+                logs = await self._client.get_raw_logs(
+                    address,
+                    merge_topics(subs),
+                    min(sub.last_pulled_block for sub in subs) + 1,
+                    to_block,
+                )
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Exception while processing subscription')
+                continue
+            subs_by_topics: Dict[Tuple, List[Subscription]] = {}
+            for sub in subs:
+                subs_by_topics.setdefault(sub.topics_key(), []).append(sub)
+            for log in logs:
+                for sub in matching_subscriptions(log, subs_by_topics):
+                    if log['blockNumber'] > sub.last_pulled_block:
+                        sub.cb.put(sub.event_cls(log))
+            for sub in subs:
+                sub.last_pulled_block = to_block
+
+    async def _find_incoming_eth_transfers(
+            self,
+            from_block: int,
+            to_block: int,
+            address: str,
+            from_block_balance: Optional[int] = None,
+            to_block_balance: Optional[int] = None) -> List[DirectEthTransfer]:
+        """
+        Same approximation as `SCIImplementation._find_incoming_eth_transfers`
+        """
+        if from_block_balance is None:
+            from_block_balance = \
+                await self._client.get_balance(address, from_block)
+        if to_block_balance is None:
+            to_block_balance = await self._client.get_balance(address, to_block)
+        if to_block_balance <= from_block_balance:
+            return []
+        if to_block - from_block < 4:
+            raw_blocks = await self._client.batch_request([
+                ('eth_getBlockByNumber', [block_number, True])
+                for block_number in range(from_block + 1, to_block + 1)
+            ])
+            result = []
+            for raw_block in raw_blocks:
+                if isinstance(raw_block, Exception):
+                    raise raw_block
+                for tx in raw_block['transactions']:
+                    if tx['to'] == address:
+                        result.append(DirectEthTransfer(tx))
+            return result
+        mid = (from_block + to_block) // 2
+        mid_block_balance = await self._client.get_balance(address, mid)
+        result = await self._find_incoming_eth_transfers(
+            from_block,
+            mid,
+            address,
+            from_block_balance,
+            mid_block_balance,
+        )
+        result.extend(await self._find_incoming_eth_transfers(
+            mid,
+            to_block,
+            address,
+            mid_block_balance,
+            to_block_balance,
+        ))
+        return result
+
+    async def _pull_eth_subscription_events(self) -> None:
+        for sub in list(self._eth_subscriptions):
+            if sub.last_pulled_block >= self._confirmed_block:
+                continue
+            to_block = self._confirmed_block
+            try:
+                transfers = await self._find_incoming_eth_transfers(
+                    sub.last_pulled_block,
+                    to_block,
+                    sub.address,
+                )
+                for t in transfers:
+                    sub.cb.put(t)
+                sub.last_pulled_block = to_block
+            except exceptions.MissingTrieNode as e:
+                sub.last_pulled_block = to_block
+                logger.warning(
+                    'Error while processing eth subscription: %r',
+                    e,
+                )
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Error while processing eth subscription')
+
+    async def _process_transactions(self) -> None:
+        async with self._tx_lock:
+            transactions = await self._run_storage(self._storage.get_all_tx)
+        sent_transactions = {encode_hex(tx.hash): tx for tx in transactions}
+        tx_hashes = list(dict.fromkeys(
+            list(sent_transactions) + list(self._awaiting_receipts)))
+        raw_receipts = await self._client.get_transaction_receipts(tx_hashes)
+        receipts = {}
+        for tx_hash, raw in zip(tx_hashes, raw_receipts):
+            if isinstance(raw, Exception):
+                logger.warning(
+                    'Exception while getting receipt for %s: %r',
+                    tx_hash,
+                    raw,
+                )
+                continue
+            receipt = self._confirmed_receipt(raw)
+            if receipt:
+                receipts[tx_hash] = receipt
+
+        for tx_hash, receipt in receipts.items():
+            for future in self._awaiting_receipts.pop(tx_hash, []):
+                if not future.done():
+                    future.set_result(receipt)
+
+        unconfirmed = []
+        for tx_hash, tx in sent_transactions.items():
+            if tx_hash not in receipts:
+                unconfirmed.append((tx_hash, tx))
+                continue
+            try:
+                async with self._tx_lock:
+                    await self._run_storage(self._storage.remove_tx, tx.nonce)
+                self._eth_reserved -= tx.value + tx.gasprice * tx.startgas
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Exception while removing transaction %s",
+                    tx_hash,
+                )
+
+        raw_txs = await self._client.get_transactions(
+            [tx_hash for tx_hash, _ in unconfirmed],
+        )
+        for (tx_hash, tx), tx_res in zip(unconfirmed, raw_txs):
+            try:
+                if isinstance(tx_res, Exception):
+                    raise tx_res
+                if tx_res is None:
+                    logger.info('Resending transaction %r', tx_hash)
+                    await self._client.send_raw(tx.raw)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Exception while resending transaction %s",
+                    tx_hash,
+                )
@@ -0,0 +1,156 @@
+import collections
+import logging
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Iterator, List, Optional, Tuple
+
+import requests
+from web3.utils.threads import Timeout
+
+from . import exceptions
+
+logger = logging.getLogger(__name__)
+
+GetLogs = Callable[[int, int], List[Any]]
+
+
+def is_range_too_large(e: Exception) -> bool:
+    """
+    Whether the node gave up on a logs query because of the size of the
+    block range, either hitting its result limit or timing out.
+    """
+    if isinstance(e, exceptions.TooManyResults):
+        return True
+    if isinstance(e, (
+            exceptions.RequestTimeout,
+            requests.exceptions.Timeout,
+            socket.timeout,
+            Timeout)):
+        return True
+    if isinstance(e, exceptions.GethError):
+        message = e.message.lower()
+        return 'timeout' in message or 'timed out' in message
+    return False
+
+
+class LogBackfill:
+    """
+    Fetches logs of long block ranges in chunks, `workers` of them at the
+    same time, and hands them out in block order. Chunk size adapts to the
+    node: a chunk the node refuses because of its size is split in halves
+    and the following chunks are made smaller, after a chunk returning less
+    than `small_response` logs the chunk size is doubled again.
+    A range fitting in a single chunk is fetched right away in the calling
+    thread.
+    """
+
+    WORKERS = 4
+    INITIAL_CHUNK_SIZE = 5000
+    MAX_CHUNK_SIZE = 100000
+    SMALL_RESPONSE = 1000
+
+    def __init__(
+            self,
+            workers: int = WORKERS,
+            initial_chunk_size: int = INITIAL_CHUNK_SIZE,
+            max_chunk_size: int = MAX_CHUNK_SIZE,
+            small_response: int = SMALL_RESPONSE) -> None:
+        if workers < 1:
+            raise ValueError('Backfill needs at least one worker')
+        self._workers = workers
+        self._max_chunk_size = max_chunk_size
+        self._small_response = small_response
+        self._chunk_size = min(initial_chunk_size, max_chunk_size)
+        self._executor_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    def stop(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def iter_logs(
+            self,
+            get_logs: GetLogs,
+            from_block: int,
+            to_block: int) -> Iterator[Tuple[int, int, List[Any]]]:
+        """
+        Yields (from_block, to_block, logs) for consecutive chunks covering
+        the range, both ends inclusive. get_logs is called with the bounds
+        of every chunk, possibly from other threads.
+        """
+        pending: Deque[Tuple[int, int, Future]] = collections.deque()
+        next_block = from_block
+        try:
+            while pending or next_block <= to_block:
+                if not pending and \
+                        to_block - next_block < self._chunk_size:
+                    # Last chunk, no point going through the workers
+                    pending.append(self._call(get_logs, next_block, to_block))
+                    next_block = to_block + 1
+                while next_block <= to_block and \
+                        len(pending) < 2 * self._workers:
+                    end = min(to_block, next_block + self._chunk_size - 1)
+                    pending.append(self._submit(get_logs, next_block, end))
+                    next_block = end + 1
+                start, end, future = pending.popleft()
+                try:
+                    logs = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    if start == end or not is_range_too_large(e):
+                        raise
+                    self._shrink(end - start + 1, e)
+                    mid = (start + end) // 2
+                    pending.appendleft(self._submit(get_logs, mid + 1, end))
+                    pending.appendleft(self._submit(get_logs, start, mid))
+                    continue
+                self._grow(end - start + 1, len(logs))
+                yield start, end, logs
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+    def _call(
+            self,
+            get_logs: GetLogs,
+            from_block: int,
+            to_block: int) -> Tuple[int, int, Future]:
+        future: Future = Future()
+        try:
+            future.set_result(get_logs(from_block, to_block))
+        except Exception as e:  # pylint: disable=broad-except
+            future.set_exception(e)
+        return from_block, to_block, future
+
+    def _submit(
+            self,
+            get_logs: GetLogs,
+            from_block: int,
+            to_block: int) -> Tuple[int, int, Future]:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._workers)
+            future = self._executor.submit(get_logs, from_block, to_block)
+        return from_block, to_block, future
+
+    def _shrink(self, size: int, e: Exception) -> None:
+        chunk_size = max(1, min(self._chunk_size, size // 2))
+        if chunk_size != self._chunk_size:
+            logger.info(
+                'Logs query too large (%r), chunk size %d -> %d',
+                e,
+                self._chunk_size,
+                chunk_size,
+            )
+            self._chunk_size = chunk_size
+
+    def _grow(self, size: int, logs_count: int) -> None:
+        if logs_count >= self._small_response or size < self._chunk_size:
+            return
+        self._chunk_size = min(self._max_chunk_size, 2 * self._chunk_size)
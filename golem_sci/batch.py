@@ -0,0 +1,139 @@
+import json
+import socket
+from typing import Any, Dict, List, Sequence, Tuple
+
+from eth_utils import to_bytes, to_text
+from web3.middleware import combine_middlewares
+from web3.providers import HTTPProvider, IPCProvider
+from web3.utils.request import make_post_request
+from web3.utils.threads import Timeout
+
+RpcCall = Tuple[str, Sequence[Any]]
+
+
+class _RequestRecorded(Exception):
+    pass
+
+
+def _request_fn(web3, provider_fn):
+    return combine_middlewares(
+        middlewares=tuple(web3.middleware_stack),
+        web3=web3,
+        provider_request_fn=provider_fn,
+    )
+
+
+def format_request(web3, method: str, params: Sequence[Any]) -> RpcCall:
+    """
+    Runs the call through the web3 middleware stack and returns the request
+    exactly as it would be sent to the provider.
+    """
+    recorded: List[RpcCall] = []
+
+    def record(m, p):
+        recorded.append((m, p))
+        raise _RequestRecorded()
+
+    try:
+        _request_fn(web3, record)(method, params)
+    except _RequestRecorded:
+        pass
+    return recorded[0]
+
+
+def format_response(
+        web3,
+        method: str,
+        params: Sequence[Any],
+        response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the raw provider response through the web3 middleware stack so the
+    result looks the same as if it was obtained with a regular request.
+    """
+    return _request_fn(web3, lambda m, p: response)(method, params)
+
+
+def encode_batch(provider, calls: Sequence[RpcCall]) -> bytes:
+    return to_bytes(text=json.dumps([
+        {
+            'jsonrpc': '2.0',
+            'method': method,
+            'params': params or [],
+            'id': next(provider.request_counter),
+        } for method, params in calls
+    ]))
+
+
+def decode_batch(
+        requests: bytes,
+        raw_response: bytes) -> List[Dict[str, Any]]:
+    """
+    JSON-RPC doesn't guarantee the order of responses in a batch so we match
+    them by id.
+    """
+    responses = json.loads(to_text(raw_response))
+    if not isinstance(responses, list):
+        # Whole batch has been rejected, e.g. invalid request
+        raise ValueError(responses.get('error', responses))
+    by_id = {response['id']: response for response in responses}
+    return [by_id[request['id']] for request in json.loads(to_text(requests))]
+
+
+def _make_ipc_batch_request(provider: IPCProvider, request: bytes) -> bytes:
+    # Reusing the provider's connection, this mirrors IPCProvider.make_request
+    # pylint: disable=protected-access
+    with provider._lock, provider._socket as sock:
+        try:
+            sock.sendall(request)
+        except BrokenPipeError:
+            # one extra attempt, then give up
+            sock = provider._socket.reset()
+            sock.sendall(request)
+
+        raw_response = b''
+        with Timeout(provider.timeout) as timeout:
+            while True:
+                try:
+                    raw_response += sock.recv(4096)
+                except socket.timeout:
+                    timeout.sleep(0)
+                    continue
+                if raw_response == b'':
+                    timeout.sleep(0)
+                    continue
+                try:
+                    json.loads(to_text(raw_response))
+                except ValueError:
+                    timeout.sleep(0)
+                    continue
+                return raw_response
+
+
+def _make_http_batch_request(provider: HTTPProvider, request: bytes) -> bytes:
+    return make_post_request(
+        provider.endpoint_uri,
+        request,
+        **provider.get_request_kwargs()
+    )
+
+
+def supports_batch(provider) -> bool:
+    return isinstance(provider, (IPCProvider, HTTPProvider))
+
+
+def make_batch_request(
+        provider,
+        calls: Sequence[RpcCall]) -> List[Dict[str, Any]]:
+    """
+    Sends all the calls as a single JSON-RPC array request and returns raw
+    responses in the same order as the calls.
+    """
+    if isinstance(provider, IPCProvider):
+        send = _make_ipc_batch_request
+    elif isinstance(provider, HTTPProvider):
+        send = _make_http_batch_request
+    else:
+        raise TypeError('Batch requests are not supported by {}'.format(
+            type(provider).__name__))
+    request = encode_batch(provider, calls)
+    return decode_batch(request, send(provider, request))
@@ -0,0 +1,94 @@
+import json
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+from eth_abi import decode_abi, encode_abi
+from eth_utils import (
+    function_signature_to_4byte_selector,
+    to_checksum_address,
+)
+
+from . import contracts
+
+
+class _Function(NamedTuple):
+    selector: bytes
+    types: List[str]
+    output_types: List[str]
+
+
+def _parse_abi(abi: str) -> Dict[str, _Function]:
+    functions: Dict[str, _Function] = {}
+    for entry in json.loads(abi):
+        if entry['type'] != 'function':
+            continue
+        name = entry['name']
+        if name in functions:
+            raise ValueError('Overloaded function {}'.format(name))
+        types = [arg['type'] for arg in entry['inputs']]
+        functions[name] = _Function(
+            selector=function_signature_to_4byte_selector(
+                '{}({})'.format(name, ','.join(types))),
+            types=types,
+            output_types=[arg['type'] for arg in entry.get('outputs', [])],
+        )
+    return functions
+
+
+# Selectors and argument types of all the functions, computed once on import
+_functions: Dict[contracts.Contract, Dict[str, _Function]] = {
+    contract: _parse_abi(contracts.get_abi(contract))
+    for contract in contracts.Contract
+}
+
+
+def get_selector(contract: contracts.Contract, fn_name: str) -> bytes:
+    return _functions[contract][fn_name].selector
+
+
+def encode(
+        contract: contracts.Contract,
+        fn_name: str,
+        args: Sequence[Any]) -> bytes:
+    """
+    Encodes the call data for the contract function without going through
+    web3, so it never talks to the node.
+    """
+    fn = _functions[contract][fn_name]
+    return fn.selector + encode_abi(fn.types, args)
+
+
+def decode_output(
+        contract: contracts.Contract,
+        fn_name: str,
+        data: bytes) -> Any:
+    """
+    Decodes the result of an eth_call of the contract function, a single
+    value unless the function returns more of them. Addresses are
+    checksummed, the way web3 returns them.
+    """
+    output_types = _functions[contract][fn_name].output_types
+    output = [
+        to_checksum_address(value) if output_type == 'address' else value
+        for output_type, value in zip(
+            output_types,
+            decode_abi(output_types, data),
+        )
+    ]
+    return output[0] if len(output) == 1 else tuple(output)
+
+
+def encode_batch_transfer(payments: bytes, closure_time: int) -> bytes:
+    """
+    Call data for GNTB's batchTransfer with the payment words already
+    concatenated, see `implementation.encode_payments`.
+    """
+    if len(payments) % 32:
+        raise ValueError('Payments have to be a multiple of 32 bytes')
+    return b''.join([
+        get_selector(contracts.GNTB, 'batchTransfer'),
+        # Offset of the dynamic array which follows the static head
+        (2 * 32).to_bytes(32, 'big'),
+        closure_time.to_bytes(32, 'big'),
+        (len(payments) // 32).to_bytes(32, 'big'),
+        payments,
+    ])
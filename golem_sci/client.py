@@ -1,16 +1,34 @@
+import collections
+import functools
 import json
 import logging
+import threading
 import time
 from calendar import timegm
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, Union
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from ethereum.utils import zpad
 import pytz
 import rlp
 from web3.utils.filters import construct_event_filter_params
+from web3.utils.threads import Timeout
 
-from . import exceptions
+from . import batch, exceptions
+from .lrucache import CacheStats, LRUCache
 
 logger = logging.getLogger(__name__)
 
@@ -24,19 +42,382 @@ def get_timestamp_utc():
     return datetime_to_timestamp(now)
 
 
+def get_event_topics(
+        contract,
+        event_name: str,
+        args: Dict[str, Any]) -> List[Optional[str]]:
+    """
+    Returns the log topics filter for the contract's event. Arguments that are
+    None match any value.
+    """
+    event_abi = list(filter(
+        lambda e: e['type'] == 'event' and e['name'] == event_name,
+        contract.abi,
+    ))[0]
+    for name in args:
+        assert any(name == event['name'] for event in event_abi['inputs'])
+    _, filter_args = construct_event_filter_params(
+        event_abi,
+        contract_address=contract.address,
+        argument_filters=args,
+    )
+    return [
+        topic.lower() if topic is not None else None
+        for topic in filter_args['topics']
+    ]
+
+
+# Errors meaning the node couldn't be reached, as opposed to the node
+# answering with an error. Calls exceeding their timeout in `Client` are
+# not among them, those are usually too heavy rather than the node down.
+_CONNECTION_ERRORS = (OSError, Timeout)
+
+# Errors a healthy node answers with when the request itself can't be
+# served, e.g. a transaction that's invalid or already known or a reverted
+# call. Those don't count towards the circuit breaker.
+_REQUEST_ERRORS = (
+    exceptions.KnownTransaction,
+    exceptions.NonceTooLow,
+    exceptions.FilterNotFound,
+    exceptions.TooManyResults,
+)
+_REQUEST_ERROR_MESSAGES = (
+    'revert',
+    'insufficient funds',
+    'intrinsic gas too low',
+    'underpriced',
+    'exceeds block gas limit',
+    'gas required exceeds allowance',
+)
+
+
+def _is_node_fault(e: exceptions.GethError) -> bool:
+    if isinstance(e, _REQUEST_ERRORS):
+        return False
+    message = str(e.message).lower()
+    return not any(m in message for m in _REQUEST_ERROR_MESSAGES)
+
+
+class _Endpoint:
+    # Weight of the latest request in the latency average
+    LATENCY_SMOOTHING = 0.2
+
+    def __init__(self, web3) -> None:
+        self.web3 = web3
+        self.healthy = True
+        self.synchronized = True
+        self.latency = 0.0
+        # Circuit breaker state
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+
+    def record_latency(self, duration: float) -> None:
+        if not self.latency:
+            self.latency = duration
+            return
+        self.latency += self.LATENCY_SMOOTHING * (duration - self.latency)
+
+    def is_ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def __str__(self) -> str:
+        return str(self.web3.providers[0])
+
+
+def _block_size(block) -> int:
+    # Full blocks take as much space as the transactions in them
+    if block is None:
+        return 1
+    return 1 + sum(
+        1 for tx in block['transactions'] if isinstance(tx, Mapping))
+
+
+def _routed(f):
+    """
+    Runs the method against the preferred endpoint failing over to the next
+    ones if it can't be reached, see `Client`.
+    """
+    @functools.wraps(f)
+    def curry(self, *args, **kwargs):
+        return self._call_routed(  # pylint: disable=protected-access
+            f, self, *args, **kwargs)
+    return curry
+
+
+def _pinned(f):
+    """
+    Always runs the method against the first endpoint.
+    """
+    @functools.wraps(f)
+    def curry(self, *args, **kwargs):
+        return self._call_on(  # pylint: disable=protected-access
+            self._endpoints[0], f, self, *args, **kwargs)
+    return curry
+
+
 class Client(object):
-    """ RPC interface client for Ethereum node."""
+    """
+    RPC interface client for Ethereum node.
+    May be given a list of web3 instances connected to different nodes of the
+    same chain. Those are health checked every HEALTH_CHECK_INTERVAL seconds
+    from a background thread and reads go to the fastest reachable and
+    synchronized one, failing over to the others when it can't be reached.
+    Transactions are sent to all the healthy ones at once so they propagate
+    faster. Filters live on a single node so
+    they are always handled by the first one.
+    Reads of the methods with a timeout set in `timeouts` give up after it
+    and raise RequestTimeout, the node is still considered healthy unless
+    the health check says otherwise.
+    With hedge_percentile, a read taking longer than that percentile of the
+    recent latencies of the method is also sent to the next node and the
+    first answer is used. A node answering CIRCUIT_BREAKER_THRESHOLD reads
+    in a row with an error showing a fault of the node, like a missing trie
+    node or an internal error, is not used for CIRCUIT_BREAKER_COOLDOWN
+    seconds unless there is no other one.
+    Blocks, transactions, receipts and balances at or below the block set
+    with `set_confirmed_block` are cached, those can't change anymore.
+    """
 
     SYNC_CHECK_INTERVAL = 10
-
-    def __init__(self, web3):
-        self.web3 = web3
-        # Set fake default account.
-        self.web3.eth.defaultAccount = '\xff' * 20
+    HEALTH_CHECK_INTERVAL = 10
+    # Maximum number of calls sent in a single JSON-RPC batch request
+    MAX_BATCH_SIZE = 500
+    TIMEOUTS: Dict[str, Optional[float]] = {
+        'get_raw_logs': 120.0,
+        'batch_request': 60.0,
+        'check_synchronized': 10.0,
+        'send_raw': 30.0,
+    }
+    # Latencies of the last that many requests are kept for every method
+    HEDGE_SAMPLES = 100
+    HEDGE_MIN_SAMPLES = 20
+    CIRCUIT_BREAKER_THRESHOLD = 5
+    CIRCUIT_BREAKER_COOLDOWN = 60
+    REQUEST_WORKERS = 16
+    # Total size of the cached confirmed data, see `_block_size`
+    CACHE_SIZE = 10000
+
+    def __init__(
+            self,
+            web3,
+            timeouts: Optional[Dict[str, Optional[float]]] = None,
+            hedge_percentile: Optional[float] = None,
+            cache_size: int = CACHE_SIZE) -> None:
+        web3s = web3 if isinstance(web3, (list, tuple)) else [web3]
+        if not web3s:
+            raise ValueError('At least one web3 instance is required')
+        self._endpoints = [_Endpoint(w) for w in web3s]
+        # Endpoint the current thread is talking to
+        self._local = threading.local()
+        self._health_lock = threading.Lock()
+        self._stopped = threading.Event()
+        for endpoint in self._endpoints:
+            # Set fake default account.
+            endpoint.web3.eth.defaultAccount = '\xff' * 20
+        self._timeouts = dict(self.TIMEOUTS)
+        self._timeouts.update(timeouts or {})
+        self._hedge_percentile = hedge_percentile
+        self._latencies_lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._executor = ThreadPoolExecutor(self.REQUEST_WORKERS)
+        self._cache = LRUCache(cache_size)
+        self._confirmed_block = -1
         self._last_sync_check = 0
         self._sync = False
         self._is_stopped = False
+        if len(self._endpoints) > 1:
+            threading.Thread(
+                target=self._health_check_loop,
+                name='Ethereum nodes health check',
+                daemon=True,
+            ).start()
+
+    @property
+    def web3(self):
+        endpoint = getattr(self._local, 'endpoint', None)
+        if endpoint is None:
+            endpoint = self._preferred_endpoints()[0]
+        return endpoint.web3
+
+    def _preferred_endpoints(self) -> List[_Endpoint]:
+        if len(self._endpoints) == 1:
+            return self._endpoints
+        return sorted(
+            self._endpoints,
+            key=lambda e: (
+                not e.healthy,
+                e.is_ejected(),
+                not e.synchronized,
+                e.latency,
+            ),
+        )
+
+    def _call_on(self, endpoint: _Endpoint, f, *args, **kwargs):
+        if getattr(self._local, 'endpoint', None) is not None:
+            # Nested call, stays with the endpoint of the outer one
+            return f(*args, **kwargs)
+        self._local.endpoint = endpoint
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self._local.endpoint = None
+
+    def _call_routed(self, f, *args, **kwargs):
+        if getattr(self._local, 'endpoint', None) is not None:
+            return f(*args, **kwargs)
+        endpoints = self._preferred_endpoints()
+        failed: List[_Endpoint] = []
+        while True:
+            try:
+                return self._request(endpoints, failed, f, *args, **kwargs)
+            except _CONNECTION_ERRORS as e:
+                logger.warning('Node %s unreachable: %r', failed[-1], e)
+                endpoints = [
+                    endpoint for endpoint in endpoints
+                    if endpoint not in failed
+                ]
+                if not endpoints:
+                    raise
+
+    def _request(self, endpoints: List[_Endpoint], failed, f, *args, **kwargs):
+        """
+        Runs the request against the first endpoint. When hedging it may be
+        also sent to the second one, the first answer is returned. Endpoints
+        which couldn't be reached are appended to failed.
+        """
+        # Named after the public method also for the cached ones
+        method = f.__name__.lstrip('_')
+        timeout = self._timeouts.get(method)
+        start = time.monotonic()
+        hedge_at = start + self._hedge_delay(method) \
+            if len(endpoints) > 1 else float('inf')
+        if timeout is None and hedge_at == float('inf') or self._is_stopped:
+            # Nothing to wait for, no need for another thread
+            return self._handle_result(
+                endpoints[0], failed, method, start,
+                lambda: self._call_on(endpoints[0], f, *args, **kwargs))
+        deadline = start + timeout if timeout is not None else float('inf')
+        pending = {
+            self._submit(endpoints[0], f, *args, **kwargs): endpoints[0],
+        }
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                # Up to the caller, e.g. to ask for a smaller logs range
+                raise exceptions.RequestTimeout(
+                    '{} timed out after {}s'.format(method, timeout))
+            if now >= hedge_at:
+                logger.debug('Hedging %s to %s', method, endpoints[1])
+                hedge_at = float('inf')
+                pending[self._submit(
+                    endpoints[1], f, *args, **kwargs,
+                )] = endpoints[1]
+            done, _ = futures.wait(
+                pending,
+                timeout=min(deadline, hedge_at) - now,
+                return_when=futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    return self._handle_result(
+                        endpoint, failed, method, start, future.result)
+                except _CONNECTION_ERRORS:
+                    if not pending:
+                        raise
+                    # The other request may still succeed
+
+    def _submit(self, endpoint: _Endpoint, f, *args, **kwargs) -> Future:
+        try:
+            return self._executor.submit(
+                self._call_on, endpoint, f, *args, **kwargs)
+        except RuntimeError:
+            # Stopped in the meantime, done right away in this thread
+            future: Future = Future()
+            try:
+                future.set_result(self._call_on(endpoint, f, *args, **kwargs))
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception(e)
+            return future
 
+    def _handle_result(
+            self,
+            endpoint: _Endpoint,
+            failed: List[_Endpoint],
+            method: str,
+            start: float,
+            get_result: Callable[[], Any]) -> Any:
+        try:
+            result = get_result()
+        except _CONNECTION_ERRORS:
+            endpoint.healthy = False
+            failed.append(endpoint)
+            raise
+        except exceptions.GethError as e:
+            if not _is_node_fault(e):
+                # The node works fine, it's the request
+                endpoint.consecutive_errors = 0
+                raise
+            endpoint.consecutive_errors += 1
+            if endpoint.consecutive_errors >= self.CIRCUIT_BREAKER_THRESHOLD \
+                    and len(self._endpoints) > 1 \
+                    and not endpoint.is_ejected():
+                logger.warning(
+                    'Node %s keeps failing, not using it for %ds',
+                    endpoint,
+                    self.CIRCUIT_BREAKER_COOLDOWN,
+                )
+                endpoint.ejected_until = \
+                    time.monotonic() + self.CIRCUIT_BREAKER_COOLDOWN
+            raise
+        duration = time.monotonic() - start
+        endpoint.consecutive_errors = 0
+        endpoint.record_latency(duration)
+        with self._latencies_lock:
+            self._latencies.setdefault(
+                method,
+                collections.deque(maxlen=self.HEDGE_SAMPLES),
+            ).append(duration)
+        return result
+
+    def _hedge_delay(self, method: str) -> float:
+        if self._hedge_percentile is None:
+            return float('inf')
+        with self._latencies_lock:
+            samples = sorted(self._latencies.get(method, ()))
+        if len(samples) < self.HEDGE_MIN_SAMPLES:
+            return float('inf')
+        index = int(len(samples) * self._hedge_percentile / 100)
+        return samples[min(index, len(samples) - 1)]
+
+    def _health_check_loop(self) -> None:
+        while not self._stopped.wait(self.HEALTH_CHECK_INTERVAL):
+            try:
+                self._check_endpoints()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Nodes health check failed')
+
+    def _check_endpoints(self) -> None:
+        with self._health_lock:
+            for endpoint in self._endpoints:
+                try:
+                    endpoint.synchronized = self._request(
+                        [endpoint],
+                        [],
+                        self._check_synchronized,
+                    )
+                except Exception as e:  # pylint: disable=broad-except
+                    if endpoint.healthy:
+                        logger.warning(
+                            'Node %s health check failed: %r',
+                            endpoint,
+                            e,
+                        )
+                    endpoint.healthy = False
+                    continue
+                endpoint.healthy = True
+
+    @_routed
     @exceptions.map_errors()
     def get_peer_count(self):
         """
@@ -45,6 +426,7 @@ class Client(object):
         """
         return self.web3.net.peerCount
 
+    @_routed
     def is_syncing(self):
         """
         :return: Returns either False if the node is not syncing, True otherwise
@@ -70,14 +452,23 @@ class Client(object):
             timestamp = last_block.timestamp
         return get_timestamp_utc() - timestamp > 120
 
-    @exceptions.map_errors()
     def get_block(
             self,
             block: Union[int, str],
             full_transactions: bool = False,
     ):
+        return self._cached(
+            self._confirmed_block_key('block', full_transactions, block),
+            lambda: self._get_block(block, full_transactions),
+            size=_block_size,
+        )
+
+    @_routed
+    @exceptions.map_errors()
+    def _get_block(self, block: Union[int, str], full_transactions: bool):
         return self.web3.eth.getBlock(block, full_transactions)
 
+    @_routed
     @exceptions.map_errors()
     def get_transaction_count(self, address):
         """
@@ -90,21 +481,65 @@ class Client(object):
         """
         return self.web3.eth.getTransactionCount(address, 'pending')
 
+    @_routed
     @exceptions.map_errors()
     def estimate_gas(self, tx: Dict[str, Any]) -> int:
         return self.web3.eth.estimateGas(tx)
 
-    @exceptions.map_errors()
     def send(self, transaction) -> str:
         """
         Sends signed Ethereum transaction.
         :return The 32 Bytes transaction hash as HEX string
         """
-        raw_data = rlp.encode(transaction)
-        hex_data = self.web3.toHex(raw_data)
-        return self.web3.eth.sendRawTransaction(hex_data).hex()
+        return self.send_raw(rlp.encode(transaction))
+
+    def send_raw(self, raw_tx: bytes) -> str:
+        """
+        Sends signed and RLP encoded transaction as is. With many nodes it's
+        sent to all the healthy ones, succeeds if any of them accepts it.
+        Gives up after the send_raw timeout, also with a single node.
+        :return The 32 Bytes transaction hash as HEX string
+        """
+        endpoints = self._preferred_endpoints()
+        endpoints = [e for e in endpoints if e.healthy] or endpoints[:1]
+        pending = [
+            self._submit(endpoint, self._send_raw, raw_tx)
+            for endpoint in endpoints
+        ]
+        for endpoint, future in zip(endpoints, pending):
+            future.add_done_callback(
+                functools.partial(self._on_sent, endpoint))
+        timeout = self._timeouts.get('send_raw')
+        errors: List[Exception] = []
+        try:
+            for future in futures.as_completed(pending, timeout=timeout):
+                try:
+                    return future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    errors.append(e)
+        except futures.TimeoutError:
+            raise exceptions.RequestTimeout(
+                'send_raw timed out after {}s'.format(timeout))
+        # A node rejecting the transaction says more than an unreachable one
+        for e in errors:
+            if not isinstance(e, _CONNECTION_ERRORS):
+                raise e
+        raise errors[0]
+
+    @staticmethod
+    def _on_sent(endpoint: _Endpoint, future: Future) -> None:
+        e = future.exception()
+        if e is None:
+            return
+        logger.debug('Node %s rejected tx: %r', endpoint, e)
+        if isinstance(e, _CONNECTION_ERRORS):
+            endpoint.healthy = False
 
     @exceptions.map_errors()
+    def _send_raw(self, raw_tx: bytes) -> str:
+        hex_data = self.web3.toHex(raw_tx)
+        return self.web3.eth.sendRawTransaction(hex_data).hex()
+
     def get_balance(self, account, block=None):
         """
         Returns the balance of the given account
@@ -115,12 +550,22 @@ class Client(object):
         set with web3.eth.defaultBlock
         :return: Balance
         """
+        return self._cached(
+            self._confirmed_block_key('balance', account.lower(), block),
+            lambda: self._get_balance(account, block),
+        )
+
+    @_routed
+    @exceptions.map_errors()
+    def _get_balance(self, account, block):
         return self.web3.eth.getBalance(account, block)
 
+    @_routed
     @exceptions.map_errors()
     def get_gas_price(self) -> int:
         return self.web3.eth.gasPrice
 
+    @_routed
     @exceptions.map_errors()
     def call(  # pylint: disable=too-many-arguments
             self,
@@ -168,28 +613,241 @@ class Client(object):
         }
         return self.web3.eth.call(obj, block)
 
+    @_routed
+    @exceptions.map_errors()
+    def call_function(self, fn, transaction, block_identifier):
+        """
+        Executes web3 contract function's call on the node chosen for this
+        request rather than the one the contract was created with.
+        """
+        fn.web3 = self.web3
+        return fn.call(transaction, block_identifier=block_identifier)
+
+    @_routed
     @exceptions.map_errors()
     def get_block_number(self):
         return self.web3.eth.blockNumber
 
-    @exceptions.map_errors()
     def get_transaction(self, tx_hash):
         """
         Returns a transaction matching the given transaction hash.
         :param tx_hash: The transaction hash
         :return: Object - A transaction object
         """
-        return self.web3.eth.getTransaction(tx_hash)
+        return self._cached(
+            ('transaction', tx_hash.lower()),
+            lambda: self._get_transaction(tx_hash),
+            cacheable=self._is_confirmed,
+        )
 
+    @_routed
     @exceptions.map_errors()
+    def _get_transaction(self, tx_hash):
+        return self.web3.eth.getTransaction(tx_hash)
+
     def get_transaction_receipt(self, tx_hash):
         """
         Returns the receipt of a transaction by transaction hash.
         :param tx_hash: The transaction hash
         :return: Receipt of a transaction
         """
+        return self._cached(
+            ('receipt', tx_hash.lower()),
+            lambda: self._get_transaction_receipt(tx_hash),
+            cacheable=self._is_confirmed,
+        )
+
+    @_routed
+    @exceptions.map_errors()
+    def _get_transaction_receipt(self, tx_hash):
         return self.web3.eth.getTransactionReceipt(tx_hash)
 
+    @_routed
+    def batch_request(
+            self,
+            calls: Sequence[batch.RpcCall],
+            batch_size: Optional[int] = None) -> List[Any]:
+        """
+        Executes many calls using as few round-trips as possible. Each call is
+        a tuple of JSON-RPC method name and its params, as they would be
+        passed to web3's request manager. At most batch_size calls, by
+        default MAX_BATCH_SIZE, are sent in a single request.
+        :return: Results in the same order as the calls. A call that failed
+        has a mapped exception (see `exceptions.map_geth_error`) in place of
+        its result, failure of a single call doesn't affect the others.
+        """
+        if not calls:
+            return []
+        provider = self.web3.providers[0]
+        if not batch.supports_batch(provider):
+            return [self._request_or_error(m, p) for m, p in calls]
+        batch_size = batch_size or self.MAX_BATCH_SIZE
+        results: List[Any] = []
+        for i in range(0, len(calls), batch_size):
+            chunk = calls[i:i + batch_size]
+            responses = batch.make_batch_request(
+                provider,
+                [batch.format_request(self.web3, m, p) for m, p in chunk],
+            )
+            for (method, params), response in zip(chunk, responses):
+                response = batch.format_response(
+                    self.web3,
+                    method,
+                    params,
+                    response,
+                )
+                if 'error' in response:
+                    results.append(exceptions.map_geth_error(
+                        ValueError(response['error'])))
+                else:
+                    results.append(response['result'])
+        return results
+
+    def get_transaction_receipts(self, tx_hashes: Sequence[str]) -> List[Any]:
+        """
+        Batched version of `get_transaction_receipt`, see `batch_request`
+        for the error semantics.
+        """
+        return self._cached_batch(
+            [('receipt', tx_hash.lower()) for tx_hash in tx_hashes],
+            [
+                ('eth_getTransactionReceipt', [tx_hash])
+                for tx_hash in tx_hashes
+            ],
+            cacheable=self._is_confirmed,
+        )
+
+    def get_transactions(self, tx_hashes: Sequence[str]) -> List[Any]:
+        """
+        Batched version of `get_transaction`, see `batch_request` for the
+        error semantics.
+        """
+        return self._cached_batch(
+            [('transaction', tx_hash.lower()) for tx_hash in tx_hashes],
+            [
+                ('eth_getTransactionByHash', [tx_hash])
+                for tx_hash in tx_hashes
+            ],
+            cacheable=self._is_confirmed,
+        )
+
+    def get_blocks(
+            self,
+            blocks: Sequence[Union[int, str]],
+            full_transactions: bool = False) -> List[Any]:
+        """
+        Batched version of `get_block`, see `batch_request` for the error
+        semantics.
+        """
+        def method(block):
+            if isinstance(block, int) or \
+                    block in ('latest', 'earliest', 'pending'):
+                return 'eth_getBlockByNumber'
+            return 'eth_getBlockByHash'
+        return self._cached_batch(
+            [
+                self._confirmed_block_key('block', full_transactions, block)
+                for block in blocks
+            ],
+            [(method(block), [block, full_transactions]) for block in blocks],
+            size=_block_size,
+        )
+
+    def get_balances(
+            self,
+            accounts: Sequence[str],
+            block: Optional[Union[int, str]] = None,
+            batch_size: Optional[int] = None) -> List[Any]:
+        """
+        Batched version of `get_balance`, see `batch_request` for the error
+        semantics.
+        """
+        if block is None:
+            block = self.web3.eth.defaultBlock
+        return self._cached_batch(
+            [
+                self._confirmed_block_key('balance', account.lower(), block)
+                for account in accounts
+            ],
+            [('eth_getBalance', [account, block]) for account in accounts],
+            batch_size=batch_size,
+        )
+
+    def set_confirmed_block(self, block_number: int) -> None:
+        """
+        Data up to this block won't change anymore so it's cached.
+        """
+        self._confirmed_block = block_number
+
+    def get_cache_stats(self) -> CacheStats:
+        return self._cache.get_stats()
+
+    def _confirmed_block_key(self, *key) -> Optional[Tuple]:
+        """
+        Cache key for the data at the block which is the last part of the
+        key, or None if the block is not confirmed.
+        """
+        block = key[-1]
+        if not isinstance(block, int) or block > self._confirmed_block:
+            return None
+        return key
+
+    def _is_confirmed(self, result) -> bool:
+        return result is not None and result['blockNumber'] is not None \
+            and result['blockNumber'] <= self._confirmed_block
+
+    def _cached(
+            self,
+            key: Optional[Tuple],
+            fetch: Callable[[], Any],
+            cacheable: Callable[[Any], bool] = lambda r: r is not None,
+            size: Callable[[Any], int] = lambda r: 1) -> Any:
+        if key is None:
+            return fetch()
+        hit, result = self._cache.get(key)
+        if hit:
+            return result
+        result = fetch()
+        if cacheable(result):
+            self._cache.put(key, result, size(result))
+        return result
+
+    def _cached_batch(
+            self,
+            keys: List[Optional[Tuple]],
+            calls: List[batch.RpcCall],
+            cacheable: Callable[[Any], bool] = lambda r: r is not None,
+            size: Callable[[Any], int] = lambda r: 1,
+            batch_size: Optional[int] = None) -> List[Any]:
+        """
+        `batch_request` only requesting the calls not found in the cache.
+        """
+        results: List[Any] = [None] * len(calls)
+        missing = []
+        for i, key in enumerate(keys):
+            if key is not None:
+                hit, results[i] = self._cache.get(key)
+                if hit:
+                    continue
+            missing.append(i)
+        fetched = self.batch_request(
+            [calls[i] for i in missing],
+            batch_size=batch_size,
+        )
+        for i, result in zip(missing, fetched):
+            results[i] = result
+            if keys[i] is not None and \
+                    not isinstance(result, Exception) and cacheable(result):
+                self._cache.put(keys[i], result, size(result))
+        return results
+
+    def _request_or_error(self, method: str, params) -> Any:
+        try:
+            return self.web3.manager.request_blocking(method, params)
+        except ValueError as e:
+            return exceptions.map_geth_error(e)
+
+    @_pinned
     @exceptions.map_errors()
     def new_filter(self, from_block="latest", to_block="latest", address=None,
                    topics=None):
@@ -220,6 +878,7 @@ class Client(object):
         }
         return self.web3.eth.filter(obj).filter_id
 
+    @_pinned
     @exceptions.map_errors()
     def get_filter_changes(self, filter_id):
         """
@@ -232,6 +891,7 @@ class Client(object):
         """
         return self.web3.eth.getFilterChanges(filter_id)
 
+    @_pinned
     @exceptions.map_errors()
     def get_filter_logs(self, filter_id):
         """
@@ -250,21 +910,33 @@ class Client(object):
             args,
             from_block: Union[int, str],
             to_block: Union[int, str]):
-        event_abi = list(filter(
-            lambda e: e['type'] == 'event' and e['name'] == event_name,
-            contract.abi,
-        ))[0]
-        for name in args:
-            assert any(name == event['name'] for event in event_abi['inputs'])
-        _, filter_args = construct_event_filter_params(
-            event_abi,
-            contract_address=contract.address,
-            argument_filters=args,
-            fromBlock=from_block,
-            toBlock=to_block,
+        return self.get_raw_logs(
+            contract.address,
+            get_event_topics(contract, event_name, args),
+            from_block,
+            to_block,
         )
-        return self.web3.eth.getLogs(filter_args)
 
+    @_routed
+    @exceptions.map_errors()
+    def get_raw_logs(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: Union[int, str],
+            to_block: Union[int, str]):
+        """
+        Returns logs of the contract matching the topics. Each topic can be
+        None (matches anything), a single value or a list of alternatives.
+        """
+        return self.web3.eth.getLogs({
+            'address': address,
+            'topics': topics,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        })
+
+    @_routed
     @exceptions.map_errors()
     def contract(self, address, abi):
         return self.web3.eth.contract(address=address, abi=json.loads(abi))
@@ -286,15 +958,11 @@ class Client(object):
             return self._sync
         self._last_sync_check = time.time()
 
-        synced = True
-
-        peers = self.get_peer_count()
-        logger.debug("Geth peer count: %d", peers)
-        if peers == 0:
-            synced = False
-        elif self.is_syncing():
-            logger.info("Geth node is syncing...")
-            synced = False
+        if len(self._endpoints) > 1:
+            self._check_endpoints()
+            synced = any(e.healthy and e.synchronized for e in self._endpoints)
+        else:
+            synced = self._check_synchronized()
 
         if synced and not self._sync:
             logger.info("Geth node is synchronized")
@@ -302,8 +970,20 @@ class Client(object):
         self._sync = synced
         return self._sync
 
+    def _check_synchronized(self) -> bool:
+        peers = self.get_peer_count()
+        logger.debug("Geth peer count: %d", peers)
+        if peers == 0:
+            return False
+        if self.is_syncing():
+            logger.info("Geth node is syncing...")
+            return False
+        return True
+
     def stop(self):
         self._is_stopped = True
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
 
     @staticmethod
     def __add_padding(address):
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from abc import abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CursorStorage:
+    """
+    Persists how far each subscription has been delivered, so after a
+    restart it resumes where it stopped instead of from its `from_block`.
+    Cursor is the last block whose events were all delivered. Events of the
+    blocks past the cursor are additionally marked one by one as they are
+    delivered, so the ones delivered right before a crash are not delivered
+    again. Marks are dropped when the cursor moves past them.
+    """
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def get_cursor(self, sub_id: str) -> Optional[int]:
+        """
+        Returns the last checkpointed block or None if there is none.
+        """
+        pass
+
+    @abstractmethod
+    def checkpoint(self, sub_id: str, block_number: int) -> None:
+        """
+        Moves the cursor and forgets the delivered events up to it.
+        """
+        pass
+
+    @abstractmethod
+    def is_delivered(self, sub_id: str, tx_hash: str, log_index: int) -> bool:
+        pass
+
+    @abstractmethod
+    def mark_delivered(
+            self,
+            sub_id: str,
+            tx_hash: str,
+            log_index: int) -> None:
+        pass
+
+
+class JsonCursorStorage(CursorStorage):
+    """
+    Keeps the cursors in a JSON file which is rewritten on checkpoints.
+    Delivered events are appended to a journal next to it, which is written
+    through to the OS but not synced to the disk, that only happens once
+    per checkpoint when the journal is folded into the file.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._filepath = filepath
+        self._journal_path = filepath.with_name(filepath.name + '.delivered')
+        self._lock = threading.Lock()
+        self._cursors: Dict[str, Optional[int]] = {}
+        self._delivered: Dict[str, Set[Tuple[str, int]]] = {}
+        if self._filepath.exists():
+            with open(self._filepath) as f:
+                for sub_id, cursor in json.load(f).items():
+                    self._cursors[sub_id] = cursor.get('block')
+                    self._delivered[sub_id] = set(
+                        (tx_hash, log_index)
+                        for tx_hash, log_index in cursor.get('delivered', [])
+                    )
+        if self._journal_path.exists():
+            self._load_journal()
+        self._journal = open(self._journal_path, 'a')
+
+    def _load_journal(self) -> None:
+        with open(self._journal_path) as f:
+            for line in f:
+                try:
+                    sub_id, tx_hash, log_index = json.loads(line)
+                except ValueError:
+                    # Only the last write may have been cut short
+                    logger.warning('Incomplete cursor journal entry')
+                    break
+                self._delivered.setdefault(sub_id, set()).add(
+                    (tx_hash, log_index))
+
+    def close(self) -> None:
+        self._journal.close()
+
+    def get_cursor(self, sub_id: str) -> Optional[int]:
+        with self._lock:
+            return self._cursors.get(sub_id)
+
+    def checkpoint(self, sub_id: str, block_number: int) -> None:
+        with self._lock:
+            if self._cursors.get(sub_id) == block_number and \
+                    not self._delivered.get(sub_id):
+                return
+            # Don't modify the state if writing to the file fails
+            cursors = dict(self._cursors)
+            cursors[sub_id] = block_number
+            delivered = dict(self._delivered)
+            delivered.pop(sub_id, None)
+            self._save(cursors, delivered)
+            self._cursors = cursors
+            self._delivered = delivered
+
+    def is_delivered(self, sub_id: str, tx_hash: str, log_index: int) -> bool:
+        with self._lock:
+            return (tx_hash.lower(), log_index) in \
+                self._delivered.get(sub_id, ())
+
+    def mark_delivered(
+            self,
+            sub_id: str,
+            tx_hash: str,
+            log_index: int) -> None:
+        with self._lock:
+            self._journal.write(
+                json.dumps([sub_id, tx_hash.lower(), log_index]) + '\n')
+            self._journal.flush()
+            self._delivered.setdefault(sub_id, set()).add(
+                (tx_hash.lower(), log_index))
+
+    def _save(
+            self,
+            cursors: Dict[str, Optional[int]],
+            delivered: Dict[str, Set[Tuple[str, int]]]) -> None:
+        with open(self._filepath, 'w') as f:
+            json.dump({
+                sub_id: {
+                    'block': cursors.get(sub_id),
+                    'delivered': sorted(delivered.get(sub_id, ())),
+                }
+                for sub_id in set(cursors) | set(delivered)
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Everything in the journal is in the file now
+        self._journal.truncate(0)
+
+
+class SqliteCursorStorage(CursorStorage):
+    """
+    Keeps the cursors in an SQLite database in WAL mode, may share the
+    database file with `SqliteTransactionsStorage`. Only checkpoints are
+    synced to the disk, delivered events are committed without waiting for
+    it, a checkpoint syncs them as well.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(filepath),
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction():
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS subscription_cursors ('
+                ' sub_id TEXT PRIMARY KEY,'
+                ' block INTEGER)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS delivered_events ('
+                ' sub_id TEXT NOT NULL,'
+                ' tx_hash TEXT NOT NULL,'
+                ' log_index INTEGER NOT NULL,'
+                ' PRIMARY KEY (sub_id, tx_hash, log_index))'
+            )
+
+    @contextmanager
+    def _transaction(self, durable: bool = True):
+        with self._lock:
+            self._conn.execute('PRAGMA synchronous={}'.format(
+                'FULL' if durable else 'NORMAL'))
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def get_cursor(self, sub_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT block FROM subscription_cursors WHERE sub_id = ?',
+                (sub_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def checkpoint(self, sub_id: str, block_number: int) -> None:
+        with self._transaction():
+            self._conn.execute(
+                'INSERT OR REPLACE INTO subscription_cursors VALUES (?, ?)',
+                (sub_id, block_number),
+            )
+            self._conn.execute(
+                'DELETE FROM delivered_events WHERE sub_id = ?',
+                (sub_id,),
+            )
+
+    def is_delivered(self, sub_id: str, tx_hash: str, log_index: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM delivered_events'
+                ' WHERE sub_id = ? AND tx_hash = ? AND log_index = ?',
+                (sub_id, tx_hash.lower(), log_index),
+            ).fetchone()
+        return row is not None
+
+    def mark_delivered(
+            self,
+            sub_id: str,
+            tx_hash: str,
+            log_index: int) -> None:
+        with self._transaction(durable=False):
+            self._conn.execute(
+                'INSERT OR IGNORE INTO delivered_events VALUES (?, ?, ?)',
+                (sub_id, tx_hash.lower(), log_index),
+            )
@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def __str__(self) -> str:
+        return '<CallbackStats calls: {} total: {:.3f}s max: {:.3f}s>'.format(
+            self.calls,
+            self.total_time,
+            self.max_time,
+        )
+
+
+class CallbackDispatcher:
+    """
+    Invokes user callbacks. This one does it right away in the calling
+    thread which is the monitor thread for SCI callbacks. Every call is timed
+    and the ones taking longer than `slow_callback_threshold` seconds are
+    reported.
+    """
+
+    SLOW_CALLBACK_THRESHOLD = 1.0
+
+    def __init__(
+            self,
+            slow_callback_threshold: float = SLOW_CALLBACK_THRESHOLD) -> None:
+        self._slow_callback_threshold = slow_callback_threshold
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, CallbackStats] = {}
+
+    def dispatch(
+            self,
+            key: Hashable,
+            cb: Callable[..., None],
+            *args: Any) -> None:
+        """
+        Callbacks dispatched with the same key are invoked in order.
+        """
+        self._run(cb, args)
+
+    def call_after(self, key: Hashable, fn: Callable[[], None]) -> None:
+        """
+        Calls fn once all the callbacks dispatched with the key so far have
+        been invoked, e.g. to record they have been delivered.
+        """
+        fn()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, CallbackStats]:
+        """
+        Timing statistics per callback name.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _run(self, cb: Callable[..., None], args) -> None:
+        name = getattr(cb, '__qualname__', repr(cb))
+        start = time.monotonic()
+        try:
+            cb(*args)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Callback %s exception', name)
+        duration = time.monotonic() - start
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, CallbackStats())
+            stats.calls += 1
+            stats.total_time += duration
+            stats.max_time = max(stats.max_time, duration)
+        if duration > self._slow_callback_threshold:
+            logger.warning('Slow callback %s took %.3fs', name, duration)
+
+
+class ThreadedCallbackDispatcher(CallbackDispatcher):
+    """
+    Invokes callbacks from a pool of worker threads so slow ones don't stall
+    the caller. Each key is always handled by the same worker so callbacks
+    with the same key keep their order. Worker queues are bounded, when one
+    is full `dispatch` blocks until there is room, slowing the caller down
+    instead of buffering without limit.
+    """
+
+    WORKERS = 4
+    MAX_QUEUE_SIZE = 1000
+
+    def __init__(
+            self,
+            workers: int = WORKERS,
+            max_queue_size: int = MAX_QUEUE_SIZE,
+            slow_callback_threshold: float =
+            CallbackDispatcher.SLOW_CALLBACK_THRESHOLD) -> None:
+        super().__init__(slow_callback_threshold)
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        for i in range(workers):
+            q: queue.Queue = queue.Queue(maxsize=max_queue_size)
+            thread = threading.Thread(
+                target=self._worker,
+                args=(q,),
+                name='SCI callbacks {}'.format(i),
+                daemon=True,
+            )
+            self._queues.append(q)
+            self._threads.append(thread)
+            thread.start()
+
+    def dispatch(
+            self,
+            key: Hashable,
+            cb: Callable[..., None],
+            *args: Any) -> None:
+        self._queues[hash(key) % len(self._queues)].put((cb, args))
+
+    def call_after(self, key: Hashable, fn: Callable[[], None]) -> None:
+        # Same worker as the callbacks, after them in its queue
+        self._queues[hash(key) % len(self._queues)].put((None, fn))
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Invokes all the already dispatched callbacks and stops the workers.
+        """
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            # Might be stopped from within a callback
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            cb, args = item
+            if cb is None:
+                self._call_after(args)
+            else:
+                self._run(cb, args)
+
+    @staticmethod
+    def _call_after(fn: Callable[[], None]) -> None:
+        try:
+            fn()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Exception after callbacks')
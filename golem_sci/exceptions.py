@@ -42,6 +42,10 @@ def map_errors():
     return wrapped
 
 
+class RequestTimeout(Exception):
+    pass
+
+
 class GethError(Exception):
     def __init__(self, *args, code, message, **kwargs):
         self.code = code
@@ -68,9 +72,14 @@ class FilterNotFound(GethError):
     pass
 
 
+class TooManyResults(GethError):
+    pass
+
+
 _MESSAGE_MAP = {
     'missing trie node': MissingTrieNode,
     'known transaction': KnownTransaction,
     'nonce too low': NonceTooLow,
     'filter not found': FilterNotFound,
+    'query returned more than': TooManyResults,
 }
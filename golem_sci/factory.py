@@ -1,7 +1,7 @@
 import logging
 import re
 import time
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Optional, Sequence, Union
 
 from distutils.version import StrictVersion
 
@@ -12,9 +12,13 @@ from web3 import Web3, IPCProvider, HTTPProvider
 from web3.middleware import geth_poa_middleware
 
 from . import chains, contracts
+from .backfill import LogBackfill
 from .client import Client
+from .cursorstorage import CursorStorage
+from .dispatcher import CallbackDispatcher
 from .implementation import SCIImplementation
 from .interface import SmartContractsInterface
+from .logcache import SqliteLogCache
 from .transactionsstorage import TransactionsStorage
 
 logger = logging.getLogger(__name__)
@@ -32,61 +36,120 @@ MAX_GETH_VERSION = StrictVersion('1.9.999')
 
 
 def new_sci_ipc(
-        ipc: str,
+        ipc: Union[str, Sequence[str]],
         address: str,
         chain: str,
         storage: TransactionsStorage,
         contract_addresses: Dict[contracts.Contract, str],
-        tx_sign: Callable[[Transaction], None]=None) -> SmartContractsInterface:
+        tx_sign: Callable[[Transaction], None]=None,
+        subscribe_new_heads: bool = False,
+        callback_dispatcher: Optional[CallbackDispatcher] = None,
+        cursor_storage: Optional[CursorStorage] = None,
+        log_backfill: Optional[LogBackfill] = None,
+        log_cache: Optional[SqliteLogCache] = None,
+) -> SmartContractsInterface:
+    """
+    ipc may be a list of paths of many nodes, see `Client`.
+    """
+    ipcs = [ipc] if isinstance(ipc, str) else ipc
     return new_sci(
-        Web3(IPCProvider(ipc)),
+        [Web3(IPCProvider(path)) for path in ipcs],
         address,
         chain,
         storage,
         contract_addresses,
         tx_sign,
+        subscribe_new_heads,
+        callback_dispatcher,
+        cursor_storage,
+        log_backfill,
+        log_cache,
     )
 
 
 def new_sci_rpc(
-        rpc: str,
+        rpc: Union[str, Sequence[str]],
         address: str,
         chain: str,
         storage: TransactionsStorage,
         contract_addresses: Dict[contracts.Contract, str],
-        tx_sign: Callable[[Transaction], None]=None) -> SmartContractsInterface:
+        tx_sign: Callable[[Transaction], None]=None,
+        subscribe_new_heads: bool = False,
+        callback_dispatcher: Optional[CallbackDispatcher] = None,
+        cursor_storage: Optional[CursorStorage] = None,
+        log_backfill: Optional[LogBackfill] = None,
+        log_cache: Optional[SqliteLogCache] = None,
+) -> SmartContractsInterface:
+    """
+    rpc may be a list of URLs of many nodes, see `Client`.
+    """
+    rpcs = [rpc] if isinstance(rpc, str) else rpc
     return new_sci(
-        Web3(HTTPProvider(rpc)),
+        [Web3(HTTPProvider(uri)) for uri in rpcs],
         address,
         chain,
         storage,
         contract_addresses,
         tx_sign,
+        subscribe_new_heads,
+        callback_dispatcher,
+        cursor_storage,
+        log_backfill,
+        log_cache,
     )
 
 
 def new_sci(
-        web3: Web3,
+        web3: Union[Web3, Sequence[Web3]],
         address: str,
         chain: str,
         storage: TransactionsStorage,
         contract_addresses: Dict[contracts.Contract, str],
-        tx_sign: Callable[[Transaction], None]=None) -> SmartContractsInterface:
-    # Web3 needs this extra middleware to properly handle rinkeby chain because
-    # rinkeby is POA which violates some invariants
-    if chain == chains.RINKEBY and \
-            geth_poa_middleware not in web3.middleware_stack:
-        web3.middleware_stack.inject(geth_poa_middleware, layer=0)
-    _ensure_connection(web3)
-    _ensure_geth_version(web3)
-    _ensure_genesis(web3, chain)
-    geth_client = Client(web3)
+        tx_sign: Callable[[Transaction], None]=None,
+        subscribe_new_heads: bool = False,
+        callback_dispatcher: Optional[CallbackDispatcher] = None,
+        cursor_storage: Optional[CursorStorage] = None,
+        log_backfill: Optional[LogBackfill] = None,
+        log_cache: Optional[SqliteLogCache] = None,
+) -> SmartContractsInterface:
+    """
+    web3 may be a list of instances connected to different nodes, requests
+    are then spread among them, see `Client`.
+    With subscribe_new_heads the blockchain is monitored using
+    `eth_subscribe('newHeads')`, which is only available over IPC and
+    WebSocket. Other connections poll for the latest block every second.
+    callback_dispatcher decides how the callbacks are invoked, see
+    `golem_sci.dispatcher`.
+    cursor_storage makes subscriptions resume after a restart, see
+    `golem_sci.cursorstorage`.
+    log_backfill sets how subscriptions catch up on long block ranges, see
+    `golem_sci.backfill`.
+    log_cache keeps the already fetched logs locally, see
+    `golem_sci.logcache`.
+    """
+    web3s: List[Web3] = \
+        list(web3) if isinstance(web3, (list, tuple)) else [web3]
+    for w in web3s:
+        # Web3 needs this extra middleware to properly handle rinkeby chain
+        # because rinkeby is POA which violates some invariants
+        if chain == chains.RINKEBY and \
+                geth_poa_middleware not in w.middleware_stack:
+            w.middleware_stack.inject(geth_poa_middleware, layer=0)
+    for w in _ensure_connection(*web3s):
+        _ensure_geth_version(w)
+        _ensure_genesis(w, chain)
+    geth_client = Client(web3s if len(web3s) > 1 else web3s[0])
     return SCIImplementation(
         geth_client,
         address,
         storage,
         contract_addresses,
         tx_sign,
+        subscribe_new_heads=subscribe_new_heads,
+        callback_dispatcher=callback_dispatcher,
+        cursor_storage=cursor_storage,
+        log_backfill=log_backfill,
+        log_cache=log_cache,
     )
 
 
@@ -102,13 +165,23 @@ def _ensure_genesis(web3: Web3, chain: str):
         )
 
 
-def _ensure_connection(web3: Web3):
+def _ensure_connection(*web3s: Web3) -> List[Web3]:
+    """
+    Waits for any of the nodes to be reachable and returns the reachable
+    ones. The others are left to the health checks of `Client`.
+    """
     RETRY_COUNT = 10
     for _ in range(RETRY_COUNT):
-        if web3.isConnected():
-            return
+        connected = [w for w in web3s if w.isConnected()]
+        if connected:
+            for w in web3s:
+                if w not in connected:
+                    logger.warning(
+                        'Could not connect to geth: %s', w.providers)
+            return connected
         time.sleep(1)
-    raise Exception('Could not connect to geth: {}'.format(web3.providers))
+    raise Exception('Could not connect to geth: {}'.format(
+        ', '.join(str(w.providers) for w in web3s)))
 
 
 def _ensure_geth_version(web3: Web3):
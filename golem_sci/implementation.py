@@ -1,15 +1,46 @@
+import functools
+import itertools
 import logging
 import threading
-from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from eth_utils import decode_hex, encode_hex
+from eth_utils import (
+    decode_hex,
+    encode_hex,
+    to_checksum_address,
+)
 from ethereum.utils import zpad, int_to_big_endian, denoms
 from ethereum.transactions import Transaction
+from hexbytes import HexBytes
+import rlp
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
+from . import calldata
 from . import contracts
 from . import exceptions
-from .client import Client
+from .backfill import LogBackfill
+from .client import Client, get_event_topics
+from .cursorstorage import CursorStorage
+from .dispatcher import CallbackDispatcher
 from .interface import SmartContractsInterface
+from .logcache import SqliteLogCache
+from .newheads import NewHeadsWatcher
+from .snapshotcache import SnapshotCache
 from .events import (
     BatchTransferEvent,
     GntTransferEvent,
@@ -23,7 +54,7 @@ from .structs import (
     Payment,
     TransactionReceipt,
 )
-from .transactionsstorage import TransactionsStorage
+from .transactionsstorage import SignedTransaction, TransactionsStorage
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +71,67 @@ def encode_payment(p: Payment) -> bytes:
     return pair
 
 
+def encode_payments(payees: Sequence[str], amounts: Sequence[int]) -> bytes:
+    """
+    Bulk version of `encode_payment` taking the payments as columns, returns
+    the payment words concatenated in a single buffer. Amounts may also be
+    a NumPy integer array.
+    """
+    if len(payees) != len(amounts):
+        raise ValueError('Got {} payees and {} amounts'.format(
+            len(payees), len(amounts)))
+    if not payees:
+        return b''
+    max_value = 2 ** 96
+    if max(amounts) >= max_value:
+        raise ValueError("Payment should be less than {}".format(max_value))
+    if min(amounts) < 0:
+        raise ValueError("Payment can't be negative")
+    decoded_payees = [decode_hex(p) for p in payees]
+    for payee, payee_bytes in zip(payees, decoded_payees):
+        if len(payee_bytes) != 20:
+            raise ValueError(
+                'Incorrect payee address length: {}'.format(payee))
+    payees_bytes = b''.join(decoded_payees)
+    if numpy is not None and isinstance(amounts, numpy.ndarray) and \
+            amounts.dtype.kind in 'iu':
+        words = numpy.zeros((len(payees), 32), dtype=numpy.uint8)
+        # Fits in the lowest 8 bytes of the 12 bytes amount
+        words[:, 4:12] = amounts.astype('>u8').view(numpy.uint8) \
+            .reshape(-1, 8)
+        words[:, 12:] = numpy.frombuffer(payees_bytes, dtype=numpy.uint8) \
+            .reshape(-1, 20)
+        return words.tobytes()
+    return b''.join(
+        int(amount).to_bytes(12, 'big') + payees_bytes[i:i + 20]
+        for amount, i in zip(amounts, range(0, len(payees_bytes), 20))
+    )
+
+
+def split_payments(  # pylint: disable=too-many-arguments
+        encoded_payments: bytes,
+        gas_limit: int,
+        fill_ratio: float,
+        base_gas: int,
+        gas_per_payment: int) -> List[Tuple[bytes, int]]:
+    """
+    Splits the encoded payments into the largest batch transfers using at
+    most fill_ratio of the block gas limit, returns (payments, gas) of each.
+    Gas of a batch transfer is base_gas + gas_per_payment * len(payments).
+    """
+    max_gas = int(gas_limit * fill_ratio)
+    max_payments = (max_gas - base_gas) // gas_per_payment
+    if max_payments < 1:
+        raise ValueError(
+            'Block gas limit {} is too low for a batch transfer'.format(
+                gas_limit))
+    chunks = []
+    for i in range(0, len(encoded_payments), 32 * max_payments):
+        chunk = encoded_payments[i:i + 32 * max_payments]
+        chunks.append((chunk, base_gas + len(chunk) // 32 * gas_per_payment))
+    return chunks
+
+
 class Subscription:
     def __init__(
             self,
@@ -55,6 +147,77 @@ class Subscription:
         self.event_cls = event_cls
         self.cb = cb
         self.last_pulled_block = from_block
+        self.topics = get_event_topics(contract, event_name, args)
+        # Key of the subscription's cursor
+        self.id = '{}:{}:{}'.format(
+            contract.address,
+            event_name,
+            ','.join(topic or '*' for topic in self.topics),
+        ).lower()
+
+    def topics_key(self) -> Tuple[Optional[str], ...]:
+        return _topics_key(self.topics)
+
+
+_MAX_TOPICS = 4
+
+
+def _topics_key(topics: List[Optional[str]]) -> Tuple[Optional[str], ...]:
+    return tuple(topics) + (None,) * (_MAX_TOPICS - len(topics))
+
+
+def merge_topics(subs: List[Subscription]) -> List[Any]:
+    """
+    Returns a topics filter matching the logs of all the subscriptions, which
+    is a superset of them, because the positions are OR'ed independently.
+    """
+    merged: List[Any] = []
+    for position in range(max(len(sub.topics) for sub in subs)):
+        values = set()
+        for sub in subs:
+            value = sub.topics[position] if position < len(sub.topics) \
+                else None
+            if value is None:
+                values = set()
+                break
+            values.add(value)
+        if not values:
+            merged.append(None)
+        elif len(values) == 1:
+            merged.append(values.pop())
+        else:
+            merged.append(sorted(values))
+    while merged and merged[-1] is None:
+        merged.pop()
+    return merged
+
+
+def matching_subscriptions(
+        log,
+        subs_by_topics: Dict[Tuple, List[Subscription]]) \
+        -> List[Subscription]:
+    """
+    Finds the subscriptions matching the log. Subscription filters have
+    wildcards so the lookup is done for every combination of the log's topics
+    being replaced with a wildcard, the signature topic is never a wildcard.
+    """
+    topics = [HexBytes(t).hex().lower() for t in log['topics']]
+    result: List[Subscription] = []
+    for args in itertools.product(*(
+            (topic, None) for topic in topics[1:_MAX_TOPICS])):
+        key = _topics_key(topics[:1] + list(args))
+        result.extend(subs_by_topics.get(key, []))
+    return result
+
+
+def _raise_errors(results: List[Any]) -> List[Any]:
+    """
+    Raises the first error of the batched calls' results.
+    """
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
 
 
 class EthSubscription:
@@ -66,6 +229,7 @@ class EthSubscription:
         self.address = address
         self.cb = cb
         self.last_pulled_block = from_block
+        self.id = 'eth:{}'.format(address).lower()
 
 
 class SCIImplementation(SmartContractsInterface):
@@ -81,6 +245,8 @@ class SCIImplementation(SmartContractsInterface):
     # Total gas for a batchTransfer is BASE + len(payments) * PER_PAYMENT
     GAS_PER_PAYMENT = 28000
     GAS_BATCH_PAYMENT_BASE = 27000
+    # Which part of the block gas limit a single batch transfer may use
+    BATCH_GAS_FILL_RATIO = 0.8
     GAS_FAUCET = 90000
     # Concent methods
     GAS_UNLOCK_DEPOSIT = 55000
@@ -90,6 +256,9 @@ class SCIImplementation(SmartContractsInterface):
     GAS_WITHDRAW_DEPOSIT = 75000
 
     REQUIRED_CONFS: ClassVar[int] = 6
+    # How often the monitor checks for new blocks, also serves as a fallback
+    # when subscribed to new heads
+    MONITOR_INTERVAL = 15
 
     def __init__(
             self,
@@ -98,7 +267,12 @@ class SCIImplementation(SmartContractsInterface):
             storage: TransactionsStorage,
             contract_addresses: Dict[contracts.Contract, str],
             tx_sign=None,
-            monitor=True) -> None:
+            monitor=True,
+            subscribe_new_heads=False,
+            callback_dispatcher: Optional[CallbackDispatcher] = None,
+            cursor_storage: Optional[CursorStorage] = None,
+            log_backfill: Optional[LogBackfill] = None,
+            log_cache: Optional[SqliteLogCache] = None) -> None:
         """
         Performs all blockchain operations using the address as the caller.
         Uses tx_sign to sign outgoing transaction, tx_sign can be None in which
@@ -106,6 +280,20 @@ class SCIImplementation(SmartContractsInterface):
         Straightforward implementation of tx_sign having the private key:
         def sign_tx(tx) -> None:
             tx.sign(private_key)
+        With subscribe_new_heads the monitor reacts to new blocks as soon as
+        they arrive instead of checking every MONITOR_INTERVAL seconds.
+        Callbacks are invoked through callback_dispatcher, by default right
+        away from the monitor thread. Pass ThreadedCallbackDispatcher to keep
+        slow callbacks from holding up the monitor.
+        With cursor_storage subscriptions remember how far they have been
+        delivered and after a restart resume from there, events whose
+        callbacks have been invoked are not delivered again. Subscriptions
+        are identified by their filter and the order in which they are made.
+        Subscriptions starting far in the past are caught up by log_backfill
+        which fetches the logs in chunks in parallel.
+        Logs of the confirmed blocks pulled by subscriptions and historical
+        queries are kept in log_cache if provided, queries for the ranges
+        already there don't go to the node.
         """
         logger.debug("Starting SCI")
         self._geth_client = geth_client
@@ -113,8 +301,13 @@ class SCIImplementation(SmartContractsInterface):
 
         self._tx_lock = threading.Lock()
         self._storage = storage
+        self._callback_dispatcher = callback_dispatcher or CallbackDispatcher()
+        self._cursor_storage = cursor_storage
+        self._log_backfill = log_backfill or LogBackfill()
+        self._log_cache = log_cache
         self._storage.init(geth_client.get_transaction_count(address))
         self._tx_sign = tx_sign
+        self._contract_addresses = contract_addresses
 
         def _make_contract(contract: contracts.Contract):
             if contract not in contract_addresses:
@@ -139,8 +332,12 @@ class SCIImplementation(SmartContractsInterface):
         self._eth_subscriptions: List[EthSubscription] = []
 
         self._awaiting_transactions_lock = threading.Lock()
-        self._awaiting_transactions: List[Tuple] = []
+        # Callbacks waiting for the transaction to be confirmed, by tx hash
+        self._awaiting_transactions: \
+            Dict[str, List[Callable[[TransactionReceipt], None]]] = {}
 
+        # Balances at the confirmed block
+        self._balances = SnapshotCache()
         self._confirmed_block = -self.REQUIRED_CONFS
         self._update_block_numbers()
         self._update_gas_price()
@@ -153,42 +350,149 @@ class SCIImplementation(SmartContractsInterface):
         self._monitor_thread = None
         self._monitor_cv = threading.Condition()
         self._monitor_started = False
+        self._new_block_pending = False
+        self._new_heads_watcher: Optional[NewHeadsWatcher] = None
         if monitor:
             self._monitor_thread = threading.Thread(
                 target=self._monitor_blockchain,
             )
             self._monitor_thread.start()
+            if subscribe_new_heads:
+                self._new_heads_watcher = NewHeadsWatcher(
+                    self._geth_client,
+                    self._on_new_head,
+                )
+                self._new_heads_watcher.start()
 
     def get_eth_address(self) -> str:
         return self._address
 
     def get_eth_balance(self, address: str) -> int:
-        balance = self._geth_client.get_balance(
-            address,
-            block=self._confirmed_block,
+        block = self._confirmed_block
+        balance = self._balances.get(
+            (address.lower(), 'ETH'),
+            block,
+            lambda: self._geth_client.get_balance(address, block=block),
         )
         if address == self._address:
             with self._eth_reserved_lock:
                 balance -= self._eth_reserved
         return balance
 
+    def get_eth_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        balances = _raise_errors(self._geth_client.get_balances(
+            addresses,
+            block=self._confirmed_block,
+            batch_size=batch_size,
+        ))
+        with self._eth_reserved_lock:
+            return [
+                balance - self._eth_reserved if address == self._address
+                else balance
+                for address, balance in zip(addresses, balances)
+            ]
+
     def get_gnt_balance(self, address: str) -> int:
-        return self._call(self._gnt.functions.balanceOf(address))
+        return self._cached_call(
+            address,
+            contracts.GNT,
+            lambda: self._gnt.functions.balanceOf(address),
+        )
 
     def get_gntb_balance(self, address: str) -> int:
-        return self._call(self._gntb.functions.balanceOf(address))
+        return self._cached_call(
+            address,
+            contracts.GNTB,
+            lambda: self._gntb.functions.balanceOf(address),
+        )
+
+    def get_gntb_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return self._call_many(
+            contracts.GNTB,
+            'balanceOf',
+            [[address] for address in addresses],
+            batch_size,
+        )
 
     def batch_transfer(self, payments: List[Payment], closure_time: int) -> str:
-        encoded_payments = []
-        for p in payments:
-            encoded_payments.append(encode_payment(p))
+        encoded_payments = encode_payments(
+            [p.payee for p in payments],
+            [p.amount for p in payments],
+        )
         gas = self.GAS_BATCH_PAYMENT_BASE + len(payments) * self.GAS_PER_PAYMENT
-        return self._create_and_send_transaction(
-            self._gntb,
-            'batchTransfer',
-            [encoded_payments, closure_time],
+        return self._sign_and_send_transaction(self._create_transaction(
+            contracts.GNTB,
+            calldata.encode_batch_transfer(encoded_payments, closure_time),
             gas,
+        ))
+
+    def batch_transfer_many(
+            self,
+            payments: List[Payment],
+            closure_time: int) -> List[str]:
+        encoded_payments = encode_payments(
+            [p.payee for p in payments],
+            [p.amount for p in payments],
         )
+        txs = [
+            self._create_transaction(
+                contracts.GNTB,
+                calldata.encode_batch_transfer(chunk, closure_time),
+                gas,
+            )
+            for chunk, gas in split_payments(
+                encoded_payments,
+                self.get_latest_confirmed_block().gas_limit,
+                self.BATCH_GAS_FILL_RATIO,
+                self.GAS_BATCH_PAYMENT_BASE,
+                self.GAS_PER_PAYMENT,
+            )
+        ]
+        logger.info(
+            'Sending %d payments in %d batch transfers',
+            len(payments),
+            len(txs),
+        )
+        return self.send_transactions(txs)
+
+    def send_transactions(self, txs: List[Transaction]) -> List[str]:
+        with self._tx_lock:
+            total_eth = sum(tx.startgas * tx.gasprice + tx.value for tx in txs)
+            balance = self.get_eth_balance(self._address)
+            if total_eth > balance:
+                raise Exception(
+                    'Not enough ETH for transaction. Has {}, required {}'.format(  # noqa
+                        balance / denoms.ether,
+                        total_eth / denoms.ether,
+                    ))
+            self._storage.set_nonces_sign_and_save_txs(self._tx_sign, txs)
+            with self._eth_reserved_lock:
+                self._eth_reserved += total_eth
+            tx_hashes = []
+            for i, tx in enumerate(txs):
+                try:
+                    tx_hashes.append(self._send_signed_transaction(
+                        encode_hex(tx.hash),
+                        rlp.encode(tx),
+                    ))
+                except exceptions.GethError as e:
+                    # This can be stuff like not enough gas for the
+                    # transaction. It shouldn't ever happen and if it does
+                    # then it's a bug that should be fixed by the caller.
+                    logger.critical('web3 JSON rpc critical error %r', e)
+                    for unsent in reversed(txs[i:]):
+                        with self._eth_reserved_lock:
+                            self._eth_reserved -= unsent.startgas * \
+                                unsent.gasprice + unsent.value
+                        self._storage.revert_last_tx()
+                    raise
+            return tx_hashes
 
     def get_batch_transfers(
             self,
@@ -196,17 +500,30 @@ class SCIImplementation(SmartContractsInterface):
             payee_address: str,
             from_block: int,
             to_block: int) -> List[BatchTransferEvent]:
-        filter_id = self._gntb.events.BatchTransfer.createFilter(
-            fromBlock=from_block,
-            toBlock=to_block,
-            argument_filters={
+        return list(self.iter_batch_transfers(
+            payer_address,
+            payee_address,
+            from_block,
+            to_block,
+        ))
+
+    def iter_batch_transfers(
+            self,
+            payer_address: str,
+            payee_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[BatchTransferEvent]:
+        return self._iter_events(
+            self._gntb,
+            'BatchTransfer',
+            {
                 'from': payer_address,
                 'to': payee_address,
             },
-        ).filter_id
-        logs = self._geth_client.get_filter_logs(filter_id)
-
-        return [BatchTransferEvent(raw_log) for raw_log in logs]
+            BatchTransferEvent,
+            from_block,
+            to_block,
+        )
 
     def subscribe_to_batch_transfers(
             self,
@@ -231,7 +548,13 @@ class SCIImplementation(SmartContractsInterface):
             tx_hash: str,
             cb: Callable[[TransactionReceipt], None]) -> None:
         with self._awaiting_transactions_lock:
-            self._awaiting_transactions.append((tx_hash, cb))
+            self._awaiting_transactions \
+                .setdefault(tx_hash.lower(), []).append(cb)
+
+    def wait_for_receipt(self, tx_hash: str) -> 'Future[TransactionReceipt]':
+        future: Future = Future()
+        self.on_transaction_confirmed(tx_hash, future.set_result)
+        return future
 
     def get_latest_confirmed_block(self) -> Block:
         return self.get_block_by_number(
@@ -263,12 +586,10 @@ class SCIImplementation(SmartContractsInterface):
             address: str,
             from_block: int,
             cb: Callable[[DirectEthTransfer], None]) -> None:
+        sub = EthSubscription(address, cb, from_block - 1)
         with self._eth_subs_lock:
-            self._eth_subscriptions.append(EthSubscription(
-                address,
-                cb,
-                from_block - 1,
-            ))
+            self._resume_subscription(sub, self._eth_subscriptions)
+            self._eth_subscriptions.append(sub)
 
     def estimate_transfer_eth_gas(self, to_address: str, amount: int) -> int:
         return self._geth_client.estimate_gas({
@@ -279,7 +600,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def transfer_gnt(self, to_address: str, amount: int) -> str:
         return self._create_and_send_transaction(
-            self._gnt,
+            contracts.GNT,
             'transfer',
             [to_address, amount],
             self.GAS_GNT_TRANSFER,
@@ -305,7 +626,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def transfer_gntb(self, to_address: str, amount: int) -> str:
         return self._create_and_send_transaction(
-            self._gntb,
+            contracts.GNTB,
             'transfer',
             [to_address, amount],
             self.GAS_GNT_TRANSFER,
@@ -317,7 +638,7 @@ class SCIImplementation(SmartContractsInterface):
             amount: int,
             data: bytes) -> str:
         return self._create_and_send_transaction(
-            self._gntb,
+            contracts.GNTB,
             'transferAndCall',
             [to_address, amount, data],
             self.GAS_TRANSFER_AND_CALL,
@@ -330,6 +651,9 @@ class SCIImplementation(SmartContractsInterface):
             self,
             tx_hash: str) -> Optional[TransactionReceipt]:
         raw = self._geth_client.get_transaction_receipt(tx_hash)
+        return self._confirmed_receipt(raw)
+
+    def _confirmed_receipt(self, raw) -> Optional[TransactionReceipt]:
         if not raw:
             return None
         receipt = TransactionReceipt(raw)
@@ -348,7 +672,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def request_gnt_from_faucet(self) -> str:
         return self._create_and_send_transaction(
-            self._faucet,
+            contracts.Faucet,
             'create',
             [],
             self.GAS_FAUCET,
@@ -364,82 +688,197 @@ class SCIImplementation(SmartContractsInterface):
         logger.debug("Stopping SCI")
         self._geth_client.stop()
         logger.debug("SCI monitor: stopping")
+        if self._new_heads_watcher:
+            self._new_heads_watcher.stop()
         self._monitor_started = False
         with self._monitor_cv:
             self._monitor_cv.notify()
+        self._log_backfill.stop()
+        self._callback_dispatcher.stop()
 
-    def _call(self, method) -> Any:
-        return method.call(
+    def _call(self, method, block: Optional[int] = None) -> Any:
+        return self._geth_client.call_function(
+            method,
             {'from': self._address},
-            block_identifier=self._confirmed_block,
+            self._confirmed_block if block is None else block,
+        )
+
+    def _call_many(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args_list: List[List[Any]],
+            batch_size: Optional[int]) -> List[Any]:
+        """
+        Calls the contract function once for every args in batched requests,
+        all of them at the same confirmed block.
+        """
+        # web3 only takes checksum addresses in the requests
+        sender = to_checksum_address(self._address)
+        address = to_checksum_address(self._contract_addresses[contract])
+        block = self._confirmed_block
+        raw_results = _raise_errors(self._geth_client.batch_request(
+            [
+                ('eth_call', [
+                    {
+                        'from': sender,
+                        'to': address,
+                        'data': encode_hex(
+                            calldata.encode(contract, fn_name, args)),
+                    },
+                    block,
+                ])
+                for args in args_list
+            ],
+            batch_size=batch_size,
+        ))
+        return [
+            calldata.decode_output(contract, fn_name, HexBytes(raw))
+            for raw in raw_results
+        ]
+
+    def _cached_call(
+            self,
+            address: str,
+            contract: contracts.Contract,
+            make_method: Callable[[], Any]) -> Any:
+        """
+        `_call` for the balances, which can't change until the confirmed
+        block advances so they are kept until then. The method is only
+        made on a miss, building it is costly.
+        """
+        block = self._confirmed_block
+        return self._balances.get(
+            (address.lower(), contract),
+            block,
+            lambda: self._call(make_method(), block),
         )
 
     def _sign_and_send_transaction(self, tx: Transaction) -> str:
-        with self._tx_lock:
-            total_eth = tx.startgas * tx.gasprice + tx.value
-            balance = self.get_eth_balance(self._address)
-            if total_eth > balance:
-                raise Exception(
-                    'Not enough ETH for transaction. Has {}, required {}'.format(  # noqa
-                        balance / denoms.ether,
-                        total_eth / denoms.ether,
-                    ))
-            self._storage.set_nonce_sign_and_save_tx(self._tx_sign, tx)
-            with self._eth_reserved_lock:
-                self._eth_reserved += total_eth
-            tx_hash = encode_hex(tx.hash)
+        return self.send_transactions([tx])[0]
+
+    def _send_signed_transaction(self, tx_hash: str, raw_tx: bytes) -> str:
+        try:
             try:
-                try:
-                    return self._geth_client.send(tx)
-                except exceptions.KnownTransaction:
-                    # This can happen when reconnecting to other Geth instance
-                    # but initial request went through anyway and the
-                    # transaction was propagated, so this is fine
+                return self._geth_client.send_raw(raw_tx)
+            except exceptions.KnownTransaction:
+                # This can happen when reconnecting to other Geth instance
+                # but initial request went through anyway and the
+                # transaction was propagated, so this is fine
+                return tx_hash
+            except exceptions.NonceTooLow:
+                # Similar to the above but there are two cases:
+                # 1. Transaction got mined in the meantime and this is fine
+                # 2. Otherwise an actual error
+                if self._geth_client.get_transaction_receipt(tx_hash):
                     return tx_hash
-                except exceptions.NonceTooLow:
-                    # Similar to the above but there are two cases:
-                    # 1. Transaction got mined in the meantime and this is fine
-                    # 2. Otherwise an actual error
-                    if self._geth_client.get_transaction_receipt(tx_hash):
-                        return tx_hash
-                    raise
-            except exceptions.GethError as e:
-                # This can be stuff like not enough gas for the transaction.
-                # It shouldn't ever happen and if it does then it's a bug
-                # that should be fixed by the caller.
-                logger.critical('web3 JSON rpc critical error %r', e)
-                with self._eth_reserved_lock:
-                    self._eth_reserved -= total_eth
-                self._storage.revert_last_tx()
                 raise
-            except Exception:  # pylint: disable=broad-except
-                # We don't need to do anything explicitly, it will be retried
-                logger.exception(
-                    'Exception while sending transaction, will be retried',
-                )
-                return tx_hash
+        except exceptions.GethError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            # We don't need to do anything explicitly, it will be retried
+            logger.exception(
+                'Exception while sending transaction, will be retried',
+            )
+            return tx_hash
 
-    def _create_and_send_transaction(
+    def _create_transaction(
             self,
-            contract,
-            fn_name: str,
-            args: List[Any],
+            contract: contracts.Contract,
+            data: bytes,
             gas_limit: int,
-            gas_price: Optional[int] = None) -> str:
-        raw_tx = contract.functions[fn_name](*args).buildTransaction({
-            'gas': gas_limit,
-        })
+            gas_price: Optional[int] = None) -> Transaction:
+        if contract not in self._contract_addresses:
+            raise Exception('Address not provided for {}'.format(contract))
         if gas_price is None:
             gas_price = self.get_current_gas_price()
-        tx = Transaction(
+        return Transaction(
             gasprice=gas_price,
             startgas=gas_limit,
-            to=raw_tx['to'],
+            to=self._contract_addresses[contract],
             value=0,
-            data=decode_hex(raw_tx['data']),
+            data=data,
             nonce=0,  # nonce will be overridden
         )
-        return self._sign_and_send_transaction(tx)
+
+    def _create_and_send_transaction(
+            self,
+            contract: contracts.Contract,
+            fn_name: str,
+            args: List[Any],
+            gas_limit: int,
+            gas_price: Optional[int] = None) -> str:
+        return self._sign_and_send_transaction(self._create_transaction(
+            contract,
+            calldata.encode(contract, fn_name, args),
+            gas_limit,
+            gas_price,
+        ))
+
+    def _iter_events(  # pylint: disable=too-many-arguments
+            self,
+            contract,
+            event_name: str,
+            args: Dict[str, Any],
+            event_cls,
+            from_block: int,
+            to_block: int) -> Iterator[Any]:
+        """
+        Streams the events with eth_getLogs over chunks of the block range,
+        only the few chunks being fetched ahead are held in memory.
+        """
+        topics = get_event_topics(contract, event_name, args)
+        chunks = self._log_backfill.iter_logs(
+            lambda chunk_from, chunk_to: self._get_raw_logs(
+                contract.address,
+                topics,
+                chunk_from,
+                chunk_to,
+            ),
+            from_block,
+            to_block,
+        )
+        for _, _, logs in chunks:
+            for log in logs:
+                yield event_cls(log)
+
+    def _get_raw_logs(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: int,
+            to_block: int) -> List[Any]:
+        if self._log_cache is None:
+            return self._geth_client.get_raw_logs(
+                address,
+                topics,
+                from_block,
+                to_block,
+            )
+        # Only the confirmed blocks are cached, those won't change anymore
+        confirmed_block = self._confirmed_block
+        logs: List[Any] = []
+        if from_block <= confirmed_block:
+            logs = self._log_cache.get_logs(
+                address,
+                topics,
+                from_block,
+                min(to_block, confirmed_block),
+                lambda start, end: self._geth_client.get_raw_logs(
+                    address,
+                    topics,
+                    start,
+                    end,
+                ),
+            )
+        if to_block > confirmed_block:
+            logs.extend(self._geth_client.get_raw_logs(
+                address,
+                topics,
+                max(from_block, confirmed_block + 1),
+                to_block,
+            ))
+        return logs
 
     def _create_subscription(
             self,
@@ -449,23 +888,45 @@ class SCIImplementation(SmartContractsInterface):
             event_cls,
             from_block: int,
             cb: Callable[[Any], None]) -> None:
+        sub = Subscription(
+            contract,
+            event_name,
+            args,
+            event_cls,
+            cb,
+            from_block - 1,
+        )
         with self._subs_lock:
-            self._subscriptions.append(Subscription(
-                contract,
-                event_name,
-                args,
-                event_cls,
-                cb,
-                from_block - 1,
-            ))
+            self._resume_subscription(sub, self._subscriptions)
+            self._subscriptions.append(sub)
+
+    def _resume_subscription(self, sub, subs: List[Any]) -> None:
+        same_filter = sum(
+            1 for s in subs if s.id.split('#')[0] == sub.id)
+        if same_filter:
+            sub.id += '#{}'.format(same_filter)
+        if self._cursor_storage is None:
+            return
+        cursor = self._cursor_storage.get_cursor(sub.id)
+        if cursor is not None and cursor > sub.last_pulled_block:
+            logger.info(
+                'Resuming subscription %s from block %d',
+                sub.id,
+                cursor + 1,
+            )
+            sub.last_pulled_block = cursor
 
     def _monitor_blockchain(self):
         logger.debug("SCI monitor: started")
 
         self._monitor_started = True
         with self._monitor_cv:
-            while self._monitor_started \
-                    and not self._monitor_cv.wait(timeout=15):
+            while self._monitor_started:
+                if not self._new_block_pending:
+                    self._monitor_cv.wait(timeout=self.MONITOR_INTERVAL)
+                self._new_block_pending = False
+                if not self._monitor_started:
+                    break
                 try:
                     self._monitor_blockchain_single()
                 except Exception:  # pylint: disable=broad-except
@@ -473,6 +934,13 @@ class SCIImplementation(SmartContractsInterface):
 
         logger.debug("SCI monitor: stopped")
 
+    def _on_new_head(self, block_number: int) -> None:
+        if block_number - self.REQUIRED_CONFS + 1 <= self._confirmed_block:
+            return
+        with self._monitor_cv:
+            self._new_block_pending = True
+            self._monitor_cv.notify()
+
     def _monitor_blockchain_single(self):
         if not self._update_block_numbers():
             return
@@ -481,8 +949,7 @@ class SCIImplementation(SmartContractsInterface):
             self._update_gas_price,
             self._pull_subscription_events,
             self._pull_eth_subscription_events,
-            self._process_awaiting_transactions,
-            self._process_sent_transactions,
+            self._process_transactions,
         )
         for step in steps:
             if self._monitor_started:
@@ -501,40 +968,101 @@ class SCIImplementation(SmartContractsInterface):
         if confirmed_block <= self._confirmed_block:
             return False
         self._confirmed_block = confirmed_block
+        self._geth_client.set_confirmed_block(confirmed_block)
+        self._balances.advance(confirmed_block)
         return True
 
-    @staticmethod
-    def _on_event(event, cb) -> None:
+    def _on_event(self, sub, event) -> None:
         logger.info('Detected event %s', event)
-        try:
-            cb(event)
-        except Exception:  # pylint: disable=broad-except
-            logger.exception('Event callback exception')
+        # Keyed by the subscription so its events are delivered in order
+        self._callback_dispatcher.dispatch(sub, sub.cb, event)
+
+    def _deliver_event(self, sub, event, tx_hash: str, log_index: int) -> None:
+        if self._cursor_storage is None:
+            self._on_event(sub, event)
+            return
+        if self._cursor_storage.is_delivered(sub.id, tx_hash, log_index):
+            logger.debug('Skipping already delivered event %s', event)
+            return
+        self._on_event(sub, event)
+        # Not before the callback has actually been invoked, which with
+        # a threaded dispatcher happens later
+        self._callback_dispatcher.call_after(sub, functools.partial(
+            self._cursor_storage.mark_delivered,
+            sub.id,
+            tx_hash,
+            log_index,
+        ))
+
+    def _checkpoint_subscription(self, sub, block_number: int) -> None:
+        sub.last_pulled_block = block_number
+        if self._cursor_storage is not None:
+            self._callback_dispatcher.call_after(sub, functools.partial(
+                self._cursor_storage.checkpoint,
+                sub.id,
+                block_number,
+            ))
 
     def _pull_subscription_events(self) -> None:
         with self._subs_lock:
             subs = self._subscriptions.copy()
+        subs_by_contract: Dict[str, List[Subscription]] = {}
         for sub in subs:
+            if sub.last_pulled_block >= self._confirmed_block:
+                continue
+            subs_by_contract.setdefault(sub.contract.address, []).append(sub)
+        for address, contract_subs in subs_by_contract.items():
             if not self._monitor_started:
                 break
             try:
-                if sub.last_pulled_block >= self._confirmed_block:
-                    continue
-                logs = self._geth_client.get_logs(
-                    sub.contract,
-                    sub.event_name,
-                    sub.args,
-                    sub.last_pulled_block + 1,
-                    self._confirmed_block,
-                )
-                for log in logs:
-                    self._on_event(sub.event_cls(log), sub.cb)
-                sub.last_pulled_block = self._confirmed_block
+                self._pull_contract_events(address, contract_subs)
             except Exception:  # pylint: disable=broad-except
                 logger.exception(
                     'Exception while processing subscription',
                 )
 
+    def _pull_contract_events(
+            self,
+            address: str,
+            subs: List[Subscription]) -> None:
+        """
+        Pulls logs for all the subscriptions of a single contract with one
+        request and dispatches them locally. Subscriptions may have been
+        pulled up to different blocks, each one only gets logs it hasn't
+        seen yet. Long ranges are pulled in chunks and subscriptions are
+        checkpointed after each of them.
+        """
+        topics = merge_topics(subs)
+        subs_by_topics: Dict[Tuple, List[Subscription]] = {}
+        for sub in subs:
+            subs_by_topics.setdefault(sub.topics_key(), []).append(sub)
+        chunks = self._log_backfill.iter_logs(
+            lambda from_block, to_block: self._get_raw_logs(
+                address,
+                topics,
+                from_block,
+                to_block,
+            ),
+            min(sub.last_pulled_block for sub in subs) + 1,
+            self._confirmed_block,
+        )
+        for _, chunk_end, logs in chunks:
+            for log in logs:
+                for sub in matching_subscriptions(log, subs_by_topics):
+                    if log['blockNumber'] > sub.last_pulled_block:
+                        self._deliver_event(
+                            sub,
+                            sub.event_cls(log),
+                            HexBytes(log['transactionHash']).hex(),
+                            log['logIndex'],
+                        )
+            for sub in subs:
+                if sub.last_pulled_block < chunk_end:
+                    self._checkpoint_subscription(sub, chunk_end)
+            if not self._monitor_started:
+                chunks.close()
+                break
+
     def _find_incoming_eth_transfers(
             self,
             from_block: int,
@@ -564,8 +1092,13 @@ class SCIImplementation(SmartContractsInterface):
             return []
         if to_block - from_block < 4:
             result = []
-            for block_number in range(from_block + 1, to_block + 1):
-                raw_block = self._geth_client.get_block(block_number, True)
+            raw_blocks = self._geth_client.get_blocks(
+                list(range(from_block + 1, to_block + 1)),
+                True,
+            )
+            for raw_block in raw_blocks:
+                if isinstance(raw_block, Exception):
+                    raise raw_block
                 for tx in raw_block['transactions']:
                     if tx['to'] == address:
                         result.append(DirectEthTransfer(tx))
@@ -606,13 +1139,14 @@ class SCIImplementation(SmartContractsInterface):
                     sub.address,
                 )
                 for t in transfers:
-                    self._on_event(t, sub.cb)
-                sub.last_pulled_block = self._confirmed_block
+                    # Plain transfers have no logs, at most one per tx
+                    self._deliver_event(sub, t, t.tx_hash, -1)
+                self._checkpoint_subscription(sub, self._confirmed_block)
             except exceptions.MissingTrieNode as e:
                 # we cannot do anything here
                 # so let's just bump the pointer
                 # so that we don't poll the geth node repeatedly
-                sub.last_pulled_block = self._confirmed_block
+                self._checkpoint_subscription(sub, self._confirmed_block)
                 logger.warning(
                     'Error while processing eth subscription: %r',
                     e,
@@ -622,54 +1156,99 @@ class SCIImplementation(SmartContractsInterface):
                     'Error while processing eth subscription',
                 )
 
-    def _process_awaiting_transactions(self) -> None:
-        with self._awaiting_transactions_lock:
-            awaiting_transactions = self._awaiting_transactions
-            self._awaiting_transactions = []
-
-        def processed(awaiting_tx) -> bool:
-            tx_hash, cb = awaiting_tx
-            receipt = self.get_transaction_receipt(tx_hash)
-            if not receipt:
-                return False
-            try:
-                cb(receipt)
-            except Exception:  # pylint: disable=broad-except
-                logger.exception(
-                    'Confirmed transaction %r callback error',
+    def _get_confirmed_receipts(
+            self,
+            tx_hashes: List[str]) -> Dict[str, TransactionReceipt]:
+        """
+        Fetches receipts for all the hashes, which have to be unique, with
+        a single batch request in their order. Returns only those which are
+        already confirmed.
+        """
+        raw_receipts = self._geth_client.get_transaction_receipts(tx_hashes)
+        receipts = {}
+        for tx_hash, raw in zip(tx_hashes, raw_receipts):
+            if isinstance(raw, Exception):
+                logger.warning(
+                    'Exception while getting receipt for %s: %r',
                     tx_hash,
+                    raw,
                 )
-            return True
-
-        remaining_awaiting_transactions = \
-            [tx for tx in awaiting_transactions if not processed(tx)]
+                continue
+            receipt = self._confirmed_receipt(raw)
+            if receipt:
+                receipts[tx_hash] = receipt
+        return receipts
 
+    def _process_transactions(self) -> None:
         with self._awaiting_transactions_lock:
-            self._awaiting_transactions.extend(remaining_awaiting_transactions)
-
-    def _process_sent_transactions(self) -> None:
+            awaiting_hashes = list(self._awaiting_transactions)
         with self._tx_lock:
             transactions = self._storage.get_all_tx()
+        sent_transactions = {encode_hex(tx.hash): tx for tx in transactions}
 
-            for tx in transactions:
-                try:
-                    tx_hash = encode_hex(tx.hash)
-                    receipt = self.get_transaction_receipt(tx_hash)
-                    if receipt:
-                        self._storage.remove_tx(tx.nonce)
-                        with self._eth_reserved_lock:
-                            self._eth_reserved -= \
-                                tx.value + tx.gasprice * tx.startgas
-                    else:
-                        tx_res = self._geth_client.get_transaction(tx_hash)
-                        if tx_res is None:
-                            logger.info('Resending transaction %r', tx_hash)
-                            self._geth_client.send(tx)
-                except Exception:  # pylint: disable=broad-except
-                    logger.warning(
-                        "Exception while resending transaction %s",
-                        tx_hash,
-                    )
+        # Awaited transactions are usually our own so the lists overlap
+        receipts = self._get_confirmed_receipts(
+            list(dict.fromkeys(list(sent_transactions) + awaiting_hashes)),
+        )
+
+        self._process_awaiting_transactions(receipts)
+        if self._monitor_started:
+            self._process_sent_transactions(sent_transactions, receipts)
+
+    def _process_awaiting_transactions(
+            self,
+            receipts: Dict[str, TransactionReceipt]) -> None:
+        with self._awaiting_transactions_lock:
+            confirmed = [
+                (tx_hash, self._awaiting_transactions.pop(tx_hash))
+                for tx_hash in receipts
+                if tx_hash in self._awaiting_transactions
+            ]
+        for tx_hash, callbacks in confirmed:
+            for cb in callbacks:
+                self._callback_dispatcher.dispatch(
+                    tx_hash,
+                    cb,
+                    receipts[tx_hash],
+                )
+
+    def _process_sent_transactions(
+            self,
+            sent_transactions: Dict[str, SignedTransaction],
+            receipts: Dict[str, TransactionReceipt]) -> None:
+        unconfirmed = []
+        for tx_hash, tx in sent_transactions.items():
+            if tx_hash not in receipts:
+                unconfirmed.append((tx_hash, tx))
+                continue
+            try:
+                with self._tx_lock:
+                    self._storage.remove_tx(tx.nonce)
+                with self._eth_reserved_lock:
+                    self._eth_reserved -= tx.value + tx.gasprice * tx.startgas
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Exception while removing transaction %s",
+                    tx_hash,
+                )
+
+        # Transactions are resent without holding the lock, the ones in
+        # the snapshot have already been through the initial send
+        raw_txs = self._geth_client.get_transactions(
+            [tx_hash for tx_hash, _ in unconfirmed],
+        )
+        for (tx_hash, tx), tx_res in zip(unconfirmed, raw_txs):
+            try:
+                if isinstance(tx_res, Exception):
+                    raise tx_res
+                if tx_res is None:
+                    logger.info('Resending transaction %r', tx_hash)
+                    self._geth_client.send_raw(tx.raw)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(
+                    "Exception while resending transaction %s",
+                    tx_hash,
+                )
 
     ########################
     # GNT-GNTB conversions #
@@ -677,7 +1256,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def open_gate(self) -> str:
         return self._create_and_send_transaction(
-            self._gntb,
+            contracts.GNTB,
             'openGate',
             [],
             self.GAS_OPEN_GATE,
@@ -691,7 +1270,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def transfer_from_gate(self) -> str:
         return self._create_and_send_transaction(
-            self._gntb,
+            contracts.GNTB,
             'transferFromGate',
             [],
             self.GAS_TRANSFER_FROM_GATE,
@@ -703,7 +1282,7 @@ class SCIImplementation(SmartContractsInterface):
             amount: int,
             gas_price: Optional[int] = None) -> str:
         return self._create_and_send_transaction(
-            self._gntb,
+            contracts.GNTB,
             'withdrawTo',
             [amount, to_address],
             self.GAS_WITHDRAW,
@@ -727,7 +1306,7 @@ class SCIImplementation(SmartContractsInterface):
         if len(subtask_id) != 32:
             raise ValueError('subtask_id has to be exactly 32 bytes long')
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'reimburseForSubtask',
             [
                 requestor_address,
@@ -748,18 +1327,30 @@ class SCIImplementation(SmartContractsInterface):
             provider_address: str,
             from_block: int,
             to_block: int) -> List[ForcedSubtaskPaymentEvent]:
-        filter_id = \
-            self._gntdeposit.events.ReimburseForSubtask.createFilter(
-                fromBlock=from_block,
-                toBlock=to_block,
-                argument_filters={
-                    '_requestor': requestor_address,
-                    '_provider': provider_address,
-                },
-            ).filter_id
-        logs = self._geth_client.get_filter_logs(filter_id)
-
-        return [ForcedSubtaskPaymentEvent(raw_log) for raw_log in logs]
+        return list(self.iter_forced_subtask_payments(
+            requestor_address,
+            provider_address,
+            from_block,
+            to_block,
+        ))
+
+    def iter_forced_subtask_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[ForcedSubtaskPaymentEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForSubtask',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedSubtaskPaymentEvent,
+            from_block,
+            to_block,
+        )
 
     def subscribe_to_forced_subtask_payments(
             self,
@@ -784,7 +1375,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def unlock_deposit(self) -> str:
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'unlock',
             [],
             self.GAS_UNLOCK_DEPOSIT,
@@ -792,7 +1383,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def lock_deposit(self) -> str:
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'lock',
             [],
             self.GAS_UNLOCK_DEPOSIT,
@@ -800,7 +1391,7 @@ class SCIImplementation(SmartContractsInterface):
 
     def withdraw_deposit(self) -> str:
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'withdraw',
             [self._address],
             self.GAS_WITHDRAW_DEPOSIT,
@@ -818,7 +1409,7 @@ class SCIImplementation(SmartContractsInterface):
             reimburse_amount: int,
             closure_time: int) -> str:
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'reimburseForNoPayment',
             [
                 requestor_address,
@@ -840,18 +1431,30 @@ class SCIImplementation(SmartContractsInterface):
             provider_address: str,
             from_block: int,
             to_block: int) -> List[ForcedPaymentEvent]:
-        filter_id = self._gntdeposit.events.ReimburseForNoPayment.\
-            createFilter(
-                fromBlock=from_block,
-                toBlock=to_block,
-                argument_filters={
-                    '_requestor': requestor_address,
-                    '_provider': provider_address,
-                },
-            ).filter_id
-        logs = self._geth_client.get_filter_logs(filter_id)
-
-        return [ForcedPaymentEvent(raw_log) for raw_log in logs]
+        return list(self.iter_forced_payments(
+            requestor_address,
+            provider_address,
+            from_block,
+            to_block,
+        ))
+
+    def iter_forced_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[ForcedPaymentEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForNoPayment',
+            {
+                '_requestor': requestor_address,
+                '_provider': provider_address,
+            },
+            ForcedPaymentEvent,
+            from_block,
+            to_block,
+        )
 
     def subscribe_to_forced_payments(
             self,
@@ -883,7 +1486,7 @@ class SCIImplementation(SmartContractsInterface):
         if len(subtask_id) != 32:
             raise ValueError('subtask_id has to be exactly 32 bytes long')
         return self._create_and_send_transaction(
-            self._gntdeposit,
+            contracts.GNTDeposit,
             'reimburseForVerificationCosts',
             [address, value, subtask_id, v, r, s, reimburse_amount],
             self.GAS_REIMBURSE,
@@ -894,25 +1497,61 @@ class SCIImplementation(SmartContractsInterface):
             address: str,
             from_block: int,
             to_block: int) -> List[CoverAdditionalVerificationEvent]:
-        filter_id = self._gntdeposit.events.ReimburseForVerificationCosts.\
-            createFilter(
-                fromBlock=from_block,
-                toBlock=to_block,
-                argument_filters={
-                    '_from': address,
-                },
-            ).filter_id
-        logs = self._geth_client.get_filter_logs(filter_id)
-
-        return [CoverAdditionalVerificationEvent(raw_log) for raw_log in logs]
+        return list(self.iter_covered_additional_verification_costs(
+            address,
+            from_block,
+            to_block,
+        ))
+
+    def iter_covered_additional_verification_costs(
+            self,
+            address: str,
+            from_block: int,
+            to_block: int) -> Iterator[CoverAdditionalVerificationEvent]:
+        return self._iter_events(
+            self._gntdeposit,
+            'ReimburseForVerificationCosts',
+            {
+                '_from': address,
+            },
+            CoverAdditionalVerificationEvent,
+            from_block,
+            to_block,
+        )
 
     def get_deposit_value(
             self,
             account_address: str) -> int:
-        return self._call(self._gntdeposit.functions.balanceOf(account_address))
+        return self._cached_call(
+            account_address,
+            contracts.GNTDeposit,
+            lambda: self._gntdeposit.functions.balanceOf(account_address),
+        )
 
     def get_deposit_locked_until(
             self,
             account_address: str) -> int:
         return self._call(
             self._gntdeposit.functions.getTimelock(account_address))
+
+    def get_deposit_values(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return self._call_many(
+            contracts.GNTDeposit,
+            'balanceOf',
+            [[address] for address in account_addresses],
+            batch_size,
+        )
+
+    def get_deposit_locked_until_many(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        return self._call_many(
+            contracts.GNTDeposit,
+            'getTimelock',
+            [[address] for address in account_addresses],
+            batch_size,
+        )
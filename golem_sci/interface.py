@@ -1,6 +1,9 @@
-from typing import Callable, Optional, List
+from concurrent.futures import Future
+from typing import Callable, Iterator, Optional, List
 import abc
 
+from ethereum.transactions import Transaction
+
 from .events import (
     BatchTransferEvent,
     GntTransferEvent,
@@ -41,6 +44,17 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def get_eth_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        """
+        Returns eth balances of many addresses in wei, all at the same block.
+        The queries are batched, batch_size of them in a single request.
+        """
+        pass
+
     @abc.abstractmethod
     def get_gnt_balance(self, address: str) -> int:
         """
@@ -55,6 +69,16 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def get_gntb_balances(
+            self,
+            addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        """
+        Batched version of `get_gntb_balance`, see `get_eth_balances`.
+        """
+        pass
+
     @abc.abstractmethod
     def get_transaction_receipt(
             self,
@@ -87,6 +111,19 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
             to_block: int) -> List[BatchTransferEvent]:
         pass
 
+    @abc.abstractmethod
+    def iter_batch_transfers(
+            self,
+            payer_address: str,
+            payee_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[BatchTransferEvent]:
+        """
+        Lazy version of `get_batch_transfers`, streams the events fetching
+        the logs in chunks so memory use doesn't grow with the block range.
+        """
+        pass
+
     @abc.abstractmethod
     def subscribe_to_batch_transfers(
             self,
@@ -112,6 +149,15 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def wait_for_receipt(self, tx_hash: str) -> 'Future[TransactionReceipt]':
+        """
+        Returns a future which resolves once the transaction has been
+        confirmed required number of times, e.g.
+        sci.wait_for_receipt(sci.transfer_gnt(address, amount)).result()
+        """
+        pass
+
     @abc.abstractmethod
     def get_latest_confirmed_block_number(self) -> int:
         pass
@@ -183,6 +229,30 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
     def batch_transfer(self, payments: List[Payment], closure_time: int) -> str:
         pass
 
+    # Transaction
+    @abc.abstractmethod
+    def batch_transfer_many(
+            self,
+            payments: List[Payment],
+            closure_time: int) -> List[str]:
+        """
+        Same as batch_transfer but splits the payments into as few
+        transactions as needed to fit the block gas limit.
+        """
+        pass
+
+    # Transaction
+    @abc.abstractmethod
+    def send_transactions(self, txs: List[Transaction]) -> List[str]:
+        """
+        Signs the unsigned transactions with consecutive nonces, their nonce
+        fields are overridden, persists all of them with a single storage
+        write and then broadcasts them in order.
+        If the node rejects one of them, it and all the following ones are
+        reverted and the error is raised; the preceding ones stay sent.
+        """
+        pass
+
     ########################
     # GNT-GNTB conversions #
     ########################
@@ -242,6 +312,27 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    @abc.abstractmethod
+    def get_deposit_values(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        """
+        Batched version of `get_deposit_value`, see `get_eth_balances`.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_deposit_locked_until_many(
+            self,
+            account_addresses: List[str],
+            batch_size: Optional[int] = None) -> List[int]:
+        """
+        Batched version of `get_deposit_locked_until`, see
+        `get_eth_balances`.
+        """
+        pass
+
     # Transaction
     @abc.abstractmethod
     def deposit_payment(self, value: int) -> str:
@@ -285,6 +376,18 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
             to_block: int) -> List[ForcedSubtaskPaymentEvent]:
         pass
 
+    @abc.abstractmethod
+    def iter_forced_subtask_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[ForcedSubtaskPaymentEvent]:
+        """
+        Lazy version of `get_forced_subtask_payments`.
+        """
+        pass
+
     @abc.abstractmethod
     def subscribe_to_forced_subtask_payments(
             self,
@@ -318,6 +421,18 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
             to_block: int) -> List[ForcedPaymentEvent]:
         pass
 
+    @abc.abstractmethod
+    def iter_forced_payments(
+            self,
+            requestor_address: str,
+            provider_address: str,
+            from_block: int,
+            to_block: int) -> Iterator[ForcedPaymentEvent]:
+        """
+        Lazy version of `get_forced_payments`.
+        """
+        pass
+
     @abc.abstractmethod
     def subscribe_to_forced_payments(
             self,
@@ -347,3 +462,14 @@ class SmartContractsInterface(object, metaclass=abc.ABCMeta):
             from_block: int,
             to_block: int) -> List[CoverAdditionalVerificationEvent]:
         pass
+
+    @abc.abstractmethod
+    def iter_covered_additional_verification_costs(
+            self,
+            address: str,
+            from_block: int,
+            to_block: int) -> Iterator[CoverAdditionalVerificationEvent]:
+        """
+        Lazy version of `get_covered_additional_verification_costs`.
+        """
+        pass
@@ -0,0 +1,268 @@
+import json
+import logging
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+logger = logging.getLogger(__name__)
+
+_MAX_TOPICS = 4
+
+
+def _normalize_topics(topics: List[Any]) -> List[Any]:
+    normalized: List[Any] = []
+    for topic in topics:
+        if topic is None:
+            normalized.append(None)
+        elif isinstance(topic, (list, tuple)):
+            values = sorted(set(HexBytes(t).hex().lower() for t in topic))
+            normalized.append(values[0] if len(values) == 1 else values)
+        else:
+            normalized.append(HexBytes(topic).hex().lower())
+    while normalized and normalized[-1] is None:
+        normalized.pop()
+    return normalized
+
+
+def _subsumes(cover: List[Any], topics: List[Any]) -> bool:
+    """
+    Whether every log matching `topics` also matches `cover`.
+    """
+    if len(cover) > len(topics):
+        return False
+    for cover_value, value in zip(cover, topics):
+        if cover_value is None:
+            continue
+        if value is None:
+            return False
+        cover_set = set(cover_value) if isinstance(cover_value, list) \
+            else {cover_value}
+        value_set = set(value) if isinstance(value, list) else {value}
+        if not value_set <= cover_set:
+            return False
+    return True
+
+
+def _missing_ranges(
+        covered: List[Tuple[int, int]],
+        from_block: int,
+        to_block: int) -> List[Tuple[int, int]]:
+    missing = []
+    next_block = from_block
+    for start, end in sorted(covered):
+        if end < next_block:
+            continue
+        if start > to_block:
+            break
+        if start > next_block:
+            missing.append((next_block, start - 1))
+        next_block = end + 1
+    if next_block <= to_block:
+        missing.append((next_block, to_block))
+    return missing
+
+
+class SqliteLogCache:
+    """
+    Keeps the logs already fetched from the node in an SQLite database along
+    with the block ranges it holds all the logs of for a given address and
+    topics filter. A query is answered from the database if the range is
+    covered by the same or a more general filter, only the missing parts of
+    the range are fetched. Logs are indexed by their topics.
+    Only blocks which can't be reorganized anymore should be cached, it's
+    the caller's responsibility to not query past the confirmed block.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(filepath),
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction():
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS logs ('
+                ' address TEXT NOT NULL,'
+                ' block_number INTEGER NOT NULL,'
+                ' log_index INTEGER NOT NULL,'
+                ' block_hash TEXT NOT NULL,'
+                ' tx_hash TEXT NOT NULL,'
+                ' tx_index INTEGER NOT NULL,'
+                ' topic0 TEXT,'
+                ' topic1 TEXT,'
+                ' topic2 TEXT,'
+                ' topic3 TEXT,'
+                ' data TEXT NOT NULL,'
+                ' PRIMARY KEY (block_number, log_index))'
+            )
+            for i in range(_MAX_TOPICS):
+                self._conn.execute(
+                    'CREATE INDEX IF NOT EXISTS logs_topic{0}'
+                    ' ON logs (address, topic{0}, block_number)'.format(i)
+                )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS ranges ('
+                ' address TEXT NOT NULL,'
+                ' topics TEXT NOT NULL,'
+                ' from_block INTEGER NOT NULL,'
+                ' to_block INTEGER NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS ranges_address'
+                ' ON ranges (address, topics, from_block)'
+            )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def get_logs(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: int,
+            to_block: int,
+            fetch: Callable[[int, int], List[Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the logs like `Client.get_raw_logs` would, calling
+        fetch(from_block, to_block) for the parts of the range which aren't
+        cached yet.
+        """
+        address = address.lower()
+        topics = _normalize_topics(topics)
+        for start, end in self.get_missing_ranges(
+                address, topics, from_block, to_block):
+            logger.debug(
+                'Log cache miss for %s %r blocks %d-%d',
+                address,
+                topics,
+                start,
+                end,
+            )
+            self.add_logs(address, topics, start, end, fetch(start, end))
+        return self._select(address, topics, from_block, to_block)
+
+    def get_missing_ranges(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: int,
+            to_block: int) -> List[Tuple[int, int]]:
+        address = address.lower()
+        topics = _normalize_topics(topics)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT topics, from_block, to_block FROM ranges'
+                ' WHERE address = ? AND from_block <= ? AND to_block >= ?',
+                (address, to_block, from_block),
+            ).fetchall()
+        covered = [
+            (start, end) for cover, start, end in rows
+            if _subsumes(json.loads(cover), topics)
+        ]
+        return _missing_ranges(covered, from_block, to_block)
+
+    def add_logs(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: int,
+            to_block: int,
+            logs: List[Any]) -> None:
+        """
+        Stores all the logs matching the filter within the range.
+        """
+        address = address.lower()
+        key = json.dumps(_normalize_topics(topics))
+        with self._transaction():
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO logs VALUES'
+                ' (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._log_to_row(address, log) for log in logs],
+            )
+            # Merged with the overlapping and adjacent ranges
+            rows = self._conn.execute(
+                'SELECT rowid, from_block, to_block FROM ranges'
+                ' WHERE address = ? AND topics = ?'
+                ' AND from_block <= ? AND to_block >= ?',
+                (address, key, to_block + 1, from_block - 1),
+            ).fetchall()
+            for rowid, start, end in rows:
+                from_block = min(from_block, start)
+                to_block = max(to_block, end)
+                self._conn.execute(
+                    'DELETE FROM ranges WHERE rowid = ?',
+                    (rowid,),
+                )
+            self._conn.execute(
+                'INSERT INTO ranges VALUES (?, ?, ?, ?)',
+                (address, key, from_block, to_block),
+            )
+
+    @staticmethod
+    def _log_to_row(address: str, log) -> Tuple:
+        topics: List[Optional[str]] = \
+            [HexBytes(t).hex().lower() for t in log['topics']]
+        topics += [None] * (_MAX_TOPICS - len(topics))
+        return (
+            address,
+            log['blockNumber'],
+            log['logIndex'],
+            HexBytes(log['blockHash']).hex(),
+            HexBytes(log['transactionHash']).hex(),
+            log['transactionIndex'],
+            *topics,
+            log['data'],
+        )
+
+    def _select(
+            self,
+            address: str,
+            topics: List[Any],
+            from_block: int,
+            to_block: int) -> List[Dict[str, Any]]:
+        query = 'SELECT * FROM logs' \
+            ' WHERE address = ? AND block_number BETWEEN ? AND ?'
+        params: List[Any] = [address, from_block, to_block]
+        for i, value in enumerate(topics):
+            if value is None:
+                continue
+            values = value if isinstance(value, list) else [value]
+            query += ' AND topic{} IN ({})'.format(
+                i, ', '.join('?' * len(values)))
+            params.extend(values)
+        query += ' ORDER BY block_number, log_index'
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                'address': to_checksum_address(row[0]),
+                'blockNumber': row[1],
+                'logIndex': row[2],
+                'blockHash': HexBytes(row[3]),
+                'transactionHash': HexBytes(row[4]),
+                'transactionIndex': row[5],
+                'topics': [HexBytes(t) for t in row[6:10] if t is not None],
+                'data': row[10],
+                'removed': False,
+            }
+            for row in rows
+        ]
@@ -0,0 +1,68 @@
+import collections
+import threading
+from typing import Any, Hashable, Tuple
+
+
+class CacheStats:
+    def __init__(self, hits: int, misses: int, size: int) -> None:
+        self.hits = hits
+        self.misses = misses
+        self.size = size
+
+    def __str__(self) -> str:
+        return '<CacheStats hits: {} misses: {} size: {}>'.format(
+            self.hits,
+            self.misses,
+            self.size,
+        )
+
+
+class LRUCache:
+    """
+    Thread safe cache dropping the least recently used entries once the
+    total size of the entries exceeds `max_size`. Every entry has a size of
+    1 unless told otherwise.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Returns whether the key was found and its value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int = 1) -> None:
+        if size > self._max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self._max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._size)
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from eth_utils import to_bytes, to_text
+import websockets
+from web3.providers import IPCProvider, WebsocketProvider
+from web3.providers.ipc import get_ipc_socket
+
+from .client import Client
+
+logger = logging.getLogger(__name__)
+
+
+def _subscribe_request() -> bytes:
+    return to_bytes(text=json.dumps({
+        'jsonrpc': '2.0',
+        'method': 'eth_subscribe',
+        'params': ['newHeads'],
+        'id': 1,
+    }))
+
+
+def _parse_subscription_id(response: Dict[str, Any]) -> str:
+    if 'error' in response:
+        raise ValueError(response['error'])
+    return response['result']
+
+
+def _parse_head(
+        message: Dict[str, Any],
+        subscription_id: str) -> Optional[int]:
+    if message.get('method') != 'eth_subscription':
+        return None
+    params = message['params']
+    if params['subscription'] != subscription_id:
+        return None
+    return int(params['result']['number'], 16)
+
+
+class NewHeadsWatcher:
+    """
+    Notifies about new blocks as soon as the node sees them. Uses
+    `eth_subscribe('newHeads')` when connected over IPC or WebSocket, polls
+    `eth_blockNumber` otherwise or when the subscription is broken.
+    Callback is invoked from the watcher's thread with the latest block
+    number, only when it advances.
+    """
+
+    POLL_INTERVAL = 1
+    # How long to keep polling before trying to subscribe again
+    RESUBSCRIBE_INTERVAL = 60
+    # How often blocking reads are interrupted to check for stop
+    READ_TIMEOUT = 1
+
+    def __init__(
+            self,
+            geth_client: Client,
+            cb: Callable[[int], None]) -> None:
+        self._geth_client = geth_client
+        self._cb = cb
+        self._last_block = -1
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        logger.debug('New heads watcher: started')
+        provider = self._geth_client.web3.providers[0]
+        if not isinstance(provider, (IPCProvider, WebsocketProvider)):
+            logger.info(
+                'Subscriptions are not supported by %s, polling for new '
+                'blocks',
+                type(provider).__name__,
+            )
+            self._poll(float('inf'))
+        while not self._stopped.is_set():
+            try:
+                for block_number in self._subscribe():
+                    self._on_block(block_number)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning(
+                    'New heads subscription failed, falling back to '
+                    'polling: %r',
+                    e,
+                )
+            self._poll(time.time() + self.RESUBSCRIBE_INTERVAL)
+        logger.debug('New heads watcher: stopped')
+
+    def _on_block(self, block_number: int) -> None:
+        if block_number <= self._last_block:
+            return
+        self._last_block = block_number
+        try:
+            self._cb(block_number)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('New block callback exception')
+
+    def _poll(self, until: float) -> None:
+        while time.time() < until and \
+                not self._stopped.wait(self.POLL_INTERVAL):
+            try:
+                self._on_block(self._geth_client.get_block_number())
+            except Exception as e:  # pylint: disable=broad-except
+                logger.debug('Error while polling block number: %r', e)
+
+    def _subscribe(self) -> Iterator[int]:
+        provider = self._geth_client.web3.providers[0]
+        if isinstance(provider, IPCProvider):
+            return self._subscribe_ipc(provider.ipc_path)
+        return self._subscribe_websocket(provider.endpoint_uri)
+
+    def _subscribe_ipc(self, ipc_path: str) -> Iterator[int]:
+        sock = get_ipc_socket(ipc_path, timeout=self.READ_TIMEOUT)
+        try:
+            sock.sendall(_subscribe_request())
+            messages = self._read_messages(sock)
+            response = next(messages, None)
+            if response is None:
+                return
+            subscription_id = _parse_subscription_id(response)
+            logger.info('Subscribed to new heads over IPC')
+            for message in messages:
+                block_number = _parse_head(message, subscription_id)
+                if block_number is not None:
+                    yield block_number
+        finally:
+            sock.close()
+
+    def _read_messages(self, sock) -> Iterator[Dict[str, Any]]:
+        decoder = json.JSONDecoder()
+        buf = ''
+        while not self._stopped.is_set():
+            try:
+                chunk = sock.recv(4096)
+            except socket.timeout:
+                continue
+            if not chunk:
+                raise ConnectionError('IPC connection closed')
+            buf += to_text(chunk)
+            while True:
+                buf = buf.lstrip()
+                try:
+                    message, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                yield message
+
+    def _subscribe_websocket(self, endpoint_uri: str) -> Iterator[int]:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        ws = loop.run_until_complete(websockets.connect(uri=endpoint_uri))
+        try:
+            loop.run_until_complete(ws.send(to_text(_subscribe_request())))
+            subscription_id = _parse_subscription_id(
+                json.loads(loop.run_until_complete(ws.recv())))
+            logger.info('Subscribed to new heads over WebSocket')
+            while not self._stopped.is_set():
+                try:
+                    message = loop.run_until_complete(asyncio.wait_for(
+                        ws.recv(),
+                        timeout=self.READ_TIMEOUT,
+                    ))
+                except asyncio.TimeoutError:
+                    continue
+                block_number = \
+                    _parse_head(json.loads(message), subscription_id)
+                if block_number is not None:
+                    yield block_number
+        finally:
+            loop.run_until_complete(ws.close())
+            loop.close()
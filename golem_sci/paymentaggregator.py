@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from eth_utils import to_checksum_address
+
+from .implementation import SCIImplementation
+from .interface import SmartContractsInterface
+from .structs import Payment
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingPayment:
+    def __init__(self, payee: str) -> None:
+        self.payee = payee
+        self.amount = 0
+        self.futures: List[Future] = []
+
+
+class PaymentAggregator:
+    """
+    Collects individual payments and sends them together with a single
+    batch_transfer. Payments to the same payee are merged into one, however
+    the address is cased.
+    The batch is sent when it reaches `max_payments` payees, when its gas
+    would reach `max_gas` or `max_delay` seconds after the first payment in
+    it, whichever comes first. Closure time of the batch is the latest
+    closure time of the payments in it.
+    Every added payment gets a future which resolves to the hash of the
+    transaction it was sent in, or to the exception if sending failed.
+    """
+
+    MAX_PAYMENTS = 200
+    MAX_DELAY = 60
+
+    def __init__(
+            self,
+            sci: SmartContractsInterface,
+            max_payments: int = MAX_PAYMENTS,
+            max_gas: Optional[int] = None,
+            max_delay: float = MAX_DELAY) -> None:
+        self._sci = sci
+        self._max_payments = max_payments
+        if max_gas is not None:
+            self._max_payments = min(
+                self._max_payments,
+                (max_gas - SCIImplementation.GAS_BATCH_PAYMENT_BASE) //
+                SCIImplementation.GAS_PER_PAYMENT,
+            )
+        if self._max_payments < 1:
+            raise ValueError('Batch has to fit at least one payment')
+        self._max_delay = max_delay
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _PendingPayment] = {}
+        self._closure_time = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def add(
+            self,
+            payment: Payment,
+            closure_time: Optional[int] = None) -> Future:
+        """
+        closure_time defaults to the current time. Raises ValueError for
+        a payment which can't be sent, nothing is queued then.
+        """
+        if closure_time is None:
+            closure_time = int(time.time())
+        # Raises ValueError if the address is malformed
+        payee = to_checksum_address(payment.payee)
+        if not 0 < payment.amount < 2 ** 96:
+            raise ValueError(
+                'Payment should be positive and less than {}, got {}'.format(
+                    2 ** 96, payment.amount))
+        future: Future = Future()
+        batches = []
+        with self._lock:
+            pending = self._pending.get(payee)
+            if pending is not None and \
+                    pending.amount + payment.amount >= 2 ** 96:
+                # Merged amount wouldn't fit in the payment encoding
+                batches.append(self._take_batch())
+                pending = None
+            if pending is None:
+                if not self._pending:
+                    self._start_timer()
+                pending = _PendingPayment(payee)
+                self._pending[payee] = pending
+            pending.amount += payment.amount
+            pending.futures.append(future)
+            self._closure_time = max(self._closure_time, closure_time)
+            if len(self._pending) >= self._max_payments:
+                batches.append(self._take_batch())
+        for batch, batch_closure_time in batches:
+            self._send(batch, batch_closure_time)
+        return future
+
+    def flush(self) -> None:
+        """
+        Sends the pending payments right away.
+        """
+        with self._lock:
+            batch, closure_time = self._take_batch()
+        self._send(batch, closure_time)
+
+    def stop(self) -> None:
+        self.flush()
+
+    def _start_timer(self) -> None:
+        timer = threading.Timer(
+            self._max_delay,
+            lambda: self._on_timer(timer),
+        )
+        timer.daemon = True
+        self._timer = timer
+        timer.start()
+
+    def _on_timer(self, timer: threading.Timer) -> None:
+        with self._lock:
+            # The batch this timer was started for may be already sent
+            if timer is not self._timer:
+                return
+            batch, closure_time = self._take_batch()
+        self._send(batch, closure_time)
+
+    def _take_batch(self) -> Tuple[List[_PendingPayment], int]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = list(self._pending.values())
+        closure_time = self._closure_time
+        self._pending = {}
+        self._closure_time = 0
+        return batch, closure_time
+
+    def _send(self, batch: List[_PendingPayment], closure_time: int) -> None:
+        if not batch:
+            return
+        logger.info(
+            'Sending %d aggregated payments, closure_time=%d',
+            len(batch),
+            closure_time,
+        )
+        try:
+            tx_hash = self._sci.batch_transfer(
+                [Payment(p.payee, p.amount) for p in batch],
+                closure_time,
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception('Aggregated batch transfer failed')
+            for p in batch:
+                for future in p.futures:
+                    future.set_exception(e)
+            return
+        for p in batch:
+            for future in p.futures:
+                future.set_result(tx_hash)
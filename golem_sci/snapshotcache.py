@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SnapshotCache:
+    """
+    Keeps values which can't change until the block they were read at
+    advances, only the latest block's values are kept. Concurrent misses
+    for the same key are collapsed, only the first caller fetches the value
+    and the others wait for its result.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._block: Optional[int] = None
+        self._values: Dict[Tuple, Any] = {}
+        self._pending: Dict[Tuple, Future] = {}
+
+    def advance(self, block: int) -> None:
+        """
+        Drops the values read at the blocks before this one.
+        """
+        with self._lock:
+            self._advance(block)
+
+    def _advance(self, block: int) -> None:
+        if self._block is None or block > self._block:
+            self._block = block
+            self._values.clear()
+
+    def get(
+            self,
+            key: Hashable,
+            block: int,
+            fetch: Callable[[], Any]) -> Any:
+        """
+        Returns the value of the key at the block calling fetch() if it's
+        not cached yet. Values of the older blocks are fetched but not
+        cached.
+        """
+        full_key = (key, block)
+        with self._lock:
+            self._advance(block)
+            if full_key in self._values:
+                return self._values[full_key]
+            future = self._pending.get(full_key)
+            if future is None:
+                future = Future()
+                self._pending[full_key] = future
+                fetching = True
+            else:
+                fetching = False
+        if not fetching:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[full_key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._pending[full_key]
+            if block == self._block:
+                self._values[full_key] = value
+        future.set_result(value)
+        return value
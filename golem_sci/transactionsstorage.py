@@ -1,18 +1,118 @@
 import json
 import logging
 import os
+import sqlite3
+import threading
+import time
 
 from abc import abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-from eth_utils import decode_hex, encode_hex
+from eth_utils import decode_hex, encode_hex, keccak
 from ethereum.transactions import Transaction
 from hexbytes import HexBytes
+import rlp
 
 logger = logging.getLogger(__name__)
 
 
+class SignedTransaction(Transaction):
+    """
+    Immutable transaction with the raw RLP and hash computed once, this is
+    what storages hand out so they can be cached between calls.
+    """
+
+    _hash: Optional[bytes] = None
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Caches the encoding and makes the object immutable
+        self.raw = rlp.encode(self, cache=True)
+        self._hash = keccak(self.raw)
+
+    @classmethod
+    def from_tx(cls, tx: Transaction) -> 'SignedTransaction':
+        if isinstance(tx, cls):
+            return tx
+        return cls(
+            nonce=tx.nonce,
+            gasprice=tx.gasprice,
+            startgas=tx.startgas,
+            to=tx.to,
+            value=tx.value,
+            data=tx.data,
+            v=tx.v,
+            r=tx.r,
+            s=tx.s,
+        )
+
+    @classmethod
+    def from_raw(cls, raw: bytes) -> 'SignedTransaction':
+        """
+        Keeps the exact bytes as they were produced when signing, those are
+        what gets rebroadcasted.
+        """
+        tx = rlp.decode(raw, cls)
+        tx._cached_rlp = tx.raw = raw  # pylint: disable=protected-access
+        tx._hash = keccak(raw)  # pylint: disable=protected-access
+        return tx
+
+    @property
+    def hash(self) -> bytes:
+        if self._hash is None:
+            # Transaction's constructor already asks for the hash
+            return super().hash
+        return self._hash
+
+    def __eq__(self, other):
+        # Equal to the plain Transaction it was created from
+        return isinstance(other, Transaction) and self.hash == other.hash
+
+    __hash__ = Transaction.__hash__
+
+
+def _tx_to_dict(tx: SignedTransaction) -> Dict[str, Any]:
+    return {
+        'nonce': tx.nonce,
+        'gasprice': tx.gasprice,
+        'startgas': tx.startgas,
+        'to': HexBytes(tx.to).hex(),
+        'value': tx.value,
+        'data': HexBytes(tx.data).hex(),
+        'v': tx.v,
+        'r': tx.r,
+        's': tx.s,
+        'raw': encode_hex(tx.raw),
+    }
+
+
+def _tx_from_dict(tx: Dict[str, Any]) -> SignedTransaction:
+    if 'raw' in tx:
+        return SignedTransaction.from_raw(decode_hex(tx['raw']))
+    # Saved before raw transactions were stored
+    return SignedTransaction(
+        nonce=tx['nonce'],
+        gasprice=tx['gasprice'],
+        startgas=tx['startgas'],
+        to=tx['to'],
+        value=tx['value'],
+        data=decode_hex(tx['data']),
+        v=tx['v'],
+        r=tx['r'],
+        s=tx['s'],
+    )
+
+
+def _fsync_dir(dirpath: Path) -> None:
+    fd = os.open(str(dirpath), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class TransactionsStorage:
     def init(self, network_nonce: int) -> None:
         if not self._is_storage_initialized():
@@ -26,7 +126,7 @@ class TransactionsStorage:
                     self._get_nonce(), network_nonce))
 
     @abstractmethod
-    def get_all_tx(self) -> List[Transaction]:
+    def get_all_tx(self) -> List[SignedTransaction]:
         """
         Returns the list of all transactions.
         """
@@ -43,6 +143,18 @@ class TransactionsStorage:
         """
         pass
 
+    def set_nonces_sign_and_save_txs(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            txs: List[Transaction]) -> None:
+        """
+        Bulk version of `set_nonce_sign_and_save_tx`. Transactions get
+        consecutive nonces in the given order and are persisted together,
+        implementations should make it a single durable write.
+        """
+        for tx in txs:
+            self.set_nonce_sign_and_save_tx(sign_tx, tx)
+
     @abstractmethod
     def remove_tx(self, nonce: int) -> None:
         """
@@ -87,12 +199,17 @@ class JsonTransactionsStorage(TransactionsStorage):
     def __init__(self, filepath: Path) -> None:
         self._filepath = filepath
         self._data: Dict[str, Any] = {}
+        self._txs: Dict[int, SignedTransaction] = {}
         if self._filepath.exists():
             with open(self._filepath) as f:
                 self._data = json.load(f)
             if 'tx' in self._data:
                 self._data['tx'] = \
                     {int(nonce): tx for nonce, tx in self._data['tx'].items()}
+                self._txs = {
+                    nonce: _tx_from_dict(tx)
+                    for nonce, tx in self._data['tx'].items()
+                }
 
     def _is_storage_initialized(self) -> bool:
         return 'nonce' in self._data
@@ -109,66 +226,389 @@ class JsonTransactionsStorage(TransactionsStorage):
     def _get_nonce(self) -> int:
         return self._data['nonce']
 
-    def get_all_tx(self) -> List[Transaction]:
-        def convert(tx):
-            return Transaction(
-                nonce=tx['nonce'],
-                gasprice=tx['gasprice'],
-                startgas=tx['startgas'],
-                to=tx['to'],
-                value=tx['value'],
-                data=decode_hex(tx['data']),
-                v=tx['v'],
-                r=tx['r'],
-                s=tx['s'],
-            )
-        return [convert(tx) for tx in self._data['tx'].values()]
+    def get_all_tx(self) -> List[SignedTransaction]:
+        return list(self._txs.values())
 
     def set_nonce_sign_and_save_tx(
             self,
             sign_tx: Callable[[Transaction], None],
             tx: Transaction) -> None:
-        tx.nonce = self._data['nonce']
-        sign_tx(tx)
-        logger.info(
-            'Saving transaction %s, nonce=%d',
-            encode_hex(tx.hash),
-            tx.nonce,
-        )
+        self.set_nonces_sign_and_save_txs(sign_tx, [tx])
+
+    def set_nonces_sign_and_save_txs(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            txs: List[Transaction]) -> None:
         # Use temporary copy because we don't want to modify the state if
         # writing to the file fails
         new_data = dict(self._data)
-        new_data['nonce'] = tx.nonce + 1
-        new_data['tx'][tx.nonce] = {
-            'nonce': tx.nonce,
-            'gasprice': tx.gasprice,
-            'startgas': tx.startgas,
-            'to': HexBytes(tx.to).hex(),
-            'value': tx.value,
-            'data': HexBytes(tx.data).hex(),
-            'v': tx.v,
-            'r': tx.r,
-            's': tx.s,
-        }
+        new_data['tx'] = dict(self._data['tx'])
+        signed_txs = []
+        for tx in txs:
+            tx.nonce = new_data['nonce']
+            sign_tx(tx)
+            signed_tx = SignedTransaction.from_tx(tx)
+            logger.info(
+                'Saving transaction %s, nonce=%d',
+                encode_hex(signed_tx.hash),
+                tx.nonce,
+            )
+            new_data['nonce'] = tx.nonce + 1
+            new_data['tx'][tx.nonce] = _tx_to_dict(signed_tx)
+            signed_txs.append(signed_tx)
         self._save(new_data)
         self._data = new_data
+        for signed_tx in signed_txs:
+            self._txs[signed_tx.nonce] = signed_tx
 
     def remove_tx(self, nonce: int) -> None:
         logger.info('Removing transaction nonce=%d', nonce)
         new_data = dict(self._data)
+        new_data['tx'] = dict(self._data['tx'])
         del new_data['tx'][nonce]
         self._save(new_data)
         self._data = new_data
+        del self._txs[nonce]
 
     def revert_last_tx(self) -> None:
         new_data = dict(self._data)
+        new_data['tx'] = dict(self._data['tx'])
         new_data['nonce'] -= 1
         del new_data['tx'][new_data['nonce']]
         self._save(new_data)
         self._data = new_data
+        del self._txs[new_data['nonce']]
 
     def _save(self, data: Dict) -> None:
         with open(self._filepath, 'w') as f:
             json.dump(data, f)
             f.flush()
             os.fsync(f.fileno())
+
+
+class JournalTransactionsStorage(TransactionsStorage):
+    """
+    Keeps the state in memory and persists every change by appending a single
+    record to a journal file, so each operation costs O(1) regardless of the
+    number of pending transactions. After `COMPACTION_THRESHOLD` records the
+    journal is replaced with a snapshot of the current state.
+    Journal is a file with one JSON record per line. A torn last record, left
+    by a crash in the middle of appending, is discarded on load.
+    """
+
+    COMPACTION_THRESHOLD = 1000
+
+    def __init__(
+            self,
+            filepath: Path,
+            compaction_threshold: int = COMPACTION_THRESHOLD) -> None:
+        self._filepath = filepath
+        self._compaction_threshold = compaction_threshold
+        self._nonce: Optional[int] = None
+        self._txs: Dict[int, SignedTransaction] = {}
+        self._records = 0
+        if self._filepath.exists():
+            self._load()
+        self._file = open(self._filepath, 'a')
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _load(self) -> None:
+        valid_size = 0
+        with open(self._filepath, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('Incomplete record')
+                    record = json.loads(line.decode())
+                except ValueError:
+                    logger.warning(
+                        'Discarding corrupted journal record at offset %d',
+                        valid_size,
+                    )
+                    break
+                self._apply(record)
+                valid_size += len(line)
+                self._records += 1
+        with open(self._filepath, 'r+b') as f:
+            if f.seek(0, os.SEEK_END) != valid_size:
+                f.truncate(valid_size)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record['op']
+        if op == 'snapshot':
+            self._nonce = record['nonce']
+            self._txs = {
+                tx['nonce']: _tx_from_dict(tx) for tx in record['tx']
+            }
+        elif op == 'add':
+            tx = record['tx']
+            self._txs[tx['nonce']] = _tx_from_dict(tx)
+            self._nonce = tx['nonce'] + 1
+        elif op == 'add_many':
+            for tx in record['tx']:
+                self._txs[tx['nonce']] = _tx_from_dict(tx)
+            self._nonce = record['tx'][-1]['nonce'] + 1
+        elif op == 'remove':
+            self._txs.pop(record['nonce'], None)
+        elif op == 'revert':
+            self._nonce -= 1
+            self._txs.pop(self._nonce, None)
+        else:
+            raise ValueError('Unknown journal record {}'.format(op))
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._apply(record)
+        self._records += 1
+        if self._records >= self._compaction_threshold:
+            self._compact()
+
+    def _compact(self) -> None:
+        logger.debug('Compacting transactions journal %s', self._filepath)
+        tmp_filepath = self._filepath.with_suffix(
+            self._filepath.suffix + '.tmp')
+        with open(tmp_filepath, 'w') as f:
+            f.write(json.dumps({
+                'op': 'snapshot',
+                'nonce': self._nonce,
+                'tx': [_tx_to_dict(tx) for tx in self._txs.values()],
+            }) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(str(tmp_filepath), str(self._filepath))
+        _fsync_dir(self._filepath.parent)
+        self._file = open(self._filepath, 'a')
+        self._records = 1
+
+    def _is_storage_initialized(self) -> bool:
+        return self._nonce is not None
+
+    def _init_with_nonce(self, nonce: int) -> None:
+        logger.info(
+            'Initiating JournalTransactionStorage with nonce=%d',
+            nonce,
+        )
+        self._nonce = nonce
+        self._txs = {}
+        self._compact()
+
+    def _get_nonce(self) -> int:
+        return self._nonce
+
+    def get_all_tx(self) -> List[SignedTransaction]:
+        return list(self._txs.values())
+
+    def set_nonce_sign_and_save_tx(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            tx: Transaction) -> None:
+        tx.nonce = self._nonce
+        sign_tx(tx)
+        signed_tx = SignedTransaction.from_tx(tx)
+        logger.info(
+            'Saving transaction %s, nonce=%d',
+            encode_hex(signed_tx.hash),
+            tx.nonce,
+        )
+        self._append({'op': 'add', 'tx': _tx_to_dict(signed_tx)})
+
+    def set_nonces_sign_and_save_txs(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            txs: List[Transaction]) -> None:
+        if not txs:
+            return
+        records = []
+        for nonce, tx in enumerate(txs, start=self._nonce):
+            tx.nonce = nonce
+            sign_tx(tx)
+            signed_tx = SignedTransaction.from_tx(tx)
+            logger.info(
+                'Saving transaction %s, nonce=%d',
+                encode_hex(signed_tx.hash),
+                tx.nonce,
+            )
+            records.append(_tx_to_dict(signed_tx))
+        # Single line so the whole group is either recovered or discarded
+        self._append({'op': 'add_many', 'tx': records})
+
+    def remove_tx(self, nonce: int) -> None:
+        logger.info('Removing transaction nonce=%d', nonce)
+        if nonce not in self._txs:
+            raise KeyError(nonce)
+        self._append({'op': 'remove', 'nonce': nonce})
+
+    def revert_last_tx(self) -> None:
+        self._append({'op': 'revert'})
+
+
+class SqliteTransactionsStorage(TransactionsStorage):
+    """
+    Stores transactions in an SQLite database in WAL mode. Confirmed
+    transactions are not deleted, only marked as such, so the database also
+    serves as a history of everything that was sent. Transactions can be
+    looked up by hash.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(filepath),
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        with self._transaction():
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                ' key TEXT PRIMARY KEY,'
+                ' value INTEGER NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS transactions ('
+                ' nonce INTEGER PRIMARY KEY,'
+                ' hash TEXT NOT NULL,'
+                ' raw BLOB NOT NULL,'
+                ' created_at INTEGER NOT NULL,'
+                ' confirmed_at INTEGER)'
+            )
+            self._conn.execute(
+                'CREATE UNIQUE INDEX IF NOT EXISTS transactions_hash'
+                ' ON transactions (hash)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS transactions_pending'
+                ' ON transactions (nonce) WHERE confirmed_at IS NULL'
+            )
+        # Pending transactions are also kept in memory
+        rows = self._conn.execute(
+            'SELECT raw FROM transactions WHERE confirmed_at IS NULL'
+            ' ORDER BY nonce'
+        ).fetchall()
+        self._txs: Dict[int, SignedTransaction] = {}
+        for row in rows:
+            tx = SignedTransaction.from_raw(row[0])
+            self._txs[tx.nonce] = tx
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _is_storage_initialized(self) -> bool:
+        return self._get_nonce() is not None
+
+    def _init_with_nonce(self, nonce: int) -> None:
+        logger.info(
+            'Initiating SqliteTransactionStorage with nonce=%d',
+            nonce,
+        )
+        with self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('nonce', ?)",
+                (nonce,),
+            )
+
+    def _get_nonce(self) -> Optional[int]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'nonce'").fetchone()
+        return row[0] if row else None
+
+    def get_all_tx(self) -> List[SignedTransaction]:
+        return list(self._txs.values())
+
+    def get_tx_by_hash(self, tx_hash: str) -> Optional[Transaction]:
+        """
+        Returns the transaction with the given hash, including the already
+        confirmed ones, or None if it's not known.
+        """
+        row = self._conn.execute(
+            'SELECT raw FROM transactions WHERE hash = ?',
+            (tx_hash.lower(),),
+        ).fetchone()
+        return SignedTransaction.from_raw(row[0]) if row else None
+
+    def set_nonce_sign_and_save_tx(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            tx: Transaction) -> None:
+        self.set_nonces_sign_and_save_txs(sign_tx, [tx])
+
+    def set_nonces_sign_and_save_txs(
+            self,
+            sign_tx: Callable[[Transaction], None],
+            txs: List[Transaction]) -> None:
+        if not txs:
+            return
+        signed_txs = []
+        with self._transaction():
+            now = int(time.time())
+            for nonce, tx in enumerate(txs, start=self._get_nonce()):
+                tx.nonce = nonce
+                sign_tx(tx)
+                signed_tx = SignedTransaction.from_tx(tx)
+                logger.info(
+                    'Saving transaction %s, nonce=%d',
+                    encode_hex(signed_tx.hash),
+                    tx.nonce,
+                )
+                # Replaces the row possibly left by a reverted transaction
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO transactions'
+                    ' (nonce, hash, raw, created_at) VALUES (?, ?, ?, ?)',
+                    (
+                        tx.nonce,
+                        encode_hex(signed_tx.hash),
+                        signed_tx.raw,
+                        now,
+                    ),
+                )
+                signed_txs.append(signed_tx)
+            self._conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'nonce'",
+                (txs[-1].nonce + 1,),
+            )
+        for signed_tx in signed_txs:
+            self._txs[signed_tx.nonce] = signed_tx
+
+    def remove_tx(self, nonce: int) -> None:
+        logger.info('Removing transaction nonce=%d', nonce)
+        with self._transaction():
+            cursor = self._conn.execute(
+                'UPDATE transactions SET confirmed_at = ?'
+                ' WHERE nonce = ? AND confirmed_at IS NULL',
+                (int(time.time()), nonce),
+            )
+            if cursor.rowcount != 1:
+                raise KeyError(nonce)
+        del self._txs[nonce]
+
+    def revert_last_tx(self) -> None:
+        with self._transaction():
+            nonce = self._get_nonce() - 1
+            self._conn.execute(
+                'DELETE FROM transactions WHERE nonce = ?',
+                (nonce,),
+            )
+            self._conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'nonce'",
+                (nonce,),
+            )
+        del self._txs[nonce]
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from eth_utils import to_checksum_address
+
+from golem_sci import exceptions
+from golem_sci.asyncclient import AsyncClient
+
+ADDRESS = to_checksum_address('0x' + 40 * 'a')
+
+
+class AsyncClientTest(TestCase):
+    def setUp(self):
+        self.tempdir = Path(tempfile.mkdtemp())
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.requests = []
+        self.results = {}
+        self.ipc_path = str(self.tempdir / 'geth.ipc')
+        self.server = self.loop.run_until_complete(
+            asyncio.start_unix_server(self._handle, path=self.ipc_path))
+        self.client = AsyncClient(self.ipc_path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+        shutil.rmtree(self.tempdir)
+
+    def _response(self, request):
+        self.requests.append(request)
+        result = self.results[request['method']]
+        if isinstance(result, dict) and 'code' in result:
+            return {'jsonrpc': '2.0', 'id': request['id'], 'error': result}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+    async def _handle(self, reader, writer):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            payload = json.loads(data.decode())
+            if isinstance(payload, list):
+                # Responses in a batch may come in any order
+                response = [self._response(r) for r in reversed(payload)]
+            else:
+                response = self._response(payload)
+            writer.write(json.dumps(response).encode())
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_request(self):
+        self.results['eth_blockNumber'] = '0x10'
+        assert self._run(self.client.get_block_number()) == 16
+        self.results['eth_getBalance'] = '0x5'
+        assert self._run(self.client.get_balance(ADDRESS, 7)) == 5
+        assert self.requests[-1]['params'] == [ADDRESS, '0x7']
+
+    def test_error_mapped(self):
+        self.results['eth_sendRawTransaction'] = {
+            'code': -32000,
+            'message': 'nonce too low',
+        }
+        with self.assertRaises(exceptions.NonceTooLow):
+            self._run(self.client.send_raw(b'\x01'))
+
+    def test_batch_request(self):
+        self.results['eth_getTransactionReceipt'] = None
+        self.results['eth_getBalance'] = {
+            'code': -32000,
+            'message': 'missing trie node',
+        }
+        results = self._run(self.client.batch_request([
+            ('eth_getTransactionReceipt', ['0x' + 64 * '1']),
+            ('eth_getBalance', [ADDRESS, 1]),
+        ]))
+        assert results[0] is None
+        assert isinstance(results[1], exceptions.MissingTrieNode)
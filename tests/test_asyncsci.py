@@ -0,0 +1,301 @@
+import asyncio
+import os
+import threading
+from unittest import mock, TestCase
+
+from eth_utils import encode_hex, to_checksum_address
+from ethereum.transactions import Transaction
+from hexbytes import HexBytes
+import rlp
+
+from golem_sci import calldata, contracts, exceptions
+from golem_sci.asyncclient import AsyncClient
+from golem_sci.asyncsci import AsyncSCI
+from golem_sci.structs import Payment
+from golem_sci.transactionsstorage import SignedTransaction
+
+ADDRESS = to_checksum_address('0xadd355' + '0' * 34)
+GNTB_ADDRESS = to_checksum_address('0x' + 40 * '1')
+DEPOSIT_ADDRESS = to_checksum_address('0x' + 40 * '2')
+BATCH_TRANSFER_TOPIC = \
+    '0x24310ec9df46c171fe9c6d6fe25cac6781e7fa8f153f8f72ce63037a4b38c4b6'
+
+
+def _receipt(tx_hash, block_number):
+    return {
+        'transactionHash': HexBytes(tx_hash),
+        'status': 1,
+        'gasUsed': 21000,
+        'blockNumber': block_number,
+        'blockHash': HexBytes('0xbbbb'),
+    }
+
+
+class AsyncSCITest(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.node = mock.Mock()
+        self.node.get_transaction_count.return_value = 0
+        self.node.get_block_number.return_value = 10
+        self.node.get_gas_price.return_value = 10 ** 9
+        self.node.get_balance.return_value = 10 ** 20
+        self.node.get_raw_logs.return_value = []
+        self.node.get_block.return_value = \
+            {'number': 10, 'timestamp': 0, 'gasLimit': 8000000}
+        self.node.get_transaction_receipts.side_effect = \
+            lambda hashes: [None] * len(hashes)
+        self.node.get_transactions.side_effect = \
+            lambda hashes: [{}] * len(hashes)
+        self.node.send_raw.side_effect = \
+            lambda raw: encode_hex(rlp.decode(raw, Transaction).hash)
+
+        client = AsyncClient('/nonexistent.ipc')
+        for name in (
+                'get_transaction_count',
+                'get_block_number',
+                'get_gas_price',
+                'get_balance',
+                'get_block',
+                'call',
+                'batch_request',
+                'get_raw_logs',
+                'get_transaction_receipts',
+                'get_transactions',
+                'send_raw'):
+            setattr(client, name, self._coroutine(getattr(self.node, name)))
+
+        self.storage = mock.Mock()
+        self.storage.get_all_tx.return_value = []
+
+        def save_tx(sign, tx):
+            # Storage writes to disk, it mustn't block the loop
+            assert threading.current_thread() is not \
+                threading.main_thread()
+            sign(tx)
+            self.storage.get_all_tx.return_value.append(
+                SignedTransaction.from_tx(tx))
+        self.storage.set_nonce_sign_and_save_tx.side_effect = save_tx
+        self.storage.set_nonces_sign_and_save_txs.side_effect = \
+            lambda sign, txs: [save_tx(sign, tx) for tx in txs]
+
+        self.sci = AsyncSCI(
+            client,
+            ADDRESS,
+            self.storage,
+            {
+                contracts.GNTB: GNTB_ADDRESS,
+                contracts.GNTDeposit: DEPOSIT_ADDRESS,
+            },
+            lambda tx: tx.sign(os.urandom(32)),
+        )
+        self._run(self.sci.start(monitor=False))
+
+    def tearDown(self):
+        self.loop.close()
+
+    @staticmethod
+    def _coroutine(fn):
+        async def wrapper(*args, **kwargs):
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_batch_transfer_and_wait_for_receipt(self):
+        tx_hash = self._run(self.sci.batch_transfer(
+            [Payment(to_checksum_address('0x' + 40 * 'f'), 10)],
+            123,
+        ))
+        self.node.send_raw.assert_called_once()
+        tx = rlp.decode(self.node.send_raw.call_args[0][0], Transaction)
+        assert tx.to == HexBytes(GNTB_ADDRESS)
+        assert tx.startgas == 27000 + 28000
+
+        waiting = asyncio.ensure_future(
+            self.sci.wait_for_receipt(tx_hash), loop=self.loop)
+        self.node.get_transaction_receipts.side_effect = \
+            lambda hashes: [_receipt(h, 20) for h in hashes]
+        self.node.get_block_number.return_value = 30
+        self._run(self.sci._monitor_single())
+
+        receipt = self._run(waiting)
+        assert receipt.tx_hash == tx_hash
+        self.storage.remove_tx.assert_called_once_with(tx.nonce)
+
+    def test_subscription_stream(self):
+        receiver = to_checksum_address('0x' + 40 * 'f')
+        stream = self.sci.subscribe_to_batch_transfers(None, receiver, 1)
+        self.node.get_raw_logs.return_value = [{
+            'transactionHash': HexBytes('0x' + 64 * '0'),
+            'blockNumber': 5,
+            'topics': [
+                HexBytes(BATCH_TRANSFER_TOPIC),
+                HexBytes('0x' + 64 * '0'),
+                HexBytes('0x' + 24 * '0' + receiver[2:]),
+            ],
+            'data': '0x' + 63 * '0' + '7' + 64 * '0',
+        }]
+        self.node.get_block_number.return_value = 30
+        self._run(self.sci._monitor_single())
+
+        event = self._run(stream.__anext__())
+        assert event.receiver == receiver
+        assert event.amount == 7
+
+        stream.close()
+        self.node.get_raw_logs.reset_mock()
+        self.node.get_block_number.return_value = 40
+        self._run(self.sci._monitor_single())
+        self.node.get_raw_logs.assert_not_called()
+
+    def test_batch_transfer_many(self):
+        payments = [
+            Payment(to_checksum_address('0x' + 40 * 'f'), 10),
+        ] * 300
+        tx_hashes = self._run(self.sci.batch_transfer_many(payments, 123))
+        # 227 payments fit in 80% of the block gas limit
+        assert len(tx_hashes) == 2
+        # Both persisted together with consecutive nonces
+        self.storage.set_nonces_sign_and_save_txs.assert_called_once()
+        txs = [
+            rlp.decode(call[0][0], Transaction)
+            for call in self.node.send_raw.call_args_list
+        ]
+        assert [tx.startgas for tx in txs] == \
+            [27000 + 227 * 28000, 27000 + 73 * 28000]
+        assert [encode_hex(tx.hash) for tx in txs] == tx_hashes
+
+    def test_on_transaction_confirmed(self):
+        tx_hash = '0x' + 64 * 'A'
+        cb = mock.Mock()
+        self.sci.on_transaction_confirmed(tx_hash, cb)
+        self.node.get_transaction_receipts.side_effect = \
+            lambda hashes: [_receipt(h, 20) for h in hashes]
+        self.node.get_block_number.return_value = 30
+        self._run(self.sci._monitor_single())
+        # Callbacks of the done future are scheduled on the loop
+        self._run(asyncio.sleep(0))
+        cb.assert_called_once()
+        assert cb.call_args[0][0].tx_hash == tx_hash.lower()
+
+    def test_calls(self):
+        self.node.call.return_value = HexBytes((7).to_bytes(32, 'big'))
+        assert self._run(self.sci.get_gntb_balance(ADDRESS)) == 7
+        tx, block = self.node.call.call_args[0]
+        assert tx['to'] == GNTB_ADDRESS
+        assert tx['data'] == encode_hex(
+            calldata.encode(contracts.GNTB, 'balanceOf', [ADDRESS]))
+        assert block == self.sci.get_latest_confirmed_block_number()
+
+        self.node.call.return_value = HexBytes(32 * b'\0')
+        assert self._run(self.sci.get_gate_address()) is None
+
+        self.node.batch_request.side_effect = lambda calls, batch_size: [
+            HexBytes(i.to_bytes(32, 'big')) for i in range(len(calls))
+        ]
+        assert self._run(self.sci.get_deposit_values(
+            [ADDRESS] * 3,
+            batch_size=2,
+        )) == [0, 1, 2]
+        calls = self.node.batch_request.call_args[0][0]
+        assert [method for method, _ in calls] == ['eth_call'] * 3
+        assert calls[0][1][0]['to'] == DEPOSIT_ADDRESS
+        assert self.node.batch_request.call_args[1] == {'batch_size': 2}
+
+        self.node.batch_request.side_effect = \
+            lambda calls, batch_size: [
+                1,
+                exceptions.MissingTrieNode(code=-32000, message=''),
+            ]
+        with self.assertRaises(exceptions.MissingTrieNode):
+            self._run(self.sci.get_eth_balances([ADDRESS, ADDRESS]))
+
+    def test_iter_events_split(self):
+        def get_logs(address, topics, from_block, to_block):
+            if to_block - from_block >= 10:
+                raise exceptions.TooManyResults(code=-32005, message='')
+            return [{
+                'transactionHash': HexBytes('0x' + 64 * '0'),
+                'blockNumber': from_block,
+                'topics': [
+                    HexBytes(BATCH_TRANSFER_TOPIC),
+                    HexBytes('0x' + 64 * '0'),
+                    HexBytes('0x' + 64 * '0'),
+                ],
+                'data': '0x{:064x}'.format(from_block) + 64 * '0',
+            }]
+        self.node.get_raw_logs.side_effect = get_logs
+        self.sci.LOGS_CHUNK_SIZE = 32
+
+        events = self._run(self.sci.get_batch_transfers(None, None, 0, 39))
+        # Halved twice to 8 blocks
+        assert [e.amount for e in events] == list(range(0, 40, 8))
+
+    def test_stream_ends_on_stop(self):
+        stream = self.sci.subscribe_to_batch_transfers(None, None, 1)
+        stream.put('event')
+
+        async def consume():
+            return [event async for event in stream]
+        consuming = asyncio.ensure_future(consume(), loop=self.loop)
+        self._run(self.sci.stop())
+        assert self._run(consuming) == ['event']
+        # Stays ended
+        assert self._run(consume()) == []
+
+    def test_send_transactions(self):
+        txs = [
+            Transaction(
+                nonce=0,
+                gasprice=10 ** 9,
+                startgas=21000,
+                to=b'\x11' * 20,
+                value=1,
+                data=b'',
+            )
+            for _ in range(3)
+        ]
+        self.node.send_raw.side_effect = [
+            '0xaa',
+            exceptions.GethError(code=-32000, message='intrinsic gas'),
+        ]
+        with self.assertRaises(exceptions.GethError):
+            self._run(self.sci.send_transactions(txs))
+        self.storage.set_nonces_sign_and_save_txs.assert_called_once()
+        assert self.node.send_raw.call_count == 2
+        # The rejected one and the one after it
+        assert self.storage.revert_last_tx.call_count == 2
+        assert self.sci._eth_reserved == 21000 * 10 ** 9 + 1
+
+    def test_stop_cancels_waiting_for_receipts(self):
+        waiting = asyncio.ensure_future(
+            self.sci.wait_for_receipt('0x' + 64 * 'a'), loop=self.loop)
+        cb = mock.Mock()
+        self.sci.on_transaction_confirmed('0x' + 64 * 'b', cb)
+        self._run(asyncio.sleep(0))
+        self._run(self.sci.stop())
+        with self.assertRaises(asyncio.CancelledError):
+            self._run(waiting)
+        cb.assert_not_called()
+
+    def test_remove_tx_error(self):
+        for _ in range(2):
+            self._run(self.sci.batch_transfer(
+                [Payment(to_checksum_address('0x' + 40 * 'f'), 10)],
+                123,
+            ))
+        confirmed = encode_hex(self.storage.get_all_tx()[0].hash)
+        self.node.get_transaction_receipts.side_effect = lambda hashes: [
+            _receipt(h, 20) if h == confirmed else None for h in hashes
+        ]
+        self.node.get_transactions.side_effect = \
+            lambda hashes: [None] * len(hashes)
+        self.storage.remove_tx.side_effect = Exception('already reverted')
+        self.node.send_raw.reset_mock()
+        self.node.get_block_number.return_value = 30
+        self._run(self.sci._monitor_single())
+        # The unconfirmed one is still rebroadcast
+        self.node.send_raw.assert_called_once_with(
+            self.storage.get_all_tx()[1].raw)
@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+
+from golem_sci import exceptions
+from golem_sci.backfill import is_range_too_large, LogBackfill
+
+
+def _too_many_results() -> exceptions.GethError:
+    return exceptions.map_geth_error(ValueError({
+        'code': -32005,
+        'message': 'query returned more than 10000 results',
+    }))
+
+
+class LogBackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        # Block numbers which have a log
+        self.logs = set()
+        self.max_range = None
+        self.backfill = LogBackfill()
+
+    def tearDown(self):
+        self.backfill.stop()
+
+    def _get_logs(self, from_block, to_block):
+        with self.lock:
+            self.calls.append((from_block, to_block))
+        if self.max_range and to_block - from_block + 1 > self.max_range:
+            raise _too_many_results()
+        # Later chunks are quicker so they complete out of order
+        time.sleep(0.001 * (100 - from_block % 100) / 100)
+        return [b for b in range(from_block, to_block + 1) if b in self.logs]
+
+    def _collect(self, from_block, to_block):
+        return list(self.backfill.iter_logs(
+            self._get_logs,
+            from_block,
+            to_block,
+        ))
+
+    def test_is_range_too_large(self):
+        assert is_range_too_large(_too_many_results())
+        assert is_range_too_large(exceptions.GethError(
+            code=-32000,
+            message='Query timeout exceeded',
+        ))
+        assert not is_range_too_large(exceptions.GethError(
+            code=-32000,
+            message='missing trie node',
+        ))
+        assert not is_range_too_large(Exception())
+
+    def test_single_chunk_inline(self):
+        self.backfill = LogBackfill(initial_chunk_size=100)
+        threads = []
+        chunks = list(self.backfill.iter_logs(
+            lambda f, t: threads.append(threading.current_thread()) or [],
+            1,
+            100,
+        ))
+        assert chunks == [(1, 100, [])]
+        assert threads == [threading.current_thread()]
+
+    def test_block_order(self):
+        self.backfill = LogBackfill(
+            workers=3,
+            initial_chunk_size=10,
+            small_response=0,
+        )
+        self.logs = {1, 15, 16, 99, 200}
+        chunks = self._collect(1, 100)
+        assert [(f, t) for f, t, _ in chunks] == \
+            [(i, i + 9) for i in range(1, 100, 10)]
+        assert [log for _, _, logs in chunks for log in logs] == \
+            [1, 15, 16, 99]
+
+    def test_shrink_and_grow(self):
+        self.backfill = LogBackfill(
+            workers=2,
+            initial_chunk_size=64,
+            max_chunk_size=64,
+            small_response=2,
+        )
+        self.logs = set(range(1, 1000, 5))
+        self.max_range = 16
+        chunks = self._collect(1, 256)
+        assert [log for _, _, logs in chunks for log in logs] == \
+            list(range(1, 257, 5))
+        starts = [f for f, _, _ in chunks]
+        assert starts == sorted(starts)
+        assert all(t - f + 1 <= 16 for f, t, _ in chunks)
+        assert self.backfill.chunk_size <= 16
+
+        # Sparse range makes the chunks grow back
+        self.logs = set()
+        self.max_range = None
+        self._collect(257, 1000)
+        assert self.backfill.chunk_size == 64
+
+    def test_other_error(self):
+        self.backfill = LogBackfill(initial_chunk_size=10)
+
+        def get_logs(from_block, to_block):
+            if from_block > 30:
+                raise ValueError('boom')
+            return []
+        chunks = self.backfill.iter_logs(get_logs, 1, 100)
+        for _ in range(3):
+            next(chunks)
+        with self.assertRaises(ValueError):
+            next(chunks)
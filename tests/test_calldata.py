@@ -0,0 +1,81 @@
+import json
+import unittest
+
+from eth_utils import decode_hex, to_checksum_address
+from web3 import Web3
+
+from golem_sci import calldata, contracts
+
+ADDRESS1 = to_checksum_address('0x' + 40 * 'a')
+ADDRESS2 = to_checksum_address('0x' + 40 * 'b')
+
+
+class CalldataTest(unittest.TestCase):
+    def setUp(self):
+        self.web3 = Web3([])
+
+    def _assert_same_as_web3(self, contract, fn_name, args):
+        web3_contract = self.web3.eth.contract(
+            address=ADDRESS1,
+            abi=json.loads(contracts.get_abi(contract)),
+        )
+        assert calldata.encode(contract, fn_name, args) == \
+            decode_hex(web3_contract.encodeABI(fn_name, args))
+
+    def test_selector(self):
+        assert calldata.get_selector(contracts.GNT, 'transfer') == \
+            decode_hex('0xa9059cbb')
+
+    def test_token_methods(self):
+        self._assert_same_as_web3(
+            contracts.GNTB,
+            'batchTransfer',
+            [[b'\x01' * 32, b'\x02' * 32], 1234],
+        )
+        self._assert_same_as_web3(contracts.GNT, 'transfer', [ADDRESS2, 10])
+        self._assert_same_as_web3(
+            contracts.GNTB,
+            'transferAndCall',
+            [ADDRESS2, 10, b'\x01\x02'],
+        )
+        self._assert_same_as_web3(contracts.GNTB, 'withdrawTo', [5, ADDRESS2])
+        self._assert_same_as_web3(contracts.GNTB, 'openGate', [])
+
+    def test_deposit_methods(self):
+        self._assert_same_as_web3(
+            contracts.GNTDeposit,
+            'reimburseForSubtask',
+            [ADDRESS1, ADDRESS2, 10, b'\x01' * 32, 27, b'\x02' * 32,
+             b'\x03' * 32, 3],
+        )
+        self._assert_same_as_web3(
+            contracts.GNTDeposit,
+            'reimburseForNoPayment',
+            [ADDRESS1, ADDRESS2, [1, 2], [b'\x01' * 32, b'\x02' * 32],
+             [27, 28], [b'\x03' * 32] * 2, [b'\x04' * 32] * 2, 3, 4],
+        )
+        self._assert_same_as_web3(
+            contracts.GNTDeposit,
+            'reimburseForVerificationCosts',
+            [ADDRESS1, 10, b'\x01' * 32, 27, b'\x02' * 32, b'\x03' * 32, 3],
+        )
+        self._assert_same_as_web3(contracts.GNTDeposit, 'withdraw', [ADDRESS1])
+
+    def test_batch_transfer(self):
+        payments = [b'\x01' * 32, b'\x02' * 32]
+        assert calldata.encode_batch_transfer(b''.join(payments), 1234) == \
+            calldata.encode(contracts.GNTB, 'batchTransfer', [payments, 1234])
+        with self.assertRaises(ValueError):
+            calldata.encode_batch_transfer(b'\x01', 1234)
+
+    def test_decode_output(self):
+        assert calldata.decode_output(
+            contracts.GNTDeposit,
+            'getTimelock',
+            (1234).to_bytes(32, 'big'),
+        ) == 1234
+        assert calldata.decode_output(
+            contracts.GNTB,
+            'getGateAddress',
+            12 * b'\0' + decode_hex(ADDRESS1),
+        ) == ADDRESS1
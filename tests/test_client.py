@@ -1,5 +1,13 @@
+import json
+import threading
+import time
 from unittest import TestCase, mock
 
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+from web3 import Web3, HTTPProvider
+
+from golem_sci import exceptions
 from golem_sci.client import Client, get_timestamp_utc
 
 
@@ -47,3 +55,309 @@ class EthereumClientTest(TestCase):
             self.web3.net.peerCount = c[0]
             self.web3.eth.syncing = c[1]
             assert self.client.is_synchronized() == (c[0] and not c[1])
+
+    def test_send_timeout(self):
+        self.addCleanup(self.client.stop)
+        self.client._timeouts['send_raw'] = 0.05
+        self.web3.eth.sendRawTransaction.side_effect = \
+            lambda *_: time.sleep(1)
+        with self.assertRaises(exceptions.RequestTimeout):
+            self.client.send_raw(b'\x01')
+
+
+ADDRESS = to_checksum_address('0x' + 40 * 'a')
+
+
+class BatchRequestTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.web3 = Web3(HTTPProvider('http://localhost:8545'))
+        self.client = Client(self.web3)
+        patcher = mock.patch('golem_sci.batch.make_post_request')
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _respond(self, results):
+        def post(_uri, data, **_kwargs):
+            requests = json.loads(data.decode())
+            # Responses in a batch may come in any order
+            return json.dumps(list(reversed([
+                dict(result, jsonrpc='2.0', id=request['id'])
+                for request, result in zip(requests, results)
+            ]))).encode()
+        self.post.side_effect = post
+
+    def test_single_round_trip(self):
+        self._respond([{'result': hex(i)} for i in range(3)])
+        balances = self.client.get_balances([ADDRESS] * 3, block=5)
+        assert balances == [0, 1, 2]
+        self.post.assert_called_once()
+        requests = json.loads(self.post.call_args[0][1].decode())
+        assert [r['method'] for r in requests] == ['eth_getBalance'] * 3
+        assert requests[0]['params'] == [ADDRESS, '0x5']
+
+    def test_errors_mapped_per_item(self):
+        self._respond([
+            {'result': None},
+            {'error': {'code': -32000, 'message': 'missing trie node abc'}},
+            {'error': {'code': -32000, 'message': 'something else'}},
+        ])
+        results = self.client.batch_request([
+            ('eth_getTransactionByHash', ['0x' + 64 * '1']),
+            ('eth_getBalance', [ADDRESS, 1]),
+            ('eth_getBalance', [ADDRESS, 1]),
+        ])
+        assert results[0] is None
+        assert isinstance(results[1], exceptions.MissingTrieNode)
+        assert type(results[2]) is exceptions.GethError
+
+    def test_split_into_chunks(self):
+        self.client.MAX_BATCH_SIZE = 2
+        self._respond([{'result': '0x1'}] * 2)
+        results = self.client.get_balances([ADDRESS] * 3)
+        assert results == [1, 1, 1]
+        assert self.post.call_count == 2
+
+        self.post.reset_mock()
+        results = self.client.get_balances([ADDRESS] * 3, batch_size=1)
+        assert self.post.call_count == 3
+
+    def test_empty(self):
+        assert self.client.get_transaction_receipts([]) == []
+        self.post.assert_not_called()
+
+    def test_cached(self):
+        self.client.set_confirmed_block(5)
+        self._respond([{'result': hex(i)} for i in range(2)])
+        accounts = [ADDRESS, to_checksum_address('0x' + 40 * 'b')]
+        assert self.client.get_balances(accounts, block=5) == [0, 1]
+        assert self.client.get_balance(ADDRESS.lower(), 5) == 0
+
+        self._respond([{'result': '0x7'}])
+        accounts.append(to_checksum_address('0x' + 40 * 'c'))
+        assert self.client.get_balances(accounts, block=5) == [0, 1, 7]
+        requests = json.loads(self.post.call_args[0][1].decode())
+        assert [r['params'][0] for r in requests] == [accounts[2]]
+
+        # Not confirmed yet
+        self._respond([{'result': '0x1'}] * 3)
+        assert self.client.get_balances(accounts, block=6) == [1, 1, 1]
+        assert self.post.call_count == 3
+
+
+class ClientCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.web3 = mock.Mock()
+        self.client = Client(self.web3)
+        self.client.set_confirmed_block(10)
+
+    def test_block(self):
+        block = {'number': 10, 'transactions': []}
+        self.web3.eth.getBlock.return_value = block
+        assert self.client.get_block(10) == block
+        assert self.client.get_block(10) == block
+        self.web3.eth.getBlock.assert_called_once_with(10, False)
+
+        self.client.get_block(10, full_transactions=True)
+        self.client.get_block(11)
+        self.client.get_block(11)
+        self.client.get_block('latest')
+        assert self.web3.eth.getBlock.call_count == 5
+
+        stats = self.client.get_cache_stats()
+        assert (stats.hits, stats.misses, stats.size) == (1, 2, 2)
+
+    def test_receipt(self):
+        tx_hash = '0x' + 64 * 'a'
+        self.web3.eth.getTransactionReceipt.return_value = None
+        assert self.client.get_transaction_receipt(tx_hash) is None
+        self.web3.eth.getTransactionReceipt.return_value = {'blockNumber': 11}
+        self.client.get_transaction_receipt(tx_hash)
+
+        self.client.set_confirmed_block(11)
+        self.client.get_transaction_receipt(tx_hash)
+        self.client.get_transaction_receipt(tx_hash.upper())
+        assert self.web3.eth.getTransactionReceipt.call_count == 3
+
+    def test_evicted(self):
+        self.client = Client(self.web3, cache_size=3)
+        self.client.set_confirmed_block(10)
+        self.web3.eth.getBlock.side_effect = lambda n, full: {
+            'number': n,
+            'transactions': [{'hash': '0x'}] if full else ['0x'],
+        }
+        self.client.get_block(1)
+        self.client.get_block(2, full_transactions=True)
+        self.client.get_block(1)
+        self.client.get_block(3, full_transactions=True)
+        assert self.client.get_cache_stats().size == 3
+        self.client.get_block(2, full_transactions=True)
+        assert self.web3.eth.getBlock.call_count == 4
+
+
+class ClientPoolTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.web3s = [mock.Mock(name='web3_{}'.format(i)) for i in range(3)]
+        for i, web3 in enumerate(self.web3s):
+            web3.providers = ['node {}'.format(i)]
+            web3.net.peerCount = 1
+            web3.eth.syncing = False
+            web3.eth.getBlock.return_value = {'timestamp': get_timestamp_utc()}
+        self.client = Client(self.web3s)
+        self.addCleanup(self.client.stop)
+        self.client._check_endpoints()
+        for endpoint, latency in zip(self.client._endpoints, [3, 1, 2]):
+            endpoint.latency = latency
+
+    def test_fastest(self):
+        self.client.get_balance(ADDRESS)
+        self.web3s[1].eth.getBalance.assert_called_once_with(ADDRESS, None)
+        self.web3s[0].eth.getBalance.assert_not_called()
+        assert self.client.web3 is self.web3s[1]
+
+    def test_synchronized(self):
+        self.web3s[1].net.peerCount = 0
+        assert self.client.is_synchronized()
+        assert self.client.web3 is self.web3s[2]
+
+        for web3 in self.web3s:
+            web3.net.peerCount = 0
+        self.client._last_sync_check = 0
+        assert not self.client.is_synchronized()
+
+    def test_failover(self):
+        type(self.web3s[1].eth).blockNumber = mock.PropertyMock(
+            side_effect=ConnectionError)
+        type(self.web3s[2].eth).blockNumber = mock.PropertyMock(
+            return_value=2)
+        assert self.client.get_block_number() == 2
+        assert not self.client._endpoints[1].healthy
+        assert self.client.web3 is self.web3s[2]
+
+    def test_all_unreachable(self):
+        for web3 in self.web3s:
+            web3.eth.getBalance.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            self.client.get_balance(ADDRESS)
+
+    def test_geth_error_not_failed_over(self):
+        self.web3s[1].eth.getBalance.side_effect = ValueError({
+            'code': -32000,
+            'message': 'missing trie node',
+        })
+        with self.assertRaises(exceptions.MissingTrieNode):
+            self.client.get_balance(ADDRESS)
+        self.web3s[2].eth.getBalance.assert_not_called()
+
+    def test_send_broadcast(self):
+        tx_hash = HexBytes('0x' + 64 * 'a')
+        self.web3s[0].eth.sendRawTransaction.side_effect = ConnectionError
+        self.web3s[1].eth.sendRawTransaction.side_effect = ValueError({
+            'code': -32000,
+            'message': 'known transaction',
+        })
+        self.web3s[2].eth.sendRawTransaction.return_value = tx_hash
+        assert self.client.send_raw(b'\x01') == tx_hash.hex()
+        self.client._executor.shutdown(wait=True)
+        for web3 in self.web3s:
+            web3.eth.sendRawTransaction.assert_called_once()
+        assert not self.client._endpoints[0].healthy
+
+        self.web3s[2].eth.sendRawTransaction.side_effect = ConnectionError
+        with self.assertRaises(exceptions.KnownTransaction):
+            self.client.send_raw(b'\x01')
+
+    def test_send_not_held_up_by_slow_node(self):
+        tx_hash = HexBytes('0x' + 64 * 'a')
+        self.web3s[0].eth.sendRawTransaction.side_effect = ConnectionError
+        self.web3s[1].eth.sendRawTransaction.side_effect = \
+            lambda *_: time.sleep(1)
+        self.web3s[2].eth.sendRawTransaction.return_value = tx_hash
+        start = time.monotonic()
+        assert self.client.send_raw(b'\x01') == tx_hash.hex()
+        assert time.monotonic() - start < 0.5
+
+    def test_background_health_check(self):
+        self.web3s[2].net.peerCount = 0
+        class QuickClient(Client):
+            HEALTH_CHECK_INTERVAL = 0.01
+        client = QuickClient(self.web3s)
+        self.addCleanup(client.stop)
+        client._stopped.wait(0.2)
+        assert not client._endpoints[2].synchronized
+
+    def test_filters_pinned(self):
+        self.client.get_filter_changes('0x1')
+        self.web3s[0].eth.getFilterChanges.assert_called_once_with('0x1')
+
+    def test_call_function(self):
+        fn = mock.Mock()
+        self.client.call_function(fn, {}, 1)
+        assert fn.web3 is self.web3s[1]
+        fn.call.assert_called_once_with({}, block_identifier=1)
+
+    def test_timeout(self):
+        self.client._timeouts['get_raw_logs'] = 0.05
+        self.web3s[1].eth.getLogs.side_effect = lambda *_: time.sleep(1)
+        with self.assertRaises(exceptions.RequestTimeout):
+            self.client.get_raw_logs(ADDRESS, [], 1, 1000)
+        # Too large query, not the node's fault
+        assert self.client._endpoints[1].healthy
+        self.web3s[2].eth.getLogs.assert_not_called()
+
+    def test_no_timeout_inline(self):
+        threads = []
+        self.web3s[1].eth.getBalance.side_effect = \
+            lambda *_: threads.append(threading.current_thread())
+        self.client.get_balance(ADDRESS)
+        assert threads == [threading.current_thread()]
+
+    def test_stopped(self):
+        self.client._timeouts['get_raw_logs'] = 1
+        self.client.stop()
+        self.web3s[1].eth.getLogs.return_value = []
+        assert self.client.get_raw_logs(ADDRESS, [], 1, 1000) == []
+
+    def test_hedging(self):
+        self.client._hedge_percentile = 90
+        for _ in range(self.client.HEDGE_MIN_SAMPLES):
+            self.client.get_balance(ADDRESS)
+        self.web3s[2].eth.getBalance.assert_not_called()
+
+        self.web3s[1].eth.getBalance.side_effect = lambda *_: time.sleep(1)
+        self.web3s[2].eth.getBalance.return_value = 2
+        start = time.monotonic()
+        assert self.client.get_balance(ADDRESS) == 2
+        assert time.monotonic() - start < 0.5
+        # Slow but not failed
+        assert self.client._endpoints[1].healthy
+
+    def test_circuit_breaker(self):
+        self.web3s[1].eth.getBalance.side_effect = ValueError({
+            'code': -32000,
+            'message': 'missing trie node',
+        })
+        for _ in range(self.client.CIRCUIT_BREAKER_THRESHOLD):
+            with self.assertRaises(exceptions.MissingTrieNode):
+                self.client.get_balance(ADDRESS)
+        self.web3s[2].eth.getBalance.return_value = 2
+        assert self.client.get_balance(ADDRESS) == 2
+
+        self.client._endpoints[1].ejected_until = 0
+        with self.assertRaises(exceptions.MissingTrieNode):
+            self.client.get_balance(ADDRESS)
+
+    def test_circuit_breaker_request_errors(self):
+        for message in ('nonce too low', 'execution reverted'):
+            self.web3s[1].eth.getBalance.side_effect = ValueError({
+                'code': -32000,
+                'message': message,
+            })
+            for _ in range(self.client.CIRCUIT_BREAKER_THRESHOLD):
+                with self.assertRaises(exceptions.GethError):
+                    self.client.get_balance(ADDRESS)
+            # Normal answers of a healthy node, it's still used
+            assert not self.client._endpoints[1].is_ejected()
+        self.web3s[2].eth.getBalance.assert_not_called()
@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from golem_sci.cursorstorage import JsonCursorStorage, SqliteCursorStorage
+
+
+class JsonCursorStorageTest(unittest.TestCase):
+    def _create_storage(self):
+        return JsonCursorStorage(self.tempfile)
+
+    def setUp(self):
+        self.tempfile = Path(tempfile.mkdtemp()) / 'cursors'
+        self.storage = self._create_storage()
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.tempfile.parent)
+
+    def test_cursor(self):
+        assert self.storage.get_cursor('sub') is None
+        self.storage.checkpoint('sub', 10)
+        assert self.storage.get_cursor('sub') == 10
+        assert self.storage.get_cursor('other') is None
+        self.storage.checkpoint('sub', 20)
+        assert self.storage.get_cursor('sub') == 20
+
+    def test_delivered(self):
+        assert not self.storage.is_delivered('sub', '0xAB', 1)
+        self.storage.mark_delivered('sub', '0xAB', 1)
+        assert self.storage.is_delivered('sub', '0xab', 1)
+        assert not self.storage.is_delivered('sub', '0xab', 2)
+        assert not self.storage.is_delivered('other', '0xab', 1)
+        # Mark alone doesn't move the cursor
+        assert self.storage.get_cursor('sub') is None
+
+        self.storage.checkpoint('sub', 10)
+        assert not self.storage.is_delivered('sub', '0xab', 1)
+
+    def test_persistence(self):
+        self.storage.checkpoint('sub', 10)
+        self.storage.mark_delivered('sub', '0xab', 1)
+        self.storage.mark_delivered('other', '0xab', 2)
+        self.storage.checkpoint('sub', 20)
+        self.storage.close()
+        self.storage = self._create_storage()
+        assert self.storage.get_cursor('sub') == 20
+        assert not self.storage.is_delivered('sub', '0xab', 1)
+        assert self.storage.is_delivered('other', '0xab', 2)
+
+    def test_incomplete_journal(self):
+        self.storage.mark_delivered('sub', '0xab', 1)
+        self.storage.close()
+        with open(str(self.tempfile) + '.delivered', 'a') as f:
+            f.write('["sub", "0x')
+        self.storage = self._create_storage()
+        assert self.storage.is_delivered('sub', '0xab', 1)
+
+
+class SqliteCursorStorageTest(JsonCursorStorageTest):
+    def _create_storage(self):
+        return SqliteCursorStorage(self.tempfile)
+
+    def test_incomplete_journal(self):
+        pass
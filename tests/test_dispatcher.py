@@ -0,0 +1,96 @@
+import threading
+import unittest
+
+from golem_sci.dispatcher import (
+    CallbackDispatcher,
+    ThreadedCallbackDispatcher,
+)
+
+
+class CallbackDispatcherTest(unittest.TestCase):
+    def test_inline(self):
+        dispatcher = CallbackDispatcher()
+        calls = []
+        dispatcher.dispatch('key', calls.append, 1)
+        assert calls == [1]
+
+    def test_stats_and_slow_callback(self):
+        dispatcher = CallbackDispatcher(slow_callback_threshold=0)
+
+        def callback():
+            pass
+
+        with self.assertLogs('golem_sci.dispatcher', 'WARNING') as logs:
+            dispatcher.dispatch('key', callback)
+            dispatcher.dispatch('key', callback)
+        assert 'Slow callback' in logs.output[0]
+        stats = dispatcher.get_stats()
+        assert len(stats) == 1
+        assert list(stats.values())[0].calls == 2
+
+    def test_exception(self):
+        dispatcher = CallbackDispatcher()
+
+        def callback():
+            raise Exception('oops')
+
+        with self.assertLogs('golem_sci.dispatcher', 'ERROR'):
+            dispatcher.dispatch('key', callback)
+
+
+class ThreadedCallbackDispatcherTest(unittest.TestCase):
+    def test_order_per_key(self):
+        dispatcher = ThreadedCallbackDispatcher(workers=3)
+        results = {key: [] for key in range(5)}
+        for i in range(100):
+            for key in results:
+                dispatcher.dispatch(key, results[key].append, i)
+        dispatcher.stop()
+        for values in results.values():
+            assert values == list(range(100))
+
+    def test_call_after(self):
+        dispatcher = ThreadedCallbackDispatcher(workers=2)
+        release = threading.Event()
+        calls = []
+        dispatcher.dispatch('key', lambda: release.wait(5) and calls.append(1))
+        dispatcher.call_after('key', lambda: calls.append('after'))
+        assert calls == []
+        release.set()
+        dispatcher.stop()
+        assert calls == [1, 'after']
+
+    def test_runs_outside_caller_thread(self):
+        dispatcher = ThreadedCallbackDispatcher(workers=1)
+        threads = []
+        dispatcher.dispatch(
+            'key',
+            lambda: threads.append(threading.current_thread()),
+        )
+        dispatcher.stop()
+        assert threads and threads[0] is not threading.current_thread()
+
+    def test_backpressure(self):
+        dispatcher = ThreadedCallbackDispatcher(workers=1, max_queue_size=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+
+        dispatcher.dispatch('key', blocking)
+        started.wait(5)
+        # Fills the queue
+        dispatcher.dispatch('key', lambda: None)
+
+        dispatched = threading.Event()
+
+        def dispatch():
+            dispatcher.dispatch('key', lambda: None)
+            dispatched.set()
+        threading.Thread(target=dispatch, daemon=True).start()
+        assert not dispatched.wait(0.1)
+        release.set()
+        assert dispatched.wait(5)
+        dispatcher.stop()
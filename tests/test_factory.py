@@ -31,6 +31,7 @@ class FactoryTest(unittest.TestCase):
         eth_address = '0xdeafbeef'
         web3 = mock.MagicMock()
         web3.middleware_stack.__iter__.return_value = []
+        ensure_connection.return_value = [web3]
         contract_addresses = {}
         storage = mock.Mock()
 
@@ -51,6 +52,11 @@ class FactoryTest(unittest.TestCase):
             storage,
             contract_addresses,
             tx_sign,
+            subscribe_new_heads=False,
+            callback_dispatcher=None,
+            cursor_storage=None,
+            log_backfill=None,
+            log_cache=None,
         )
 
     def test_ensure_genesis_valid(self):
@@ -73,7 +79,7 @@ class FactoryTest(unittest.TestCase):
     def test_ensure_connection(self):
         web3 = mock.Mock()
         web3.isConnected.return_value = True
-        _ensure_connection(web3)
+        assert _ensure_connection(web3) == [web3]
         web3.isConnected.assert_called_once_with()
 
         web3.isConnected.reset_mock()
@@ -83,6 +89,14 @@ class FactoryTest(unittest.TestCase):
                 _ensure_connection(web3)
         assert web3.isConnected.call_count > 1
 
+    def test_ensure_connection_pool(self):
+        web3s = [mock.Mock(), mock.Mock()]
+        web3s[0].isConnected.return_value = False
+        web3s[1].isConnected.return_value = True
+        with mock.patch('time.sleep') as sleep:
+            assert _ensure_connection(*web3s) == [web3s[1]]
+        sleep.assert_not_called()
+
     def test_ensure_geth_version(self):
         web3 = mock.Mock()
         web3.version.node = 'Geth/v{}'.format(MIN_GETH_VERSION)
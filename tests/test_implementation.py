@@ -1,18 +1,80 @@
 import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest.mock as mock
 import unittest
+from pathlib import Path
 
-from eth_utils import to_checksum_address
+from eth_utils import decode_hex, encode_hex, to_checksum_address
+from ethereum.transactions import Transaction
 from hexbytes import HexBytes
+import rlp
 
-from golem_sci import contracts
-from golem_sci.implementation import SCIImplementation
+from golem_sci import calldata, contracts, exceptions
+from golem_sci.backfill import LogBackfill
+from golem_sci.cursorstorage import JsonCursorStorage
+from golem_sci.dispatcher import ThreadedCallbackDispatcher
+from golem_sci.logcache import SqliteLogCache
+from golem_sci.implementation import (
+    encode_payment,
+    encode_payments,
+    SCIImplementation,
+)
+from golem_sci.structs import Payment
+from golem_sci.transactionsstorage import SignedTransaction
+
+
+BATCH_TRANSFER_TOPIC = \
+    '0x24310ec9df46c171fe9c6d6fe25cac6781e7fa8f153f8f72ce63037a4b38c4b6'
 
 
 def get_eth_address():
     return to_checksum_address('0xadd355' + '0' * 34)
 
 
+class EncodePaymentsTest(unittest.TestCase):
+    def setUp(self):
+        self.payees = [
+            to_checksum_address('0x' + 40 * str(i)) for i in range(10)]
+        self.amounts = [i * 10 ** 18 + i for i in range(10)]
+
+    def test_same_as_single(self):
+        expected = b''.join(
+            encode_payment(Payment(payee, amount))
+            for payee, amount in zip(self.payees, self.amounts)
+        )
+        assert encode_payments(self.payees, self.amounts) == expected
+        assert encode_payments([], []) == b''
+
+    def test_numpy(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        assert encode_payments(self.payees, numpy.array(self.amounts)) == \
+            encode_payments(self.payees, self.amounts)
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'less than'):
+            encode_payments(self.payees[:1], [2 ** 96])
+        with self.assertRaises(ValueError):
+            encode_payments(self.payees[:1], [-1])
+        with self.assertRaises(ValueError):
+            encode_payments(['0xdead'], [1])
+        with self.assertRaises(ValueError):
+            encode_payments(self.payees, [1])
+        # Right total length but misaligned
+        with self.assertRaisesRegex(ValueError, 'address length'):
+            encode_payments(
+                ['0x' + 38 * '1', '0x' + 42 * '2'],
+                [1, 2],
+            )
+        with self.assertRaises(ValueError):
+            encode_payments(['0x' + 39 * '1', '0x' + 41 * '2'], [1, 2])
+
+
 class SCIImplementationTest(unittest.TestCase):
     def setUp(self):
         self.geth_client = mock.Mock()
@@ -30,6 +92,14 @@ class SCIImplementationTest(unittest.TestCase):
         self.geth_client.get_block_number.return_value = 1
         self.geth_client.get_balance.return_value = 10 ** 20
         self.geth_client.estimate_gas.return_value = 21000
+        self.geth_client.get_transaction_receipts.side_effect = \
+            lambda hashes: [
+                self.geth_client.get_transaction_receipt(h) for h in hashes]
+        self.geth_client.get_transactions.side_effect = \
+            lambda hashes: [self.geth_client.get_transaction(h) for h in hashes]
+        self.geth_client.get_blocks.side_effect = \
+            lambda blocks, full: [
+                self.geth_client.get_block(b, full) for b in blocks]
         self.storage = mock.Mock()
         self.storage.get_all_tx.return_value = []
         self.storage.get_nonce.return_value = 0
@@ -65,8 +135,9 @@ class SCIImplementationTest(unittest.TestCase):
         self.geth_client.get_block_number.return_value = 22
         self.sci._monitor_blockchain_single()
         self.sci.transfer_eth(get_eth_address(), 123)
-        self.geth_client.send.assert_called()
-        assert self.geth_client.send.call_args[0][0].gasprice == gas_price
+        self.geth_client.send_raw.assert_called()
+        tx = rlp.decode(self.geth_client.send_raw.call_args[0][0], Transaction)
+        assert tx.gasprice == gas_price
         self.geth_client.reset_mock()
 
         gas_price = 2 * hard_cap
@@ -74,8 +145,9 @@ class SCIImplementationTest(unittest.TestCase):
         self.geth_client.get_block_number.return_value = 33
         self.sci._monitor_blockchain_single()
         self.sci.transfer_eth(get_eth_address(), 123)
-        self.geth_client.send.assert_called()
-        assert self.geth_client.send.call_args[0][0].gasprice == hard_cap
+        self.geth_client.send_raw.assert_called()
+        tx = rlp.decode(self.geth_client.send_raw.call_args[0][0], Transaction)
+        assert tx.gasprice == hard_cap
         self.geth_client.reset_mock()
 
     def test_subscribe_to_batch_transfers(self):
@@ -89,7 +161,7 @@ class SCIImplementationTest(unittest.TestCase):
         self.geth_client.get_block_number.return_value = block_number
         self.sci._monitor_blockchain_single()
 
-        self.geth_client.get_logs.return_value = []
+        self.geth_client.get_raw_logs.return_value = []
         self.sci.subscribe_to_batch_transfers(
             None,
             receiver_address,
@@ -97,13 +169,13 @@ class SCIImplementationTest(unittest.TestCase):
             lambda e: events.append(e),
         )
 
-        self.geth_client.get_logs.return_value = [
+        self.geth_client.get_raw_logs.return_value = [
             {
                 'removed': False,
                 'transactionHash': HexBytes(tx_hash),
                 'blockNumber': block_number,
                 'topics': [
-                    '',
+                    HexBytes(BATCH_TRANSFER_TOPIC),
                     HexBytes('0x' + '0' * 24 + sender_address[2:]),
                     HexBytes('0x' + '0' * 24 + receiver_address[2:]),
                 ],
@@ -132,32 +204,323 @@ class SCIImplementationTest(unittest.TestCase):
 
         # Testing network loss
         newest_block_number = 300
-        self.geth_client.get_logs.reset_mock()
+        self.geth_client.get_raw_logs.reset_mock()
         self.geth_client.get_block_number.return_value = newest_block_number
-        self.geth_client.get_logs.side_effect = Exception
+        self.geth_client.get_raw_logs.side_effect = Exception
         self.sci._monitor_blockchain_single()
-        self.geth_client.get_logs.assert_called_once_with(
-            mock.ANY,
-            'BatchTransfer',
-            {'from': None, 'to': receiver_address},
+        self.geth_client.get_raw_logs.assert_called_once_with(
+            self.gntb.address,
+            [
+                BATCH_TRANSFER_TOPIC,
+                None,
+                '0x' + '0' * 24 + receiver_address[2:].lower(),
+            ],
             new_block_number - self.sci.REQUIRED_CONFS + 1 + 1,
             newest_block_number - self.sci.REQUIRED_CONFS + 1,
         )
         assert 0 == len(events)
 
         newest_block_number += 1
-        self.geth_client.get_logs.reset_mock()
+        self.geth_client.get_raw_logs.reset_mock()
         self.geth_client.get_block_number.return_value = newest_block_number
-        self.geth_client.get_logs.side_effect = None
+        self.geth_client.get_raw_logs.side_effect = None
         self.sci._monitor_blockchain_single()
-        self.geth_client.get_logs.assert_called_once_with(
-            mock.ANY,
-            'BatchTransfer',
-            {'from': None, 'to': receiver_address},
+        self.geth_client.get_raw_logs.assert_called_once_with(
+            self.gntb.address,
+            [
+                BATCH_TRANSFER_TOPIC,
+                None,
+                '0x' + '0' * 24 + receiver_address[2:].lower(),
+            ],
             new_block_number - self.sci.REQUIRED_CONFS + 1 + 1,
             newest_block_number - self.sci.REQUIRED_CONFS + 1,
         )
 
+    def test_merged_subscriptions(self):
+        addrs = [to_checksum_address('0x' + c * 40) for c in 'abcd']
+        topic = [
+            '0x' + '0' * 24 + addr[2:].lower() for addr in addrs
+        ]
+        data = '0x' + 64 * '0' + 64 * '0'
+        self.geth_client.get_block_number.return_value = 100
+        self.sci._monitor_blockchain_single()
+
+        events = {i: [] for i in range(3)}
+        self.sci.subscribe_to_batch_transfers(
+            None, addrs[1], 10, events[0].append)
+        self.sci.subscribe_to_batch_transfers(
+            addrs[0], addrs[2], 50, events[1].append)
+        self.sci.subscribe_to_batch_transfers(
+            addrs[0], addrs[1], 10, events[2].append)
+
+        def log(block_number, sender, receiver):
+            return {
+                'transactionHash': HexBytes('0x' + 64 * '0'),
+                'blockNumber': block_number,
+                'topics': [
+                    HexBytes(BATCH_TRANSFER_TOPIC),
+                    HexBytes(topic[sender]),
+                    HexBytes(topic[receiver]),
+                ],
+                'data': data,
+                'logIndex': sender,
+            }
+        self.geth_client.get_raw_logs.return_value = [
+            log(20, 3, 1),
+            log(20, 0, 2),
+            log(60, 0, 2),
+            log(60, 0, 1),
+            log(60, 0, 3),
+        ]
+        self.geth_client.get_block_number.return_value = 200
+        self.sci._monitor_blockchain_single()
+
+        self.geth_client.get_raw_logs.assert_called_once_with(
+            self.gntb.address,
+            [BATCH_TRANSFER_TOPIC, None, sorted([topic[1], topic[2]])],
+            10,
+            200 - self.sci.REQUIRED_CONFS + 1,
+        )
+        assert [e.sender for e in events[0]] == [addrs[3], addrs[0]]
+        # Subscribed from block 50 so it doesn't get the earlier event
+        assert [e.receiver for e in events[1]] == [addrs[2]]
+        assert [e.sender for e in events[2]] == [addrs[0]]
+
+    def test_subscription_cursor(self):
+        cursor_storage = JsonCursorStorage(
+            Path(tempfile.mkdtemp()) / 'cursors')
+        self.addCleanup(shutil.rmtree, str(cursor_storage._filepath.parent))
+        self.addCleanup(cursor_storage.close)
+
+        def new_sci():
+            sci = SCIImplementation(
+                self.geth_client,
+                get_eth_address(),
+                self.storage,
+                self.contract_addresses,
+                self.sign_tx,
+                monitor=False,
+                cursor_storage=cursor_storage,
+            )
+            sci._monitor_started = True
+            return sci
+
+        def log(block_number, log_index):
+            return {
+                'transactionHash': HexBytes('0x' + 64 * '0'),
+                'blockNumber': block_number,
+                'topics': [
+                    HexBytes(BATCH_TRANSFER_TOPIC),
+                    HexBytes('0x' + 64 * '0'),
+                    HexBytes('0x' + 64 * '0'),
+                ],
+                'data': '0x' + 128 * '0',
+                'logIndex': log_index,
+            }
+        events = []
+        self.geth_client.get_block_number.return_value = 100
+        sci = new_sci()
+        sci.subscribe_to_batch_transfers(None, None, 10, events.append)
+        self.geth_client.get_raw_logs.return_value = [log(20, 0)]
+        self.geth_client.get_block_number.return_value = 150
+        sci._monitor_blockchain_single()
+        assert len(events) == 1
+        confirmed_block = sci.get_latest_confirmed_block_number()
+
+        # Crashed in the middle of delivering block 170, after the first log
+        sub_id = sci._subscriptions[0].id
+        cursor_storage.mark_delivered(sub_id, '0x' + 64 * '0', 0)
+        events.clear()
+        self.geth_client.get_raw_logs.reset_mock()
+        self.geth_client.get_raw_logs.return_value = [log(170, 0), log(170, 1)]
+        sci = new_sci()
+        sci.subscribe_to_batch_transfers(None, None, 10, events.append)
+        self.geth_client.get_block_number.return_value = 200
+        sci._monitor_blockchain_single()
+        self.geth_client.get_raw_logs.assert_called_once_with(
+            self.gntb.address,
+            [BATCH_TRANSFER_TOPIC],
+            confirmed_block + 1,
+            sci.get_latest_confirmed_block_number(),
+        )
+        assert len(events) == 1
+        assert cursor_storage.get_cursor(sub_id) == \
+            sci.get_latest_confirmed_block_number()
+        assert not cursor_storage.is_delivered(sub_id, '0x' + 64 * '0', 0)
+
+    def test_subscription_cursor_threaded_dispatcher(self):
+        cursor_storage = JsonCursorStorage(
+            Path(tempfile.mkdtemp()) / 'cursors')
+        self.addCleanup(shutil.rmtree, str(cursor_storage._filepath.parent))
+        self.addCleanup(cursor_storage.close)
+        dispatcher = ThreadedCallbackDispatcher(workers=1)
+        sci = SCIImplementation(
+            self.geth_client,
+            get_eth_address(),
+            self.storage,
+            self.contract_addresses,
+            self.sign_tx,
+            monitor=False,
+            callback_dispatcher=dispatcher,
+            cursor_storage=cursor_storage,
+        )
+        sci._monitor_started = True
+        release = threading.Event()
+        sci.subscribe_to_batch_transfers(
+            None, None, 10, lambda _: release.wait(5))
+        sub_id = sci._subscriptions[0].id
+        self.geth_client.get_raw_logs.return_value = [{
+            'transactionHash': HexBytes('0x' + 64 * '0'),
+            'blockNumber': 20,
+            'topics': [
+                HexBytes(BATCH_TRANSFER_TOPIC),
+                HexBytes('0x' + 64 * '0'),
+                HexBytes('0x' + 64 * '0'),
+            ],
+            'data': '0x' + 128 * '0',
+            'logIndex': 0,
+        }]
+        self.geth_client.get_block_number.return_value = 100
+        sci._monitor_blockchain_single()
+        # Still waiting in the queue, a crash now must redeliver it
+        assert not cursor_storage.is_delivered(sub_id, '0x' + 64 * '0', 0)
+        assert cursor_storage.get_cursor(sub_id) is None
+
+        release.set()
+        dispatcher.stop()
+        assert cursor_storage.get_cursor(sub_id) == \
+            sci.get_latest_confirmed_block_number()
+
+    def test_subscription_backfill(self):
+        self.sci._log_backfill = LogBackfill(
+            workers=2,
+            initial_chunk_size=100,
+            small_response=0,
+        )
+        self.addCleanup(self.sci._log_backfill.stop)
+        events = []
+        self.sci.subscribe_to_batch_transfers(None, None, 1, events.append)
+
+        def get_raw_logs(address, topics, from_block, to_block):
+            return [{
+                'transactionHash': HexBytes('0x' + 64 * '0'),
+                'blockNumber': block_number,
+                'topics': [
+                    HexBytes(BATCH_TRANSFER_TOPIC),
+                    HexBytes('0x' + 64 * '0'),
+                    HexBytes('0x' + 64 * '0'),
+                ],
+                'data': '0x' + 128 * '0',
+                'logIndex': 0,
+            } for block_number in range(from_block, to_block + 1, 50)]
+        self.geth_client.get_raw_logs.side_effect = get_raw_logs
+        self.geth_client.get_block_number.return_value = 1000
+        self.sci._monitor_blockchain_single()
+
+        confirmed_block = self.sci.get_latest_confirmed_block_number()
+        assert self.geth_client.get_raw_logs.call_count == 10
+        assert len(events) == len(range(1, confirmed_block + 1, 50))
+        assert self.sci._subscriptions[0].last_pulled_block == \
+            confirmed_block
+
+    def test_iter_batch_transfers(self):
+        self.sci._log_backfill = LogBackfill(
+            initial_chunk_size=100,
+            small_response=0,
+        )
+        self.addCleanup(self.sci._log_backfill.stop)
+        payee = to_checksum_address('0x' + 'f' * 40)
+
+        def get_raw_logs(address, topics, from_block, to_block):
+            return [{
+                'transactionHash': HexBytes('0x' + 64 * '0'),
+                'blockNumber': block_number,
+                'topics': [
+                    HexBytes(BATCH_TRANSFER_TOPIC),
+                    HexBytes('0x' + '0' * 24 + get_eth_address()[2:]),
+                    HexBytes('0x' + '0' * 24 + payee[2:]),
+                ],
+                'data': '0x' + 128 * '0',
+                'logIndex': 0,
+            } for block_number in (from_block, to_block)]
+        self.geth_client.get_raw_logs.side_effect = get_raw_logs
+
+        events = self.sci.iter_batch_transfers(
+            get_eth_address(),
+            payee,
+            1,
+            1000,
+        )
+        assert not self.geth_client.get_raw_logs.called
+        event = next(events)
+        assert event.sender == get_eth_address()
+        assert event.receiver == payee
+        assert len(list(events)) == 19
+        assert self.geth_client.get_raw_logs.call_count == 10
+        self.geth_client.get_raw_logs.assert_called_with(
+            self.gntb.address,
+            [
+                BATCH_TRANSFER_TOPIC,
+                '0x' + '0' * 24 + get_eth_address()[2:].lower(),
+                '0x' + '0' * 24 + payee[2:].lower(),
+            ],
+            901,
+            1000,
+        )
+        assert not self.gntb.events.mock_calls
+
+        self.geth_client.get_raw_logs.reset_mock()
+        assert len(self.sci.get_batch_transfers(
+            get_eth_address(),
+            payee,
+            1,
+            100,
+        )) == 2
+        self.geth_client.get_raw_logs.assert_called_once()
+
+    def test_log_cache(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.sci._log_cache = SqliteLogCache(Path(tempdir) / 'logs.db')
+        self.addCleanup(self.sci._log_cache.close)
+        self.geth_client.get_raw_logs.return_value = [{
+            'address': self.gntb.address,
+            'transactionHash': HexBytes('0x' + 64 * '0'),
+            'transactionIndex': 0,
+            'blockHash': HexBytes('0x' + 64 * '0'),
+            'blockNumber': 50,
+            'topics': [
+                HexBytes(BATCH_TRANSFER_TOPIC),
+                HexBytes('0x' + 64 * '0'),
+                HexBytes('0x' + 64 * '0'),
+            ],
+            'data': '0x' + 128 * '0',
+            'logIndex': 0,
+        }]
+        events = []
+        self.sci.subscribe_to_batch_transfers(None, None, 10, events.append)
+        self.geth_client.get_block_number.return_value = 100
+        self.sci._monitor_blockchain_single()
+        assert len(events) == 1
+        confirmed_block = self.sci.get_latest_confirmed_block_number()
+
+        # Served from the cache, only the unconfirmed part is fetched
+        self.geth_client.get_raw_logs.reset_mock()
+        self.geth_client.get_raw_logs.return_value = []
+        transfers = self.sci.get_batch_transfers(
+            '0x' + 40 * '0',
+            '0x' + 40 * '0',
+            20,
+            confirmed_block + 2,
+        )
+        assert len(transfers) == 1
+        self.geth_client.get_raw_logs.assert_called_once_with(
+            self.gntb.address,
+            mock.ANY,
+            confirmed_block + 1,
+            confirmed_block + 2,
+        )
+
     def test_on_transaction_confirmed(self):
         tx_hash = '0x' + 'a' * 40
         gas_used = 1234
@@ -204,6 +567,194 @@ class SCIImplementationTest(unittest.TestCase):
         self.sci._monitor_blockchain_single()
         assert not receipt
 
+    def test_wait_for_receipt(self):
+        tx_hash = '0x' + 'a' * 64
+        future = self.sci.wait_for_receipt(tx_hash)
+        callback = mock.Mock()
+        self.sci.on_transaction_confirmed(tx_hash, callback)
+
+        block_number = 100
+        self.geth_client.get_block_number.return_value = block_number
+        self.geth_client.get_transaction_receipt.return_value = {
+            'transactionHash': HexBytes(tx_hash),
+            'status': 1,
+            'gasUsed': 1234,
+            'blockNumber': block_number,
+            'blockHash': HexBytes('0xbbbb'),
+        }
+        self.sci._monitor_blockchain_single()
+        assert not future.done()
+
+        self.geth_client.get_block_number.return_value = \
+            block_number + self.sci.REQUIRED_CONFS
+        self.sci._monitor_blockchain_single()
+        assert future.result(0).tx_hash == tx_hash
+        callback.assert_called_once_with(future.result(0))
+        assert not self.sci._awaiting_transactions
+
+    def test_process_transactions_single_receipt_lookup(self):
+        confirmed_tx = Transaction(1, 10 ** 9, 21000, get_eth_address(), 1, b'')
+        confirmed_tx.sign(os.urandom(32))
+        confirmed_tx = SignedTransaction.from_tx(confirmed_tx)
+        pending_tx = Transaction(2, 10 ** 9, 21000, get_eth_address(), 2, b'')
+        pending_tx.sign(os.urandom(32))
+        pending_tx = SignedTransaction.from_tx(pending_tx)
+        confirmed_hash = encode_hex(confirmed_tx.hash)
+        self.storage.get_all_tx.return_value = [confirmed_tx, pending_tx]
+        receipts = []
+        self.sci.on_transaction_confirmed(confirmed_hash, receipts.append)
+
+        block_number = 100
+        self.geth_client.get_block_number.return_value = \
+            block_number + self.sci.REQUIRED_CONFS
+        self.geth_client.get_transaction.return_value = None
+        self.geth_client.get_transaction_receipt.side_effect = \
+            lambda tx_hash: {
+                'transactionHash': HexBytes(tx_hash),
+                'status': 1,
+                'gasUsed': 21000,
+                'blockNumber': block_number,
+                'blockHash': HexBytes('0xbbbb'),
+            } if tx_hash == confirmed_hash else None
+        self.sci._monitor_blockchain_single()
+
+        # Deduplicated, in the order of the storage
+        self.geth_client.get_transaction_receipts.assert_called_once_with(
+            [confirmed_hash, encode_hex(pending_tx.hash)])
+        assert len(receipts) == 1
+        assert receipts[0].tx_hash == confirmed_hash
+        self.storage.remove_tx.assert_called_once_with(1)
+        self.geth_client.get_transactions.assert_called_once_with(
+            [encode_hex(pending_tx.hash)])
+        self.geth_client.send_raw.assert_called_once_with(pending_tx.raw)
+
+    def test_batch_transfer_offline_encoding(self):
+        payee = to_checksum_address('0x' + 40 * 'f')
+        self.sci.batch_transfer([Payment(payee, 10)], 123)
+        assert not self.gntb.functions.mock_calls
+        tx = rlp.decode(self.geth_client.send_raw.call_args[0][0], Transaction)
+        assert tx.to == decode_hex(self.contract_addresses[contracts.GNTB])
+        assert tx.data[:4] == \
+            calldata.get_selector(contracts.GNTB, 'batchTransfer')
+
+    def test_batch_transfer_many(self):
+        gas_limit = int(
+            (self.sci.GAS_BATCH_PAYMENT_BASE + 3 * self.sci.GAS_PER_PAYMENT) /
+            self.sci.BATCH_GAS_FILL_RATIO,
+        ) + 1
+        self.geth_client.get_block.return_value = {
+            'number': 1,
+            'timestamp': 1,
+            'gasLimit': gas_limit,
+        }
+        self.geth_client.send_raw.side_effect = \
+            lambda raw: encode_hex(rlp.decode(raw, Transaction).hash)
+        payments = [
+            Payment(to_checksum_address('0x' + 40 * str(i)), i + 1)
+            for i in range(7)
+        ]
+        tx_hashes = self.sci.batch_transfer_many(payments, 123)
+        assert len(tx_hashes) == 3
+        self.storage.set_nonces_sign_and_save_txs.assert_called_once()
+        txs = self.storage.set_nonces_sign_and_save_txs.call_args[0][1]
+        assert [tx.startgas for tx in txs] == [
+            self.sci.GAS_BATCH_PAYMENT_BASE + n * self.sci.GAS_PER_PAYMENT
+            for n in (3, 3, 1)
+        ]
+        assert b''.join(tx.data[4 + 3 * 32:] for tx in txs) == \
+            encode_payments(
+                [p.payee for p in payments],
+                [p.amount for p in payments],
+            )
+
+        # The ratio can be changed per instance, half of it fits 1 payment
+        self.sci.BATCH_GAS_FILL_RATIO /= 2
+        assert len(self.sci.batch_transfer_many(payments, 123)) == 7
+
+    def test_send_transactions(self):
+        def make_tx():
+            return Transaction(
+                nonce=0,
+                gasprice=10 ** 9,
+                startgas=21000,
+                to=b'\x11' * 20,
+                value=1,
+                data=b'',
+            )
+        txs = [make_tx() for _ in range(3)]
+        self.geth_client.send_raw.side_effect = [
+            '0xaa',
+            exceptions.GethError(code=-32000, message='intrinsic gas'),
+        ]
+        with self.assertRaises(exceptions.GethError):
+            self.sci.send_transactions(txs)
+        self.storage.set_nonces_sign_and_save_txs.assert_called_once_with(
+            self.sign_tx,
+            txs,
+        )
+        assert self.geth_client.send_raw.call_count == 2
+        # The rejected one and the one after it
+        assert self.storage.revert_last_tx.call_count == 2
+        assert self.sci._eth_reserved == 21000 * 10 ** 9 + 1
+
+    def test_balance_snapshot(self):
+        address = '0x' + 40 * 'b'
+        self.geth_client.call_function.return_value = 7
+        assert self.sci.get_gntb_balance(address) == 7
+        assert self.sci.get_gntb_balance(address.upper()) == 7
+        assert self.sci.get_eth_balance(address) == 10 ** 20
+        assert self.sci.get_eth_balance(address) == 10 ** 20
+        self.geth_client.call_function.assert_called_once()
+        # Function object is only built on a miss
+        self.gntb.functions.balanceOf.assert_called_once_with(address)
+        self.geth_client.get_balance.assert_called_once_with(
+            address,
+            block=self.sci.get_latest_confirmed_block_number(),
+        )
+
+        self.geth_client.call_function.return_value = 8
+        self.geth_client.get_block_number.return_value = 10
+        self.sci._update_block_numbers()
+        assert self.sci.get_gntb_balance(address) == 8
+        self.geth_client.call_function.assert_called_with(
+            mock.ANY,
+            mock.ANY,
+            self.sci.get_latest_confirmed_block_number(),
+        )
+
+    def test_bulk_balances(self):
+        self.contract_addresses[contracts.GNTDeposit] = '0x' + 40 * '2'
+        addresses = [to_checksum_address('0x' + 40 * c) for c in 'ab']
+        self.geth_client.batch_request.return_value = [
+            HexBytes((i + 1).to_bytes(32, 'big')) for i in range(2)]
+        assert self.sci.get_deposit_values(addresses, batch_size=50) == \
+            [1, 2]
+        calls = self.geth_client.batch_request.call_args[0][0]
+        assert [method for method, _ in calls] == ['eth_call'] * 2
+        tx, block = calls[1][1]
+        assert tx['to'] == to_checksum_address(
+            self.contract_addresses[contracts.GNTDeposit])
+        assert tx['data'] == encode_hex(calldata.encode(
+            contracts.GNTDeposit, 'balanceOf', [addresses[1]]))
+        assert block == self.sci.get_latest_confirmed_block_number()
+        assert self.geth_client.batch_request.call_args[1] == \
+            {'batch_size': 50}
+
+        self.geth_client.batch_request.return_value[1] = \
+            exceptions.MissingTrieNode(code=-32000, message='')
+        with self.assertRaises(exceptions.MissingTrieNode):
+            self.sci.get_gntb_balances(addresses)
+
+        self.geth_client.get_balances.return_value = [10, 20]
+        assert self.sci.get_eth_balances(addresses) == [10, 20]
+
+    def test_new_head_wakes_monitor(self):
+        confirmed_block = self.sci.get_latest_confirmed_block_number()
+        self.sci._on_new_head(confirmed_block + self.sci.REQUIRED_CONFS - 1)
+        assert not self.sci._new_block_pending
+        self.sci._on_new_head(confirmed_block + self.sci.REQUIRED_CONFS)
+        assert self.sci._new_block_pending
+
     def test_missing_contracts(self):
         contract_addresses = {}
 
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+import unittest
+import unittest.mock as mock
+from pathlib import Path
+
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+
+from golem_sci.logcache import SqliteLogCache
+
+ADDRESS = to_checksum_address('0x' + 'a' * 40)
+EVENT = '0x' + 'e' * 64
+SENDERS = ['0x' + c * 64 for c in '12']
+
+
+def _log(block_number, sender, log_index=0):
+    return {
+        'address': ADDRESS,
+        'blockNumber': block_number,
+        'logIndex': log_index,
+        'blockHash': HexBytes('0x' + 'b' * 64),
+        'transactionHash': HexBytes('0x' + 'c' * 64),
+        'transactionIndex': 3,
+        'topics': [HexBytes(EVENT), HexBytes(sender)],
+        'data': '0x' + 64 * '0',
+        'removed': False,
+    }
+
+
+class SqliteLogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempfile = Path(tempfile.mkdtemp()) / 'logs.db'
+        self.cache = SqliteLogCache(self.tempfile)
+        self.logs = [
+            _log(10, SENDERS[0]),
+            _log(20, SENDERS[1]),
+            _log(20, SENDERS[0], 1),
+            _log(30, SENDERS[1]),
+        ]
+        self.fetch = mock.Mock(side_effect=self._fetch)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tempfile.parent)
+
+    def _fetch(self, from_block, to_block, topics=None):
+        return [
+            log for log in self.logs
+            if from_block <= log['blockNumber'] <= to_block and
+            (topics is None or log['topics'][1].hex() in topics)
+        ]
+
+    def test_get_logs(self):
+        logs = self.cache.get_logs(ADDRESS, [EVENT], 1, 25, self.fetch)
+        self.fetch.assert_called_once_with(1, 25)
+        assert logs == self.logs[:3]
+
+        self.fetch.reset_mock()
+        logs = self.cache.get_logs(ADDRESS, [EVENT], 5, 40, self.fetch)
+        self.fetch.assert_called_once_with(26, 40)
+        assert logs == self.logs
+
+        self.fetch.reset_mock()
+        assert self.cache.get_logs(ADDRESS, [EVENT], 1, 40, self.fetch) == \
+            self.logs
+        assert not self.fetch.called
+        assert self.cache.get_missing_ranges(ADDRESS, [EVENT], 1, 50) == \
+            [(41, 50)]
+
+    def test_more_general_filter(self):
+        self.cache.get_logs(
+            ADDRESS,
+            [EVENT, None],
+            1,
+            40,
+            self.fetch,
+        )
+        self.fetch.reset_mock()
+        logs = self.cache.get_logs(
+            ADDRESS,
+            [EVENT, SENDERS[0]],
+            1,
+            40,
+            self.fetch,
+        )
+        assert not self.fetch.called
+        assert logs == [self.logs[0], self.logs[2]]
+
+    def test_more_specific_filter(self):
+        self.cache.get_logs(
+            ADDRESS,
+            [EVENT, SENDERS[0]],
+            1,
+            40,
+            lambda f, t: self._fetch(f, t, [SENDERS[0]]),
+        )
+        assert self.cache.get_missing_ranges(
+            ADDRESS, [EVENT, SENDERS], 1, 40) == [(1, 40)]
+        assert self.cache.get_missing_ranges(
+            ADDRESS, [EVENT], 1, 40) == [(1, 40)]
+        assert self.cache.get_missing_ranges(
+            ADDRESS, [EVENT, [SENDERS[0]]], 1, 40) == []
+
+    def test_persistence(self):
+        self.cache.get_logs(ADDRESS, [EVENT], 1, 40, self.fetch)
+        self.cache.close()
+        self.cache = SqliteLogCache(self.tempfile)
+        self.fetch.reset_mock()
+        assert self.cache.get_logs(ADDRESS, [EVENT], 1, 40, self.fetch) == \
+            self.logs
+        assert not self.fetch.called
@@ -0,0 +1,37 @@
+import unittest
+
+from golem_sci.lrucache import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(3)
+
+    def test_get(self):
+        assert self.cache.get('a') == (False, None)
+        self.cache.put('a', None)
+        assert self.cache.get('a') == (True, None)
+        stats = self.cache.get_stats()
+        assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+    def test_least_recently_used_evicted(self):
+        for key in 'abc':
+            self.cache.put(key, key.upper())
+        self.cache.get('a')
+        self.cache.put('d', 'D')
+        assert self.cache.get('b') == (False, None)
+        assert self.cache.get('a') == (True, 'A')
+
+    def test_size(self):
+        self.cache.put('a', 'A')
+        self.cache.put('b', 'B', size=2)
+        self.cache.put('b', 'B', size=1)
+        assert self.cache.get_stats().size == 2
+        self.cache.put('c', 'C', size=2)
+        assert self.cache.get('a') == (False, None)
+        self.cache.put('d', 'D', size=4)
+        assert self.cache.get('d') == (False, None)
+        assert self.cache.get_stats().size == 3
+
+        self.cache.clear()
+        assert self.cache.get_stats().size == 0
@@ -0,0 +1,104 @@
+import json
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock, TestCase
+
+from web3 import Web3, IPCProvider
+
+from golem_sci.client import Client
+from golem_sci.newheads import NewHeadsWatcher
+
+
+class _StandInNode(socketserver.StreamRequestHandler):
+    """
+    Accepts a newHeads subscription and pushes the block numbers queued in
+    the server's `heads` list.
+    """
+    def handle(self):
+        request = json.loads(self.request.recv(4096).decode())
+        assert request['method'] == 'eth_subscribe'
+        assert request['params'] == ['newHeads']
+        self.wfile.write(json.dumps({
+            'jsonrpc': '2.0',
+            'id': request['id'],
+            'result': '0xcd0c3e8af590364c09d0fa6a1210faf5',
+        }).encode() + b'\n')
+        while not self.server.done.is_set():
+            while self.server.heads:
+                self.wfile.write(json.dumps({
+                    'jsonrpc': '2.0',
+                    'method': 'eth_subscription',
+                    'params': {
+                        'subscription': '0xcd0c3e8af590364c09d0fa6a1210faf5',
+                        'result': {'number': hex(self.server.heads.pop(0))},
+                    },
+                }).encode())
+            time.sleep(0.01)
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, 'Timed out'
+        time.sleep(0.01)
+
+
+class NewHeadsWatcherTest(TestCase):
+    def setUp(self):
+        self.tempdir = Path(tempfile.mkdtemp())
+        self.blocks = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _start_node(self):
+        ipc_path = str(self.tempdir / 'geth.ipc')
+        server = socketserver.ThreadingUnixStreamServer(ipc_path, _StandInNode)
+        server.daemon_threads = True
+        server.heads = []
+        server.done = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def stop():
+            server.done.set()
+            server.shutdown()
+            server.server_close()
+        self.addCleanup(stop)
+        return ipc_path, server
+
+    def test_ipc_subscription(self):
+        ipc_path, server = self._start_node()
+        client = Client(Web3(IPCProvider(ipc_path)))
+        watcher = NewHeadsWatcher(client, self.blocks.append)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+
+        server.heads.extend([10, 11, 11, 9, 12])
+        _wait_for(lambda: len(self.blocks) == 3)
+        assert self.blocks == [10, 11, 12]
+
+    def test_polling_fallback(self):
+        client = mock.Mock()
+        client.web3.providers = [mock.Mock()]
+        client.get_block_number.side_effect = [5, 5, 6, 7, 7, 7, 7, 7]
+        watcher = NewHeadsWatcher(client, self.blocks.append)
+        watcher.POLL_INTERVAL = 0.01
+        watcher.start()
+        self.addCleanup(watcher.stop)
+
+        _wait_for(lambda: len(self.blocks) == 3)
+        assert self.blocks == [5, 6, 7]
+
+    def test_broken_subscription_falls_back_to_polling(self):
+        ipc_path = str(self.tempdir / 'missing.ipc')
+        client = Client(Web3(IPCProvider(ipc_path)))
+        watcher = NewHeadsWatcher(client, self.blocks.append)
+        watcher.POLL_INTERVAL = 0.01
+        with mock.patch.object(client, 'get_block_number', return_value=3):
+            watcher.start()
+            self.addCleanup(watcher.stop)
+            _wait_for(lambda: self.blocks == [3])
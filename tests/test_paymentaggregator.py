@@ -0,0 +1,99 @@
+import unittest
+import unittest.mock as mock
+
+from eth_utils import to_checksum_address
+
+from golem_sci.implementation import SCIImplementation
+from golem_sci.paymentaggregator import PaymentAggregator
+from golem_sci.structs import Payment
+
+PAYEE1 = '0x' + 40 * '1'
+PAYEE2 = '0x' + 40 * '2'
+
+
+class PaymentAggregatorTest(unittest.TestCase):
+    def setUp(self):
+        self.sci = mock.Mock()
+        self.sci.batch_transfer.side_effect = \
+            lambda payments, closure_time: '0x{}'.format(
+                self.sci.batch_transfer.call_count)
+
+    def _sent_payments(self, call_index=0):
+        payments, closure_time = \
+            self.sci.batch_transfer.call_args_list[call_index][0]
+        return {p.payee: p.amount for p in payments}, closure_time
+
+    def test_merge_and_flush(self):
+        aggregator = PaymentAggregator(self.sci, max_delay=1000)
+        f1 = aggregator.add(Payment(PAYEE1, 1), 10)
+        f2 = aggregator.add(Payment(PAYEE2, 2), 30)
+        f3 = aggregator.add(Payment(PAYEE1, 3), 20)
+        self.sci.batch_transfer.assert_not_called()
+
+        aggregator.flush()
+        assert self._sent_payments() == ({PAYEE1: 4, PAYEE2: 2}, 30)
+        assert f1.result(0) == f2.result(0) == f3.result(0) == '0x1'
+
+        aggregator.flush()
+        assert self.sci.batch_transfer.call_count == 1
+
+    def test_merge_mixed_case(self):
+        payee = '0x' + 20 * 'ab'
+        aggregator = PaymentAggregator(self.sci, max_delay=1000)
+        aggregator.add(Payment(payee, 1))
+        aggregator.add(Payment(payee.upper().replace('0X', '0x'), 2))
+        aggregator.add(Payment(to_checksum_address(payee), 3))
+        aggregator.flush()
+        assert self._sent_payments()[0] == {to_checksum_address(payee): 6}
+
+    def test_max_payments(self):
+        aggregator = PaymentAggregator(self.sci, max_payments=2)
+        aggregator.add(Payment(PAYEE1, 1))
+        aggregator.add(Payment(PAYEE1, 1))
+        self.sci.batch_transfer.assert_not_called()
+        aggregator.add(Payment(PAYEE2, 1))
+        assert self._sent_payments()[0] == {PAYEE1: 2, PAYEE2: 1}
+
+    def test_max_gas(self):
+        max_gas = SCIImplementation.GAS_BATCH_PAYMENT_BASE + \
+            SCIImplementation.GAS_PER_PAYMENT
+        aggregator = PaymentAggregator(self.sci, max_gas=max_gas)
+        aggregator.add(Payment(PAYEE1, 1))
+        assert self._sent_payments()[0] == {PAYEE1: 1}
+        with self.assertRaises(ValueError):
+            PaymentAggregator(self.sci, max_gas=max_gas - 1)
+
+    def test_max_delay(self):
+        aggregator = PaymentAggregator(self.sci, max_delay=0.01)
+        future = aggregator.add(Payment(PAYEE1, 1))
+        assert future.result(5) == '0x1'
+
+    def test_amount_overflow(self):
+        aggregator = PaymentAggregator(self.sci)
+        aggregator.add(Payment(PAYEE1, 2 ** 95))
+        aggregator.add(Payment(PAYEE1, 2 ** 95))
+        assert self._sent_payments()[0] == {PAYEE1: 2 ** 95}
+        aggregator.flush()
+        assert self._sent_payments(1)[0] == {PAYEE1: 2 ** 95}
+
+    def test_invalid_payment(self):
+        aggregator = PaymentAggregator(self.sci)
+        future = aggregator.add(Payment(PAYEE1, 1))
+        for payment in (
+                Payment(PAYEE2, 0),
+                Payment(PAYEE2, -1),
+                Payment(PAYEE2, 2 ** 96),
+                Payment('0x1234', 1)):
+            with self.assertRaises(ValueError):
+                aggregator.add(payment)
+        aggregator.flush()
+        assert self._sent_payments()[0] == {PAYEE1: 1}
+        assert future.result(0) == '0x1'
+
+    def test_error(self):
+        self.sci.batch_transfer.side_effect = Exception('oops')
+        aggregator = PaymentAggregator(self.sci)
+        future = aggregator.add(Payment(PAYEE1, 1))
+        aggregator.flush()
+        with self.assertRaisesRegex(Exception, 'oops'):
+            future.result(0)
@@ -0,0 +1,54 @@
+import threading
+import unittest
+import unittest.mock as mock
+
+from golem_sci.snapshotcache import SnapshotCache
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SnapshotCache()
+        self.fetch = mock.Mock(return_value=1)
+
+    def test_cached_until_advanced(self):
+        assert self.cache.get('a', 5, self.fetch) == 1
+        assert self.cache.get('a', 5, self.fetch) == 1
+        self.fetch.assert_called_once_with()
+
+        self.cache.advance(6)
+        self.cache.get('a', 6, self.fetch)
+        # Older block is still served but not cached
+        self.cache.get('a', 5, self.fetch)
+        self.cache.get('a', 5, self.fetch)
+        assert self.fetch.call_count == 4
+
+    def test_error_not_cached(self):
+        self.fetch.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.cache.get('a', 5, self.fetch)
+        self.fetch.side_effect = None
+        assert self.cache.get('a', 5, self.fetch) == 1
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait()
+            return 2
+        self.fetch.side_effect = fetch
+        results = []
+
+        def get():
+            results.append(self.cache.get('a', 5, self.fetch))
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == [2] * 4
+        self.fetch.assert_called_once_with()
@@ -4,9 +4,15 @@ import tempfile
 import unittest
 from pathlib import Path
 
+from eth_utils import encode_hex
 from ethereum.transactions import Transaction
+import rlp
 
-from golem_sci.transactionsstorage import JsonTransactionsStorage
+from golem_sci.transactionsstorage import (
+    JournalTransactionsStorage,
+    JsonTransactionsStorage,
+    SqliteTransactionsStorage,
+)
 
 
 def _make_tx() -> Transaction:
@@ -25,9 +31,12 @@ def _sign(tx: Transaction) -> None:
 
 
 class JsonTransactionsStorageTest(unittest.TestCase):
+    def _create_storage(self):
+        return JsonTransactionsStorage(self.tempfile)
+
     def setUp(self):
         self.tempfile = Path(tempfile.mkdtemp()) / 'tx.json'
-        self.storage = JsonTransactionsStorage(self.tempfile)
+        self.storage = self._create_storage()
         self.storage.init(0)
 
     def tearDown(self):
@@ -53,10 +62,36 @@ class JsonTransactionsStorageTest(unittest.TestCase):
         assert tx1.nonce == 0
         assert tx2.nonce == 1
 
+    def test_bulk_save(self):
+        self.storage.set_nonce_sign_and_save_tx(_sign, _make_tx())
+        txs = [_make_tx() for _ in range(3)]
+        self.storage.set_nonces_sign_and_save_txs(_sign, txs)
+        assert [tx.nonce for tx in txs] == [1, 2, 3]
+        self.storage = self._create_storage()
+        self.storage.init(4)
+        assert self.storage.get_all_tx()[1:] == txs
+
+    def test_get_all_tx_cached(self):
+        tx = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx)
+        cached = self.storage.get_all_tx()[0]
+        assert self.storage.get_all_tx()[0] is cached
+        assert cached.hash == tx.hash
+        assert cached.raw == rlp.encode(tx)
+        with self.assertRaises(ValueError):
+            cached.nonce = 1
+
+    def test_raw_tx_persisted(self):
+        tx = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx)
+        self.storage = self._create_storage()
+        self.storage.init(1)
+        assert self.storage.get_all_tx()[0].raw == rlp.encode(tx)
+
     def test_reload(self):
         tx = _make_tx()
         self.storage.set_nonce_sign_and_save_tx(_sign, tx)
-        self.storage = JsonTransactionsStorage(self.tempfile)
+        self.storage = self._create_storage()
         self.storage.init(1)
         transactions = self.storage.get_all_tx()
         assert len(transactions) == 1
@@ -64,13 +99,13 @@ class JsonTransactionsStorageTest(unittest.TestCase):
         assert tx.nonce == 0
 
         self.storage.remove_tx(0)
-        self.storage = JsonTransactionsStorage(self.tempfile)
+        self.storage = self._create_storage()
         self.storage.init(1)
         transactions = self.storage.get_all_tx()
         assert len(transactions) == 0
 
     def test_wrong_inital_nonce(self):
-        self.storage = JsonTransactionsStorage(self.tempfile)
+        self.storage = self._create_storage()
         with self.assertRaisesRegex(Exception, 'initialization failed'):
             self.storage.init(1)
 
@@ -82,3 +117,78 @@ class JsonTransactionsStorageTest(unittest.TestCase):
             self.storage.set_nonce_sign_and_save_tx(sign_throws, tx)
         transactions = self.storage.get_all_tx()
         assert len(transactions) == 0
+
+
+class JournalTransactionsStorageTest(JsonTransactionsStorageTest):
+    def _create_storage(self):
+        return JournalTransactionsStorage(self.tempfile, 5)
+
+    def test_revert_last_tx(self):
+        tx1 = _make_tx()
+        tx2 = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx1)
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx2)
+        self.storage.revert_last_tx()
+        self.storage = self._create_storage()
+        self.storage.init(1)
+        assert self.storage.get_all_tx() == [tx1]
+
+    def test_compaction(self):
+        txs = []
+        for _ in range(12):
+            tx = _make_tx()
+            self.storage.set_nonce_sign_and_save_tx(_sign, tx)
+            txs.append(tx)
+        for tx in txs[:10]:
+            self.storage.remove_tx(tx.nonce)
+        with open(self.tempfile) as f:
+            assert len(f.readlines()) < 5
+        self.storage = self._create_storage()
+        self.storage.init(12)
+        assert self.storage.get_all_tx() == txs[10:]
+
+    def test_torn_record(self):
+        tx = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx)
+        with open(self.tempfile, 'a') as f:
+            f.write('{"op": "add", "tx": {"non')
+        self.storage = self._create_storage()
+        self.storage.init(1)
+        assert self.storage.get_all_tx() == [tx]
+
+        tx2 = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx2)
+        assert tx2.nonce == 1
+        self.storage = self._create_storage()
+        self.storage.init(2)
+        assert self.storage.get_all_tx() == [tx, tx2]
+
+
+class SqliteTransactionsStorageTest(JsonTransactionsStorageTest):
+    def _create_storage(self):
+        return SqliteTransactionsStorage(self.tempfile)
+
+    def test_history_and_lookup_by_hash(self):
+        tx = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx)
+        tx_hash = encode_hex(tx.hash)
+        assert self.storage.get_tx_by_hash(tx_hash) == tx
+
+        self.storage.remove_tx(0)
+        assert self.storage.get_all_tx() == []
+        assert self.storage.get_tx_by_hash(tx_hash) == tx
+        assert self.storage.get_tx_by_hash('0x' + 64 * '0') is None
+        with self.assertRaises(KeyError):
+            self.storage.remove_tx(0)
+
+    def test_revert_last_tx(self):
+        tx1 = _make_tx()
+        tx2 = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx1)
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx2)
+        self.storage.revert_last_tx()
+        assert self.storage.get_tx_by_hash(encode_hex(tx2.hash)) is None
+        tx3 = _make_tx()
+        self.storage.set_nonce_sign_and_save_tx(_sign, tx3)
+        assert tx3.nonce == 1
+        assert self.storage.get_all_tx() == [tx1, tx3]